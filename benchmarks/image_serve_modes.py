@@ -0,0 +1,259 @@
+"""Compare image serving setups: the local disk store (the baseline), and Pcloud
+with IMAGE_SERVE_MODE=proxy and IMAGE_SERVE_MODE=redirect.
+
+Starts a local Pcloud stand-in and one chatroom.py server per setup, uploads a
+few images and then fetches them from concurrent clients (following
+redirects like a browser would). Reports server CPU time, bytes the server
+sent and client latency.
+
+    python benchmarks/image_serve_modes.py --requests 400 --concurrency 8
+"""
+import argparse
+import email
+import email.utils
+import http.client
+import http.server
+import io
+import json
+import os
+import random
+import socket
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from PIL import Image
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class PcloudStandIn(http.server.BaseHTTPRequestHandler):
+    """Just enough of the Pcloud API for uploads, links and downloads"""
+
+    protocol_version = 'HTTP/1.1'
+    files = {}
+    files_lock = threading.Lock()
+    download_delay = 0.0
+    bytes_sent = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+
+        if url.path in ('/listfolder', '/createfolder', '/deletefile'):
+            self.send_json({"result": 0})
+        elif url.path == '/getfilelink':
+            self.send_json({
+                "result": 0,
+                "hosts": [f"127.0.0.1:{self.server.server_address[1]}"],
+                "path": f"/file/{params['fileid']}",
+                "expires": email.utils.formatdate(time.time() + 3600, usegmt=True)
+            })
+        elif url.path.startswith('/file/'):
+            self.send_file(int(url.path.rsplit('/', 1)[-1]))
+        else:
+            self.send_error(404)
+
+    def send_file(self, file_id):
+        with self.files_lock:
+            data, content_type = self.files.get(file_id, (None, None))
+        if data is None:
+            self.send_error(404)
+            return
+
+        time.sleep(self.download_delay)  # Distance to the real Pcloud download servers
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.files_lock:
+            PcloudStandIn.bytes_sent += len(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        message = email.message_from_bytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        for part in message.get_payload():
+            if part.get_param('name', header='content-disposition') == 'file':
+                with self.files_lock:
+                    file_id = len(self.files) + 1
+                    self.files[file_id] = (part.get_payload(decode=True), part.get_content_type())
+                self.send_json({"result": 0, "metadata": [{"fileid": file_id}]})
+                return
+        self.send_json({"result": 2000, "error": "No file"})
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def process_cpu_seconds(pid):
+    """User + system CPU time of a process from /proc (Linux only)"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def request(host, port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        header_bytes = sum(len(k) + len(v) + 4 for k, v in response.getheaders())
+        return response.status, dict(response.getheaders()), data, header_bytes
+    finally:
+        connection.close()
+
+SETUPS = [('local', 'proxy'), ('pcloud', 'proxy'), ('pcloud', 'redirect')]
+
+def start_server(store, mode, pcloud_port, workdir):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        IMAGE_STORE=store,
+        IMAGE_STORE_DIR=os.path.join(workdir, 'image_store'),
+        PCLOUD_AUTH_TOKEN='bench',
+        PCLOUD_API_URL=f'http://127.0.0.1:{pcloud_port}',
+        IMAGE_SERVE_MODE=mode,
+        IMAGE_WEBP_ENABLED='0',
+        IMAGE_CACHE_DIR=os.path.join(workdir, 'image_cache'),
+        GITHUB_GIST_TOKEN='',
+        GITHUB_GIST_ID=''
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, 'chatroom.py')],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            request('127.0.0.1', port, 'GET', '/api/status')
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"chatroom.py did not start with the {store} store in {mode} mode")
+
+def seed_images(port, count, size):
+    credentials = json.dumps({"username": "bench", "password": "benchmark"})
+    request('127.0.0.1', port, 'POST', '/api/auth/register', credentials, {"Content-Type": "application/json"})
+    _, _, body, _ = request('127.0.0.1', port, 'POST', '/api/auth/login', credentials, {"Content-Type": "application/json"})
+    cookie = f"session_id={json.loads(body)['session_id']}"
+
+    image_ids = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        Image.effect_noise((size, size), 40 + i).convert('RGB').save(buffer, 'JPEG', quality=90)
+        _, _, body, _ = request(
+            '127.0.0.1', port, 'POST', f'/api/chat/upload-image?filename=bench{i}.jpg',
+            buffer.getvalue(), {"Content-Type": "image/jpeg", "Cookie": cookie}
+        )
+        image_ids.append(json.loads(body)['imageId'])
+    return image_ids
+
+def fetch_image(port, image_id):
+    """Fetch one image like a browser: follow a redirect if the server sends one"""
+    started = time.perf_counter()
+    status, headers, body, header_bytes = request('127.0.0.1', port, 'GET', f'/api/images/{image_id}', headers={"Accept": "image/jpeg"})
+    server_bytes = len(body) + header_bytes
+    if status == 302:
+        location = urllib.parse.urlparse(headers['Location'])
+        status, _, body, _ = request(location.hostname, location.port, 'GET', location.path)
+    if status != 200 or not body:
+        raise RuntimeError(f"Image fetch failed with status {status}")
+    return time.perf_counter() - started, server_bytes
+
+def run_setup(store, mode, args):
+    workdir = tempfile.mkdtemp(prefix=f'chatroom-bench-{store}-{mode}-')
+    process, port = start_server(store, mode, args.pcloud_port, workdir)
+    try:
+        image_ids = seed_images(port, args.images, args.image_size)
+        fetch_image(port, image_ids[0])  # Warm up link cache / disk cache paths
+
+        latencies = []
+        server_bytes = []
+        results_lock = threading.Lock()
+        per_client = args.requests // args.concurrency
+
+        def client(seed):
+            rng = random.Random(seed)
+            for _ in range(per_client):
+                latency, sent = fetch_image(port, rng.choice(image_ids))
+                with results_lock:
+                    latencies.append(latency)
+                    server_bytes.append(sent)
+
+        upstream_before = PcloudStandIn.bytes_sent
+        cpu_before = process_cpu_seconds(process.pid)
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        cpu_used = process_cpu_seconds(process.pid) - cpu_before
+
+        latencies.sort()
+        return {
+            "store": store,
+            "mode": mode,
+            "requests": len(latencies),
+            "elapsed_s": round(elapsed, 3),
+            "server_cpu_s": round(cpu_used, 3),
+            "server_bytes_out": sum(server_bytes),
+            "pcloud_bytes_out": PcloudStandIn.bytes_sent - upstream_before,
+            "latency_p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2)
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--images', type=int, default=5)
+    parser.add_argument('--image-size', type=int, default=800, help="Edge length of the generated test images")
+    parser.add_argument('--pcloud-delay-ms', type=float, default=20, help="Simulated latency of Pcloud downloads")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    PcloudStandIn.download_delay = args.pcloud_delay_ms / 1000
+    pcloud = socketserver.ThreadingTCPServer(('127.0.0.1', 0), PcloudStandIn)
+    pcloud.daemon_threads = True
+    threading.Thread(target=pcloud.serve_forever, daemon=True).start()
+    args.pcloud_port = pcloud.server_address[1]
+
+    results = [run_setup(store, mode, args) for store, mode in SETUPS]
+    pcloud.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print("  ".join(f"{column:>16}" for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]!s:>16}" for column in columns))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Measure what HTTP/1.1 keep-alive saves on the chat polling path.
+
+Starts one chat_server.py (memory image store) and runs the same number of
+/api/chat/messages polls from concurrent clients twice: once opening a new
+connection per request, the way an HTTP/1.0 server forced clients to, and
+once reusing one persistent connection per client. Reports throughput,
+connections opened, connections per second saved, server CPU time and
+client latency.
+
+    python benchmarks/keepalive.py --requests 2000 --concurrency 8
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from image_serve_modes import free_port, process_cpu_seconds, request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_server(workdir, max_requests):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        IMAGE_STORE='memory',
+        KEEPALIVE_MAX_REQUESTS=str(max_requests),
+        GITHUB_GIST_TOKEN='',
+        GITHUB_GIST_ID=''
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, 'chat_server.py')],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            request('127.0.0.1', port, 'GET', '/api/status')
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("chat_server.py did not start")
+
+def seed_messages(port, count):
+    credentials = json.dumps({"username": "bench", "password": "benchmark"})
+    request('127.0.0.1', port, 'POST', '/api/auth/register', credentials, {"Content-Type": "application/json"})
+    _, _, body, _ = request('127.0.0.1', port, 'POST', '/api/auth/login', credentials, {"Content-Type": "application/json"})
+    cookie = f"session_id={json.loads(body)['session_id']}"
+
+    for i in range(count):
+        message = json.dumps({"message": f"Benchmark message {i}"})
+        request('127.0.0.1', port, 'POST', '/api/chat/send', message, {"Content-Type": "application/json", "Cookie": cookie})
+    return cookie
+
+def run_mode(port, process, cookie, keepalive, args):
+    latencies = []
+    connections = []
+    results_lock = threading.Lock()
+    per_client = args.requests // args.concurrency
+    headers = {"Cookie": cookie, "Accept-Encoding": "gzip"}
+
+    def client():
+        connection = None
+        opened = 0
+        timings = []
+        for _ in range(per_client):
+            started = time.perf_counter()
+            if connection is None:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                opened += 1
+            connection.request('GET', '/api/chat/messages', headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"Poll failed with status {response.status}")
+            if not keepalive or response.will_close:
+                connection.close()
+                connection = None
+            timings.append(time.perf_counter() - started)
+        if connection is not None:
+            connection.close()
+        with results_lock:
+            latencies.extend(timings)
+            connections.append(opened)
+
+    cpu_before = process_cpu_seconds(process.pid)
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    cpu_used = process_cpu_seconds(process.pid) - cpu_before
+
+    latencies.sort()
+    return {
+        "mode": "keep-alive" if keepalive else "close",
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "connections": sum(connections),
+        "connections_per_s": round(sum(connections) / elapsed, 1),
+        "server_cpu_s": round(cpu_used, 3),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=20, help="Messages in the chat history each poll returns")
+    parser.add_argument('--max-requests', type=int, default=1000, help="KEEPALIVE_MAX_REQUESTS for the server")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='chatroom-bench-keepalive-')
+    process, port = start_server(workdir, args.max_requests)
+    try:
+        cookie = seed_messages(port, args.messages)
+        results = [run_mode(port, process, cookie, keepalive, args) for keepalive in (False, True)]
+    finally:
+        process.terminate()
+        process.wait()
+
+    # Connections a keep-alive server spares per second at the close-mode request rate
+    close, keepalive = results
+    saved_per_request = (close["connections"] - keepalive["connections"]) / close["requests"]
+    keepalive["connections_saved_per_s"] = round(saved_per_request * close["requests_per_s"], 1)
+    close["connections_saved_per_s"] = 0
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print("  ".join(f"{column:>16}" for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]!s:>16}" for column in columns))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,511 @@
+"""Load-test the chat server with simulated pollers, senders, uploaders and logins.
+
+Starts local stand-ins for Pcloud, the GitHub gist API and the backup
+webhook, then one chatroom.py server wired to them, and drives it with
+concurrent user populations for a fixed duration:
+
+  pollers    log in, poll /api/chat/messages for what came after the last
+             id seen (keep-alive, gzip, ETags) and fetch each newly
+             shared image once, like the chat page; a poll that returns
+             a message it already had counts as an error
+  senders    post chat messages
+  uploaders  upload new JPEGs, and now and then re-share one of theirs by hash
+  logins     log in, check the session and log out again
+
+Reports per-operation throughput, p50/p95/p99 latency and error rate,
+plus server CPU and RSS. Results are saved as JSON; pass a previous
+results file as --baseline to flag regressions (exit status 1).
+
+    python benchmarks/load_test.py --duration 30 --pollers 50 --output run.json
+    python benchmarks/load_test.py --duration 30 --pollers 50 --baseline run.json
+"""
+import argparse
+import gzip
+import hashlib
+import http.client
+import http.server
+import io
+import json
+import os
+import random
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from PIL import Image
+
+from image_serve_modes import PcloudStandIn, free_port, process_cpu_seconds, request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORES = ('pcloud', 'gist', 'local', 'memory')
+
+class GithubStandIn(http.server.BaseHTTPRequestHandler):
+    """Just enough of the gist API (and raw gist files) for chat backups and the gist image store"""
+
+    protocol_version = 'HTTP/1.1'
+    gists = {}  # gist id -> {filename: content}
+    revisions = {}  # gist id -> revision number
+    gists_lock = threading.Lock()
+    delay = 0.0
+    calls = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def count_call(self):
+        with self.gists_lock:
+            GithubStandIn.calls += 1
+        time.sleep(self.delay)
+
+    def do_GET(self):
+        self.count_call()
+        parts = urllib.parse.urlparse(self.path).path.strip('/').split('/')
+        with self.gists_lock:
+            if parts[0] == 'gists' and len(parts) == 2:
+                files = self.gists.get(parts[1], {})
+                data = {"id": parts[1], "files": {name: {"content": content} for name, content in files.items()}}
+            elif parts[0] == 'gists' and parts[2:] == ['commits']:
+                data = [{"user": {"login": "bench"}, "version": str(self.revisions.get(parts[1], 0))}]
+            elif len(parts) >= 4 and parts[2] == 'raw':
+                # /<owner>/<gist id>/raw[/<version>]/<file>
+                data = self.gists.get(parts[1], {}).get(parts[-1])
+                if data is None:
+                    self.send_error(404)
+                    return
+                body = data.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            else:
+                self.send_error(404)
+                return
+        self.send_json(data)
+
+    def do_PATCH(self):
+        self.count_call()
+        gist_id = urllib.parse.urlparse(self.path).path.strip('/').split('/')[-1]
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with self.gists_lock:
+            files = self.gists.setdefault(gist_id, {})
+            for name, change in body.get("files", {}).items():
+                if change is None:
+                    files.pop(name, None)
+                else:
+                    files[name] = change.get("content", "")
+            self.revisions[gist_id] = self.revisions.get(gist_id, 0) + 1
+        self.send_json({"id": gist_id})
+
+class WebhookStandIn(http.server.BaseHTTPRequestHandler):
+    """Accepts backup POSTs and counts them"""
+
+    protocol_version = 'HTTP/1.1'
+    received = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        WebhookStandIn.received += 1
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+def start_stand_in(handler):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def process_rss_mb(pid):
+    """Resident set size of a process from /proc (Linux only)"""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def start_server(args, workdir, ports):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        IMAGE_STORE=args.store,
+        IMAGE_STORE_DIR=os.path.join(workdir, 'image_store'),
+        IMAGE_CACHE_DIR=os.path.join(workdir, 'image_cache'),
+        PCLOUD_AUTH_TOKEN='bench',
+        PCLOUD_API_URL=f"http://127.0.0.1:{ports['pcloud']}",
+        GITHUB_API_URL=f"http://127.0.0.1:{ports['github']}",
+        GITHUB_RAW_URL=f"http://127.0.0.1:{ports['github']}",
+        GITHUB_GIST_TOKEN='bench',
+        GITHUB_GIST_ID='chat-backup' if args.backup == 'gist' else '',
+        GITHUB_IMAGES_GIST_ID='chat-images',
+        BACKUP_WEBHOOK_URL=f"http://127.0.0.1:{ports['webhook']}/backup",
+        BACKUP_INTERVAL=str(args.backup_interval)
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, 'chatroom.py')],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(150):
+        try:
+            request('127.0.0.1', port, 'GET', '/api/status')
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"chatroom.py did not start with the {args.store} store")
+
+class Recorder:
+    """Latency and outcome of every operation, by operation name"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}  # operation -> [(latency, ok)]
+
+    def record(self, operation, started, ok):
+        latency = time.perf_counter() - started
+        with self.lock:
+            self.samples.setdefault(operation, []).append((latency, ok))
+
+    def summary(self, elapsed):
+        results = {}
+        with self.lock:
+            samples = {operation: list(values) for operation, values in self.samples.items()}
+
+        for operation, values in sorted(samples.items()):
+            latencies = sorted(latency for latency, _ in values)
+            errors = sum(1 for _, ok in values if not ok)
+
+            def percentile(fraction):
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 2)
+
+            results[operation] = {
+                "count": len(values),
+                "throughput_per_s": round(len(values) / elapsed, 1),
+                "error_rate": round(errors / len(values), 4),
+                "latency_p50_ms": percentile(0.5),
+                "latency_p95_ms": percentile(0.95),
+                "latency_p99_ms": percentile(0.99)
+            }
+        return results
+
+class Client:
+    """One simulated browser: a keep-alive connection and a session cookie"""
+
+    def __init__(self, port, recorder):
+        self.port = port
+        self.recorder = recorder
+        self.connection = None
+        self.cookie = None
+        self.registered = False
+
+    def call(self, operation, method, path, body=None, headers=None, validate=None):
+        """Send a request, reconnecting once if the server closed the kept-alive connection.
+
+        `validate(headers, data)` can fail a response that came back 200.
+        """
+        headers = dict(headers or {}, **({"Cookie": self.cookie} if self.cookie else {}))
+        started = time.perf_counter()
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.close()
+                break
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt:
+                    self.recorder.record(operation, started, False)
+                    return None, {}, b''
+        ok = response.status in (200, 302, 304)
+        if ok and response.headers.get('Content-Type', '').startswith('application/json') and not response.headers.get('Content-Encoding'):
+            ok = json.loads(data).get("success", True) is not False
+        if ok and validate and response.status == 200:
+            ok = validate(response.headers, data)
+        self.recorder.record(operation, started, ok)
+        return response.status, response.headers, data
+
+    def login(self, username, password):
+        credentials = json.dumps({"username": username, "password": password})
+        if not self.registered:
+            self.call('register', 'POST', '/api/auth/register', credentials, {"Content-Type": "application/json"})
+            self.registered = True
+        status, _, data = self.call('login', 'POST', '/api/auth/login', credentials, {"Content-Type": "application/json"})
+        session_id = json.loads(data).get('session_id') if status == 200 else None
+        self.cookie = f"session_id={session_id}" if session_id else None
+        return bool(session_id)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def make_jpeg(seed, size):
+    buffer = io.BytesIO()
+    Image.effect_noise((size, size), 20 + seed % 60).convert('RGB').rotate(seed % 360).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+def run_load(args, port):
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def arrive(rng):
+        """Wait for this user's arrival time; everyone showing up in the same millisecond isn't realistic"""
+        stop.wait(rng.uniform(0, args.ramp_up))
+        return not stop.is_set()
+
+    def paced(interval, rng, action):
+        """Repeat an action every interval seconds (jittered) until the run ends"""
+        stop.wait(rng.uniform(0, interval))  # Spread out the first requests
+        while not stop.is_set():
+            started = time.perf_counter()
+            action()
+            stop.wait(max(0.0, rng.uniform(0.8, 1.2) * interval - (time.perf_counter() - started)))
+
+    def poller(index):
+        rng = random.Random(index)
+        client = Client(port, recorder)
+        if not arrive(rng) or not client.login(f"poller{index}", "benchmark"):
+            return
+        etag = None
+        last_id = 0
+        received = None  # The decoded body of the poll in progress
+        seen_images = set()
+
+        def only_newer(response_headers, body):
+            nonlocal received
+            if response_headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            received = json.loads(body)
+            return all(message["id"] > last_id for message in received.get("messages", []))
+
+        def poll():
+            nonlocal etag, last_id, received
+            received = None
+            headers = {"Accept-Encoding": "gzip", **({"If-None-Match": etag} if etag else {})}
+            status, response_headers, _ = client.call(
+                'poll', 'GET', f'/api/chat/messages?since={last_id}', headers=headers, validate=only_newer
+            )
+            if status != 200 or received is None:
+                return
+            etag = response_headers.get('ETag')
+            if received.get("messages"):
+                last_id = received["lastId"]
+            for message in received.get("messages", []):
+                image_id = message.get("image_id")
+                if image_id and image_id not in seen_images:
+                    seen_images.add(image_id)
+                    client.call('image', 'GET', f'/api/images/{image_id}', headers={"Accept": "image/jpeg"})
+
+        paced(args.poll_interval, rng, poll)
+        client.close()
+
+    def sender(index):
+        rng = random.Random(1000 + index)
+        client = Client(port, recorder)
+        if not arrive(rng) or not client.login(f"sender{index}", "benchmark"):
+            return
+        words = "hello there how is everyone doing today lunch meeting later 😀".split()
+
+        def send():
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(2, 20)))
+            client.call('send', 'POST', '/api/chat/send', json.dumps({"text": text}), {"Content-Type": "application/json"})
+
+        paced(args.send_interval, rng, send)
+        client.close()
+
+    def uploader(index):
+        rng = random.Random(2000 + index)
+        client = Client(port, recorder)
+        if not arrive(rng) or not client.login(f"uploader{index}", "benchmark"):
+            return
+        counter = 0
+        uploaded_hashes = []  # The server only lets the sender of an image re-share it by hash
+
+        def upload():
+            nonlocal counter
+            reshare = uploaded_hashes and rng.random() < args.reshare_ratio
+            source_hash = rng.choice(uploaded_hashes) if reshare else None
+            if source_hash:
+                body = json.dumps({"sha256": source_hash, "filename": "again.jpg"})
+                client.call('share', 'POST', '/api/chat/share-image', body, {"Content-Type": "application/json"})
+                return
+
+            counter += 1
+            image = make_jpeg(index * 100000 + counter, args.image_size)
+            status, _, _ = client.call(
+                'upload', 'POST', f'/api/chat/upload-image?filename=bench{index}-{counter}.jpg',
+                image, {"Content-Type": "image/jpeg"}
+            )
+            if status == 200:
+                uploaded_hashes.append(hashlib.sha256(image).hexdigest())
+
+        paced(args.upload_interval, rng, upload)
+        client.close()
+
+    def login_cycler(index):
+        rng = random.Random(3000 + index)
+        client = Client(port, recorder)
+        username = f"visitor{index}"
+        if not arrive(rng):
+            return
+
+        def cycle():
+            if client.login(username, "benchmark"):
+                client.call('auth_check', 'GET', '/api/auth/check')
+                client.call('logout', 'POST', '/api/auth/logout', b'')
+            client.cookie = None
+
+        paced(args.login_interval, rng, cycle)
+        client.close()
+
+    populations = [(poller, args.pollers), (sender, args.senders), (uploader, args.uploaders), (login_cycler, args.logins)]
+    threads = [threading.Thread(target=target, args=(i,), daemon=True) for target, count in populations for i in range(count)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    return recorder, stop, threads, started
+
+def compare(results, baseline, tolerance):
+    """Regressions of this run against a baseline run: slower p95, lower throughput or more errors"""
+    regressions = []
+    for operation, current in results["operations"].items():
+        previous = baseline.get("operations", {}).get(operation)
+        if not previous:
+            continue
+        if current["latency_p95_ms"] > previous["latency_p95_ms"] * (1 + tolerance) and current["latency_p95_ms"] - previous["latency_p95_ms"] > 1:
+            regressions.append(f"{operation}: p95 {previous['latency_p95_ms']}ms -> {current['latency_p95_ms']}ms")
+        if current["throughput_per_s"] < previous["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{operation}: throughput {previous['throughput_per_s']}/s -> {current['throughput_per_s']}/s")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{operation}: error rate {previous['error_rate']:.2%} -> {current['error_rate']:.2%}")
+
+    previous_rss = baseline.get("server", {}).get("rss_peak_mb")
+    if previous_rss and results["server"]["rss_peak_mb"] > previous_rss * (1 + tolerance):
+        regressions.append(f"server: peak RSS {previous_rss}MB -> {results['server']['rss_peak_mb']}MB")
+    return regressions
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run the load for")
+    parser.add_argument('--store', choices=STORES, default='pcloud', help="Image store the server uses")
+    parser.add_argument('--ramp-up', type=float, default=2.0, help="Seconds over which the simulated users arrive")
+    parser.add_argument('--pollers', type=int, default=50)
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between polls (the chat page uses 2)")
+    parser.add_argument('--senders', type=int, default=5)
+    parser.add_argument('--send-interval', type=float, default=3.0)
+    parser.add_argument('--uploaders', type=int, default=2)
+    parser.add_argument('--upload-interval', type=float, default=5.0)
+    parser.add_argument('--reshare-ratio', type=float, default=0.3, help="Share of uploads that re-share a stored image by hash")
+    parser.add_argument('--image-size', type=int, default=600, help="Edge length of the uploaded test images")
+    parser.add_argument('--logins', type=int, default=2)
+    parser.add_argument('--login-interval', type=float, default=2.0)
+    parser.add_argument('--backup', choices=('gist', 'webhook'), default='gist', help="Where periodic chat backups go")
+    parser.add_argument('--backup-interval', type=int, default=10, help="BACKUP_INTERVAL for the server")
+    parser.add_argument('--upstream-delay-ms', type=float, default=20, help="Simulated latency of the Pcloud/GitHub stand-ins")
+    parser.add_argument('--output', help="Save the results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against a previous results file and exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative slowdown before a change counts as a regression")
+    args = parser.parse_args()
+
+    PcloudStandIn.download_delay = args.upstream_delay_ms / 1000
+    GithubStandIn.delay = args.upstream_delay_ms / 1000
+    stand_ins = {name: start_stand_in(handler) for name, handler in
+                 (('pcloud', PcloudStandIn), ('github', GithubStandIn), ('webhook', WebhookStandIn))}
+    ports = {name: server.server_address[1] for name, server in stand_ins.items()}
+
+    workdir = tempfile.mkdtemp(prefix=f'chatroom-load-{args.store}-')
+    process, port = start_server(args, workdir, ports)
+    try:
+        rss_start = process_rss_mb(process.pid)
+        cpu_before = process_cpu_seconds(process.pid)
+        recorder, stop, threads, started = run_load(args, port)
+
+        rss_samples = [rss_start]
+        while time.perf_counter() - started < args.duration:
+            time.sleep(0.5)
+            rss_samples.append(process_rss_mb(process.pid))
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=30)
+        elapsed = time.perf_counter() - started
+
+        results = {
+            "revision": git_revision(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "config": {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+            "elapsed_s": round(elapsed, 2),
+            "operations": recorder.summary(elapsed),
+            "server": {
+                "cpu_s": round(process_cpu_seconds(process.pid) - cpu_before, 2),
+                "rss_start_mb": round(rss_start, 1),
+                "rss_peak_mb": round(max(rss_samples), 1),
+                "rss_end_mb": round(rss_samples[-1], 1)
+            },
+            "upstreams": {
+                "github_calls": GithubStandIn.calls,
+                "webhook_backups": WebhookStandIn.received,
+                "pcloud_bytes_out": PcloudStandIn.bytes_sent
+            }
+        }
+    finally:
+        process.terminate()
+        process.wait()
+        for server in stand_ins.values():
+            server.shutdown()
+
+    columns = ["count", "throughput_per_s", "error_rate", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms"]
+    print(f"{'operation':>12}  " + "  ".join(f"{column:>16}" for column in columns))
+    for operation, summary in results["operations"].items():
+        print(f"{operation:>12}  " + "  ".join(f"{summary[column]!s:>16}" for column in columns))
+    print(f"server: {results['server']}  upstreams: {results['upstreams']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        changed = sorted(key for key, value in results["config"].items()
+                         if key != 'tolerance' and baseline.get("config", {}).get(key, value) != value)
+        if changed:
+            print(f"⚠️ The baseline ran with different settings ({', '.join(changed)}); the comparison may not be meaningful")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Measure the memory each chat message takes in the buffer, as a dict and as a ChatMessage.
+
+Builds the same realistic message mix both ways (the dicts the server
+used to keep, with ISO timestamp strings, and the slotted ChatMessage
+records) and reports the bytes per message traced by tracemalloc. Message
+texts are counted in both, since they are the same strings either way.
+
+    python benchmarks/message_memory.py --messages 100000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_messages import ChatMessage, MessageType
+
+USERNAMES = ['alice', 'bob', 'charlie', 'dana_m', 'eve2000', 'frank']
+WORDS = "hey hi lol ok sure thanks see you later meeting lunch today tomorrow 😀 🎉 👍 image voice call check this out".split()
+
+def message_specs(count, seed=1):
+    """Field values for a message mix: 85% text, 15% image shares"""
+    rng = random.Random(seed)
+    started = datetime(2026, 3, 1, 9, 0)
+    for i in range(count):
+        spec = {
+            'username': rng.choice(USERNAMES),
+            'text': ' '.join(rng.choice(WORDS) for _ in range(rng.choice([2, 4, 6, 12]))),
+            'time': started + timedelta(seconds=37 * i, microseconds=rng.randrange(10 ** 6)),
+            'ip': f"203.0.113.{rng.randrange(1, 16)}"
+        }
+        if rng.random() < 0.15:
+            spec['filename'] = f"IMG_{rng.randrange(1000, 9999)}.jpg"
+            spec['image_id'] = f"{rng.getrandbits(256):064x}"
+            spec['caption'] = ' '.join(rng.choice(WORDS) for _ in range(rng.choice([0, 3])))
+        yield spec
+
+SESSION_USERNAMES = {}  # The server took usernames from the session, so all of a user's messages shared one string
+
+def as_dict(i, spec):
+    """The message as the server used to build it"""
+    message = {
+        'id': i + 1,
+        'username': SESSION_USERNAMES.setdefault(spec['username'], spec['username']),
+        'text': spec['text'],
+        'timestamp': spec['time'].isoformat(),
+        'ip': spec['ip'],
+        'type': 'text'
+    }
+    if 'image_id' in spec:
+        message.update({
+            'type': 'image',
+            'image_id': spec['image_id'],
+            'filename': spec['filename'],
+            'caption': spec['caption'],
+            'variant_widths': [320, 640]
+        })
+    return message
+
+def as_record(i, spec):
+    if 'image_id' not in spec:
+        return ChatMessage(i + 1, spec['username'], spec['text'], spec['time'].timestamp(), spec['ip'])
+    return ChatMessage(
+        i + 1, spec['username'], spec['text'], spec['time'].timestamp(), spec['ip'], MessageType.IMAGE,
+        spec['image_id'], spec['filename'], spec['caption'], [320, 640]
+    )
+
+def traced_bytes(build, specs):
+    """Bytes still allocated after building one message per spec"""
+    # The inputs are copied so neither side shares strings with the specs (or the other side)
+    specs = json.loads(json.dumps([dict(spec, time=spec['time'].isoformat()) for spec in specs]))
+    for spec in specs:
+        spec['time'] = datetime.fromisoformat(spec['time'])
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = [build(i, spec) for i, spec in enumerate(specs)]
+    specs.clear()  # Drop the inputs; only what the messages keep stays allocated
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del messages
+    return used
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    specs = list(message_specs(args.messages))
+    for spec in specs[:50]:
+        record = as_record(0, spec)
+        if ChatMessage.from_dict(record.to_dict()).to_dict() != record.to_dict():
+            raise RuntimeError("ChatMessage does not survive a backup round trip")
+
+    results = []
+    for name, build in (('dict', as_dict), ('ChatMessage', as_record)):
+        used = traced_bytes(build, specs)
+        results.append({
+            "representation": name,
+            "messages": args.messages,
+            "total_mb": round(used / 1024 / 1024, 2),
+            "bytes_per_message": round(used / args.messages)
+        })
+    saved = 1 - results[1]["bytes_per_message"] / results[0]["bytes_per_message"]
+    results[1]["saved"] = f"{saved:.0%}"
+    results[0]["saved"] = "-"
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print("  ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]!s:>18}" for column in columns))
+
+if __name__ == '__main__':
+    main()
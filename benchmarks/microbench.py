@@ -0,0 +1,259 @@
+"""Time the chat server's hot functions in-process and catch regressions.
+
+Each case is timed with timeit (best of --repeat runs, each long enough
+to be measurable) against module state seeded the way a busy server has
+it: full message buffers, many sessions and users, a populated image
+catalog. Handler methods run on a ChatroomHandler without a socket, with
+the response written to memory. Runs in a few seconds.
+
+Results can be saved as JSON; pass a previous results file as --baseline
+and the run exits 1 when any case got slower by more than --threshold.
+
+    python benchmarks/microbench.py --output micro.json
+    python benchmarks/microbench.py --baseline micro.json --threshold 0.25
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('IMAGE_STORE', 'memory')  # No backend to reach; only the catalog is exercised
+os.environ.setdefault('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'chatroom-microbench-cache'))
+import chat_server
+from chat_messages import ChatMessage, MessageType
+
+BUFFER_SIZES = (10, 50, 100)  # The server keeps at most 100 messages
+SESSIONS = 1000
+USERS = 500
+CATALOG_IMAGES = 1000
+MIN_REGRESSION_US = 0.5  # Below this, a slowdown is timer jitter rather than a change worth failing on
+
+class BenchHandler(chat_server.ChatroomHandler):
+    """A handler with no connection: the request comes from memory and the response goes to a buffer"""
+
+    def __init__(self, headers=None, body=b'', path='/'):
+        raw = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items()) + "\r\n"
+        self.headers = http.client.parse_headers(io.BytesIO(raw.encode()))
+        self.rfile = io.BytesIO(body)
+        self.wfile = io.BytesIO()
+        self.path = path
+        self.command = 'POST' if body else 'GET'
+        self.request_version = 'HTTP/1.1'
+        self.client_address = ('203.0.113.7', 50000)
+        self.close_connection = False
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+    def reset(self, body=b''):
+        self.rfile = io.BytesIO(body)
+        self.wfile = io.BytesIO()
+        self._headers_buffer = []
+
+def seed_messages(count):
+    """Replace the buffer with `count` messages, every seventh an image share"""
+    started = datetime(2026, 3, 1, 9, 0).timestamp()
+    with chat_server.chatroom_lock:
+        chat_server.chatroom_messages.clear()
+        chat_server.message_fragments.clear()
+        for i in range(count):
+            if i % 7 == 0:
+                message = ChatMessage(
+                    i + 1, f"user{i % 12}", f"📸 Shared an image: IMG_{i:04d}.jpg", started + 37 * i, '203.0.113.7',
+                    MessageType.IMAGE, f"{i:064x}", f"IMG_{i:04d}.jpg", "Look at this", (320, 640)
+                )
+            else:
+                message = ChatMessage(i + 1, f"user{i % 12}", f"Message {i} with some text and an emoji 😀", started + 37 * i, '203.0.113.7')
+            chat_server.chatroom_messages.append(message)
+            chat_server.message_fragments.add(message)
+        chat_server.mark_chatroom_changed()
+
+def seed_users_and_sessions():
+    """USERS accounts and SESSIONS live sessions; returns the session cookie of one of them"""
+    now = datetime.now()
+    with chat_server.users_lock:
+        chat_server.users_db.clear()
+        chat_server.user_sessions.clear()
+        for i in range(USERS):
+            chat_server.users_db[f"user{i}"] = {
+                "password_hash": chat_server.DataPersistence.hash_password(f"password{i}"),
+                "created": now - timedelta(days=i % 90),
+                "last_seen": now
+            }
+        for i in range(SESSIONS):
+            session_id = chat_server.DataPersistence.generate_session_id()
+            chat_server.user_sessions[session_id] = {"username": f"user{i % USERS}", "expires": now + timedelta(days=1)}
+    return f"theme=dark; session_id={session_id}; lang=en"
+
+def seed_image_catalog():
+    """CATALOG_IMAGES catalog entries, indexed the way the store indexes them on startup"""
+    store = chat_server.image_store
+    with store.catalog_lock:
+        store.catalog.clear()
+        store.source_index.clear()
+        for i in range(CATALOG_IMAGES):
+            store.index_entry(f"{i:064x}", {
+                'filename': f"IMG_{i:04d}.jpg",
+                'uploaded_by': f"user{i % 12}",
+                'content_type': 'image/jpeg',
+                'size': 150000 + i,
+                'source_hashes': [f"{i + CATALOG_IMAGES:064x}"],
+                'variants': {'320': {'size': 20000}, '640': {'size': 60000}}
+            })
+    return f"{CATALOG_IMAGES // 2:064x}", f"{CATALOG_IMAGES // 2 + CATALOG_IMAGES:064x}"
+
+def build_cases():
+    """(name, setup, statement) for every case; setup seeds state and returns the statement's handler, if any"""
+    cookie = seed_users_and_sessions()
+    image_id, source_hash = seed_image_catalog()
+    cases = []
+
+    for size in BUFFER_SIZES:
+        def poll_setup(size=size, **headers):
+            seed_messages(size)
+            return BenchHandler({"Cookie": cookie, **headers}, path='/api/chat/messages?since=0')
+
+        def poll_uncached(handler):
+            with chat_server.chatroom_lock:
+                chat_server.mark_chatroom_changed()  # As after a send: the shared body is rebuilt
+            handler.reset()
+            handler.handle_chat_messages(handler.path)
+
+        def poll_cached(handler):
+            handler.reset()
+            handler.handle_chat_messages(handler.path)
+
+        cases.append((f"poll uncached ({size} messages)", poll_setup, poll_uncached))
+        cases.append((f"poll cached ({size} messages)", poll_setup, poll_cached))
+
+    def poll_not_modified_setup():
+        seed_messages(100)
+        with chat_server.chatroom_lock:
+            etag = f'"messages-{chat_server.BOOT_ID}-{chat_server.chatroom_version}-0"'
+        return BenchHandler({"Cookie": cookie, "If-None-Match": etag}, path='/api/chat/messages?since=0')
+
+    cases.append(("poll 304 (100 messages)", poll_not_modified_setup, poll_cached))
+
+    def poll_delta_setup():
+        seed_messages(100)
+        return BenchHandler({"Cookie": cookie}, path='/api/chat/messages?since=97')
+
+    cases.append(("poll uncached, 3 new (100 messages)", poll_delta_setup, poll_uncached))
+
+    send_body = json.dumps({"text": "A new message for the full buffer 👋"}).encode()
+
+    def send_setup():
+        seed_messages(100)
+        return BenchHandler({"Cookie": cookie, "Content-Length": str(len(send_body))}, send_body, '/api/chat/send')
+
+    def send(handler):
+        # Each send assigns the next id, appends and trims the oldest message
+        handler.reset(send_body)
+        handler.handle_chat_send()
+
+    cases.append(("send with trim (100 messages)", send_setup, send))
+
+    def session_setup():
+        return BenchHandler({"Cookie": cookie})
+
+    def session_check(handler):
+        session_id = handler.get_session_from_cookies()
+        handler.is_valid_session(session_id)
+
+    cases.append((f"session cookie + check ({SESSIONS} sessions)", session_setup, session_check))
+    cases.append(("hash_password", lambda: None, lambda _: chat_server.DataPersistence.hash_password("correct horse battery")))
+
+    def backup_setup():
+        seed_messages(100)
+
+    def backup_snapshot(_):
+        json.dumps(chat_server.DataPersistence.backup_snapshot(), indent=2)  # As it is sent to the gist
+
+    cases.append((f"backup snapshot + JSON ({USERS} users)", backup_setup, backup_snapshot))
+
+    def image_lookup(_):
+        store = chat_server.image_store
+        store.info(store.find_by_source_hash(source_hash))
+        store.info(image_id)
+
+    cases.append((f"image lookup by hash and id ({CATALOG_IMAGES} images)", lambda: None, image_lookup))
+    cases.append((f"image catalog snapshot ({CATALOG_IMAGES} images)", lambda: None,
+                  lambda _: chat_server.image_store.catalog_snapshot()))
+
+    def page_setup(**headers):
+        return BenchHandler({"Cookie": cookie, **headers}, path='/chat')
+
+    def serve_chatroom(handler):
+        handler.reset()
+        handler.serve_chatroom()
+
+    cases.append(("render login page (gzip)", lambda: None, lambda _: chat_server.LOGIN_PAGE.render('gzip')))
+    cases.append(("serve chatroom page", page_setup, serve_chatroom))
+    cases.append(("serve chatroom page (gzip)", lambda: page_setup(**{"Accept-Encoding": "gzip"}), serve_chatroom))
+    return cases
+
+def run_case(setup, statement, repeat, min_time):
+    """Best time per call in microseconds, and the loop count it was measured with"""
+    handler = setup()
+    timer = timeit.Timer(lambda: statement(handler))
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number * 1e6, number
+
+def compare(results, baseline, threshold):
+    """Cases that got slower than the baseline by more than threshold (a fraction)"""
+    previous = {result["case"]: result["us_per_call"] for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["case"])
+        if before and result["us_per_call"] > before * (1 + threshold) and result["us_per_call"] - before > MIN_REGRESSION_US:
+            regressions.append(f"{result['case']}: {before}µs -> {result['us_per_call']}µs ({result['us_per_call'] / before - 1:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help="Timing runs per case; the best one counts")
+    parser.add_argument('--min-time', type=float, default=0.02, help="Seconds each timing run should last at least")
+    parser.add_argument('--filter', help="Only run cases whose name contains this text")
+    parser.add_argument('--output', help="Save the results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against a previous results file and exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown per case, as a fraction")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for name, setup, statement in build_cases():
+        if args.filter and args.filter not in name:
+            continue
+        us_per_call, number = run_case(setup, statement, args.repeat, args.min_time)
+        results.append({"case": name, "us_per_call": round(us_per_call, 2), "loops": number})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{result['case']:>48}  {result['us_per_call']:>10.2f} µs")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"json_encoder": chat_server.JSON_ENCODER, "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No case more than {args.threshold:.0%} slower than the baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Measure the CPU one chat poll spends turning the message buffer into JSON.
+
+Compares the old path (json.dumps(indent=2) of the whole response for
+every poll) with compact encoding of the whole response and with the
+pre-encoded message fragments from json_codec, each with the stdlib
+encoder and, when it is installed, orjson. Runs in-process on a
+full 100-message buffer; no server is started.
+
+    python benchmarks/poll_serialization.py --polls 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json_codec
+from chat_messages import ChatMessage
+from wire_formats import INTERNAL_MESSAGE_FIELDS
+
+def make_messages(count):
+    """A buffer of dicts (as the server used to keep them) and the same messages as ChatMessage records"""
+    messages = []
+    for i in range(count):
+        message = {
+            'id': i + 1,
+            'username': f"user{i % 7}",
+            'text': f"Message number {i} with a bit of text, an emoji 😀 and <markup> to escape",
+            'timestamp': datetime(2026, 1, 1, 12, i % 60).isoformat(),
+            'ip': '203.0.113.7',
+            'type': 'text'
+        }
+        if i % 10 == 0:
+            message.update({
+                'type': 'image',
+                'image_id': f"img{i:08x}",
+                'filename': f"photo{i}.jpg",
+                'caption': "A caption",
+                'variant_widths': [320, 640, 1280]
+            })
+        messages.append(message)
+    return messages, [ChatMessage.from_dict(message) for message in messages]
+
+def poll_before(messages):
+    response = {"messages": messages, "lastId": messages[-1]['id'], "messageCount": len(messages)}
+    return json.dumps(response, indent=2).encode('utf-8')
+
+def poll_after(fragments, messages):
+    return b''.join([
+        b'{"messages":', fragments.encode_list(messages),
+        b',"lastId":', str(messages[-1].id).encode(),
+        b',"messageCount":', str(len(messages)).encode(), b'}'
+    ])
+
+def project(response):
+    """A decoded poll response without the internal fields the server no longer sends"""
+    messages = [{key: value for key, value in message.items() if key not in INTERNAL_MESSAGE_FIELDS}
+                for message in response["messages"]]
+    return dict(response, messages=messages)
+
+def measure(poll, polls):
+    poll()  # Warm up (and fill the fragment cache)
+    started = time.process_time()
+    for _ in range(polls):
+        body = poll()
+    elapsed = time.process_time() - started
+    return elapsed / polls, body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--polls', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=100, help="Messages in the buffer (the server keeps 100)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    messages, records = make_messages(args.messages)
+    expected = project(json.loads(poll_before(messages)))
+    installed_orjson = json_codec.orjson
+
+    results = []
+    cases = [('indent=2 per poll', 'json', lambda: poll_before(messages))]
+    response = {"messages": messages, "lastId": messages[-1]['id'], "messageCount": len(messages)}
+    for encoder in ('json', 'orjson') if installed_orjson else ('json',):
+        cases.append(('compact per poll', encoder, lambda: json_codec.dumps(response)))
+        fragments = json_codec.MessageFragments()
+        cases.append(('pre-encoded', encoder, lambda fragments=fragments: poll_after(fragments, records)))
+
+    for path, encoder, poll in cases:
+        json_codec.orjson = installed_orjson if encoder == 'orjson' else None
+        per_poll, body = measure(poll, args.polls)
+        if project(json.loads(body)) != expected:
+            raise RuntimeError(f"{path} with {encoder} produced a different response")
+        results.append({
+            "path": path,
+            "encoder": encoder,
+            "cpu_per_poll_us": round(per_poll * 1e6, 1),
+            "body_bytes": len(body)
+        })
+    json_codec.orjson = installed_orjson
+
+    baseline = results[0]["cpu_per_poll_us"]
+    for result in results:
+        result["speedup"] = round(baseline / result["cpu_per_poll_us"], 1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print("  ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]!s:>18}" for column in columns))
+
+if __name__ == '__main__':
+    main()
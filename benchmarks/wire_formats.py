@@ -0,0 +1,120 @@
+"""Compare the size and CPU cost of the chat poll response in each wire format.
+
+Builds a full 100-message buffer with a realistic mix (mostly short text
+messages, some long ones and image shares with captions) and encodes the
+poll response as the full JSON the server used to send (with the sender's
+ip), as the projected JSON it sends now, and as MessagePack and CBOR with
+short field tags when those libraries are installed. Reports raw and
+gzipped sizes and per-poll encode/decode CPU. Runs in-process.
+
+    python benchmarks/wire_formats.py --polls 500
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json_codec
+import wire_formats
+from chat_messages import ChatMessage
+
+WORDS = "hey hi lol ok sure thanks see you later meeting lunch today tomorrow 😀 🎉 👍 image voice call check this out".split()
+
+def make_messages(count, seed=1):
+    """A buffer of dicts (as the server used to keep them) and the same messages as ChatMessage records"""
+    rng = random.Random(seed)
+    started = datetime(2026, 3, 1, 9, 0)
+    messages = []
+    for i in range(count):
+        message = {
+            'id': i + 1,
+            'username': rng.choice(['alice', 'bob', 'charlie', 'dana_m', 'eve2000', 'frank']),
+            'text': ' '.join(rng.choice(WORDS) for _ in range(rng.choice([2, 4, 6, 12, 40]))),
+            'timestamp': (started + timedelta(seconds=37 * i, microseconds=rng.randrange(10 ** 6))).isoformat(),
+            'ip': f"203.0.113.{rng.randrange(1, 255)}",
+            'type': 'text'
+        }
+        if rng.random() < 0.15:
+            filename = f"IMG_{rng.randrange(1000, 9999)}.jpg"
+            message.update({
+                'text': f"📸 Shared an image: {filename}",
+                'type': 'image',
+                'image_id': f"{rng.getrandbits(64):016x}",
+                'filename': filename,
+                'caption': ' '.join(rng.choice(WORDS) for _ in range(rng.choice([0, 3, 8]))),
+                'variant_widths': [320, 640]
+            })
+        messages.append(message)
+    return messages, [ChatMessage.from_dict(message) for message in messages]
+
+def measure(function, polls):
+    function()
+    started = time.process_time()
+    for _ in range(polls):
+        result = function()
+    return (time.process_time() - started) / polls, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--polls', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    messages, records = make_messages(args.messages)
+    last_id, count = messages[-1]['id'], len(messages)
+
+    def full_json():
+        return json_codec.dumps({"messages": messages, "lastId": last_id, "messageCount": count})
+
+    def projected_json():
+        # What a poll costs when its body isn't cached yet: every message encoded from scratch
+        fragments = json_codec.MessageFragments()
+        return b''.join([
+            b'{"messages":', fragments.encode_list(records),
+            b',"lastId":', str(last_id).encode(), b',"messageCount":', str(count).encode(), b'}'
+        ])
+
+    cases = [
+        ('json (with ip)', full_json, json.loads),
+        ('json (projected, uncached)', projected_json, json.loads)
+    ]
+    if wire_formats.msgpack:
+        cases.append(('msgpack', lambda: wire_formats.encode_messages('application/msgpack', records, last_id, count),
+                      wire_formats.msgpack.unpackb))
+    if wire_formats.cbor2:
+        cases.append(('cbor', lambda: wire_formats.encode_messages('application/cbor', records, last_id, count),
+                      wire_formats.cbor2.loads))
+
+    results = []
+    for name, encode, decode in cases:
+        encode_time, body = measure(encode, args.polls)
+        decode_time, decoded = measure(lambda: decode(body), args.polls)
+        if len(decoded["messages"]) != count:
+            raise RuntimeError(f"{name} lost messages")
+        results.append({
+            "format": name,
+            "bytes": len(body),
+            "gzip_bytes": len(gzip.compress(body, 5)),
+            "encode_us": round(encode_time * 1e6, 1),
+            "decode_us": round(decode_time * 1e6, 1)
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    if not (wire_formats.msgpack and wire_formats.cbor2):
+        print("Install msgpack and cbor2 to include the binary formats")
+    columns = list(results[0])
+    print("  ".join(f"{column:>28}" for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]!s:>28}" for column in columns))
+
+if __name__ == '__main__':
+    main()
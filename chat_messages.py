@@ -0,0 +1,65 @@
+import sys
+import enum
+from datetime import datetime
+
+class MessageType(enum.Enum):
+    TEXT = 'text'
+    IMAGE = 'image'
+
+class ChatMessage:
+    """One message in the chat buffer, kept compact while it sits in memory.
+    
+    Slots instead of a per-message dict, an integer epoch timestamp
+    instead of an ISO string, interned usernames and sender addresses,
+    and a shared MessageType member instead of a type string. The dict
+    shape clients and backups use is only built at the edge, by to_dict.
+    """
+    
+    __slots__ = ('id', 'username', 'text', 'timestamp', 'ip', 'type', 'image_id', 'filename', 'caption', 'variant_widths')
+    
+    def __init__(self, id, username, text, timestamp=None, ip=None, type=MessageType.TEXT,
+                 image_id=None, filename=None, caption=None, variant_widths=()):
+        self.id = id
+        self.username = sys.intern(username)
+        self.text = text
+        self.timestamp = int(timestamp if timestamp is not None else datetime.now().timestamp())  # Epoch seconds
+        self.ip = sys.intern(ip) if ip else None
+        self.type = type
+        self.image_id = image_id
+        self.filename = filename
+        self.caption = caption
+        self.variant_widths = tuple(variant_widths)
+    
+    def to_dict(self):
+        """The message as clients and backups see it (ISO timestamp in server local time)"""
+        data = {
+            'id': self.id,
+            'username': self.username,
+            'text': self.text,
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat(),
+            'ip': self.ip,
+            'type': self.type.value
+        }
+        if self.type is MessageType.IMAGE:
+            data['image_id'] = self.image_id
+            data['filename'] = self.filename
+            data['caption'] = self.caption
+            data['variant_widths'] = list(self.variant_widths)
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        """A message from its dict form, e.g. as restored from a backup"""
+        try:
+            timestamp = datetime.fromisoformat(data['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            timestamp = None
+        try:
+            message_type = MessageType(data.get('type', 'text'))
+        except ValueError:
+            message_type = MessageType.TEXT
+        
+        return cls(
+            data.get('id', 0), data.get('username', ''), data.get('text', ''), timestamp, data.get('ip'), message_type,
+            data.get('image_id'), data.get('filename'), data.get('caption'), data.get('variant_widths') or ()
+        )
@@ -0,0 +1,2391 @@
+import http.server
+import socketserver
+import os
+import mimetypes
+import urllib.parse
+import json
+import time
+import threading
+import hashlib
+import base64
+import email.utils
+import tempfile
+from datetime import datetime, timedelta
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from image_processing import (
+    ImagePoolBusy, ImageValidationError, ImageWorkerPool, WebpTranscoder,
+    accepts_webp, pick_variant_width, prepare_upload
+)
+from image_cache import DiskImageCache, parse_byte_range
+from image_stores import create_image_store, IMAGE_LINK_REFRESH_MARGIN
+from http_clients import github_http, webhook_http, get_upstream_stats
+from page_templates import PageTemplate, slot_marker, escape_html, escape_js_string
+from response_encoding import (
+    negotiate_encoding, encoded_etag, etag_variants, CompressedVariants
+)
+from static_assets import StaticAssets, STATIC_URL_PREFIX, ASSET_CACHE_CONTROL
+from static_files import StaticFiles, STATIC_FILE_CACHE_CONTROL
+from json_codec import dumps, MessageFragments, JSON_ENCODER
+from wire_formats import negotiate_wire_format, encode_messages, WIRE_FORMATS
+from chat_messages import ChatMessage, MessageType
+from metrics import registry, TimedLock
+
+PORT = int(os.environ.get('PORT', 8080))
+
+# HTTP/1.1 keep-alive: a client's 2-second polls reuse one connection instead of reconnecting
+KEEPALIVE_IDLE_TIMEOUT = int(os.environ.get('KEEPALIVE_IDLE_TIMEOUT', 15))  # Seconds a connection may sit idle between requests
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get('KEEPALIVE_MAX_REQUESTS', 1000))  # Requests served on one connection before closing it
+REQUEST_IO_TIMEOUT = int(os.environ.get('REQUEST_IO_TIMEOUT', 60))  # Socket timeout once a request is underway
+BODY_DRAIN_LIMIT = 64 * 1024  # Unread request bodies up to this size are discarded to keep the connection; larger ones close it
+
+# Pages are rendered once at startup; their ETags come from the rendered bytes
+TEMPLATE_LOADED_AT = time.time()
+
+# Global storage
+chatroom_messages = []  # ChatMessage records, oldest first
+chatroom_version = 0  # Bumped on every change to chatroom_messages, used in poll ETags
+BOOT_ID = os.urandom(4).hex()  # Also in poll ETags: chatroom_version starts over on every restart
+message_fragments = MessageFragments()  # Each message's JSON, encoded once for all pollers
+# Finished poll bodies for the current chatroom_version, shared by every client asking with the same `since`
+poll_responses = {"version": None, "bodies": {}, "hits": 0, "misses": 0}  # Guarded by chatroom_lock
+chatroom_lock = TimedLock('chatroom')
+users_db = {}  # username -> {"password_hash": str, "created": datetime, "last_seen": datetime}
+user_sessions = {}  # session_id -> {"username": str, "expires": datetime}
+users_lock = TimedLock('users')
+
+# Image storage backend: pcloud, gist, local or memory (backend settings live in image_stores.py)
+IMAGE_STORE = os.environ.get('IMAGE_STORE', 'local')
+IMAGE_STORE_SETUP = {
+    'pcloud': [
+        "PCLOUD_USERNAME=your_pcloud_email@example.com",
+        "PCLOUD_PASSWORD=your_pcloud_password",
+        "# OR (recommended for security):",
+        "PCLOUD_AUTH_TOKEN=your_pcloud_auth_token",
+        "PCLOUD_FOLDER_PATH=/ChatroomImages (optional)",
+        "IMAGE_SERVE_MODE=redirect (optional, offloads image bytes to Pcloud)"
+    ],
+    'gist': [
+        "GITHUB_IMAGES_GIST_ID=your_images_gist_id_here (uses GITHUB_GIST_TOKEN)"
+    ],
+    'local': [
+        "IMAGE_STORE_DIR=image_store (optional, use a persistent disk)",
+        "IMAGE_STORE_FSYNC=file (optional: none, file or full)"
+    ]
+}
+
+# Persistence configuration (chat data always goes to GitHub Gist, images go to IMAGE_STORE)
+GITHUB_GIST_TOKEN = os.environ.get('GITHUB_GIST_TOKEN', '')  # Set this in Render environment
+GITHUB_GIST_ID = os.environ.get('GITHUB_GIST_ID', '')  # Set this after first run
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+BACKUP_INTERVAL = int(os.environ.get('BACKUP_INTERVAL', 300))  # 5 minutes
+EXTERNAL_BACKUP_URL = os.environ.get('BACKUP_WEBHOOK_URL', '')  # Optional webhook backup
+
+# Upload configuration
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Request bodies are streamed to disk in 64KB chunks
+IMAGE_DELETE_UNREFERENCED = os.environ.get('IMAGE_DELETE_UNREFERENCED', '0') == '1'  # Delete images no message points at
+
+# WebP transcoding of served images (quality preset: low, medium or high)
+IMAGE_WEBP_ENABLED = os.environ.get('IMAGE_WEBP_ENABLED', '1') == '1'
+IMAGE_WEBP_QUALITY = os.environ.get('IMAGE_WEBP_QUALITY', 'medium')
+
+# Image worker processes (Pillow decode/resize/encode never runs in request threads)
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+IMAGE_MAX_PENDING_JOBS = int(os.environ.get('IMAGE_MAX_PENDING_JOBS', 8))  # Queue bound, extra jobs are rejected
+IMAGE_JOB_TIMEOUT = int(os.environ.get('IMAGE_JOB_TIMEOUT', 20))  # Seconds per job
+IMAGE_WORKER_MEMORY_MB = int(os.environ.get('IMAGE_WORKER_MEMORY_MB', 512))  # Per-worker memory headroom
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))  # Decompression-bomb guard
+
+# Served images are relayed in chunks and kept in a local disk cache (outside the static file root)
+IMAGE_STREAM_CHUNK_SIZE = 64 * 1024
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'chatroom_image_cache'))
+IMAGE_CACHE_MAX_MB = int(os.environ.get('IMAGE_CACHE_MAX_MB', 512))
+IMAGE_FILL_WAIT = int(os.environ.get('IMAGE_FILL_WAIT', 30))  # Seconds a request waits on another's download of the same image
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'  # Image ids are content hashes, so an image URL never changes content
+
+# How images reach clients: 'proxy' relays the bytes through this server, 'redirect' sends
+# clients to a store download link instead where the store has them (WebP responses are still proxied)
+IMAGE_SERVE_MODE = os.environ.get('IMAGE_SERVE_MODE', 'proxy')
+
+class DataPersistence:
+    """Handles backup strategies for chat data (excluding images which go to the image store)"""
+    
+    @staticmethod
+    def hash_password(password):
+        """Hash password with salt"""
+        salt = "chatroom_salt_2024"  # In production, use random salt per user
+        return hashlib.sha256((password + salt).encode()).hexdigest()
+    
+    @staticmethod
+    def generate_session_id():
+        """Generate secure session ID"""
+        return base64.urlsafe_b64encode(os.urandom(32)).decode().rstrip('=')
+    
+    @staticmethod
+    def backup_snapshot():
+        """The users and recent messages as they go into the gist backup"""
+        with chatroom_lock, users_lock:
+            return {
+                "timestamp": datetime.now().isoformat(),
+                "users": {
+                    username: {
+                        "password_hash": data["password_hash"],
+                        "created": data["created"].isoformat() if isinstance(data["created"], datetime) else data["created"],
+                        "last_seen": data["last_seen"].isoformat() if isinstance(data["last_seen"], datetime) else data["last_seen"]
+                    }
+                    for username, data in users_db.items()
+                },
+                "messages": [message.to_dict() for message in chatroom_messages[-50:]],  # Keep last 50 messages
+                "stats": {
+                    "total_users": len(users_db),
+                    "total_messages": len(chatroom_messages)
+                },
+                "note": f"Images are stored in {image_store.label}, not in this backup"
+            }
+    
+    @staticmethod
+    def backup_to_github_gist():
+        """Backup chat data to GitHub Gist (NOT images - those go to the image store)"""
+        if not GITHUB_GIST_TOKEN or not GITHUB_GIST_ID:
+            return False
+        
+        try:
+            backup_data = DataPersistence.backup_snapshot()
+            
+            # Update GitHub Gist
+            headers = {
+                'Authorization': f'token {GITHUB_GIST_TOKEN}',
+                'Accept': 'application/vnd.github.v3+json'
+            }
+            
+            data = {
+                "files": {
+                    "chatroom_backup.json": {
+                        "content": json.dumps(backup_data, indent=2)
+                    }
+                }
+            }
+            
+            response = github_http.patch(
+                f'{GITHUB_API_URL}/gists/{GITHUB_GIST_ID}',
+                headers=headers,
+                json=data,
+                timeout=10,
+                idempotent=True  # The whole file is replaced, so a repeat is harmless
+            )
+            
+            if response.status_code == 200:
+                print(f"✅ Chat data backed up to GitHub Gist at {datetime.now()}")
+                return True
+            else:
+                print(f"❌ GitHub Gist backup failed: {response.status_code}")
+                return False
+        
+        except Exception as e:
+            print(f"❌ GitHub Gist backup error: {e}")
+            return False
+    
+    @staticmethod
+    def restore_from_github_gist():
+        """Restore chat data from GitHub Gist"""
+        if not GITHUB_GIST_TOKEN or not GITHUB_GIST_ID:
+            return False
+        
+        try:
+            headers = {
+                'Authorization': f'token {GITHUB_GIST_TOKEN}',
+                'Accept': 'application/vnd.github.v3+json'
+            }
+            
+            response = github_http.get(
+                f'{GITHUB_API_URL}/gists/{GITHUB_GIST_ID}',
+                headers=headers,
+                timeout=10
+            )
+            
+            if response.status_code != 200:
+                print(f"❌ GitHub Gist restore failed: {response.status_code}")
+                return False
+            
+            gist_data = response.json()
+            backup_content = gist_data['files']['chatroom_backup.json']['content']
+            backup_data = json.loads(backup_content)
+            
+            with chatroom_lock, users_lock:
+                # Restore users
+                global users_db
+                users_db = {}
+                for username, user_data in backup_data.get("users", {}).items():
+                    users_db[username] = {
+                        "password_hash": user_data["password_hash"],
+                        "created": datetime.fromisoformat(user_data["created"]),
+                        "last_seen": datetime.fromisoformat(user_data["last_seen"])
+                    }
+                
+                # Restore messages
+                global chatroom_messages
+                chatroom_messages = [ChatMessage.from_dict(message) for message in backup_data.get("messages", [])]
+                message_fragments.clear()
+                
+                # Fix message IDs, unless the backup kept them increasing (pages open across a restart poll by id)
+                ids = [msg.id for msg in chatroom_messages]
+                if any(current <= previous for previous, current in zip([0] + ids, ids)):
+                    for i, msg in enumerate(chatroom_messages):
+                        msg.id = i + 1
+                mark_chatroom_changed()
+            
+            print(f"✅ Chat data restored from GitHub Gist: {len(users_db)} users, {len(chatroom_messages)} messages")
+            return True
+        
+        except Exception as e:
+            print(f"❌ GitHub Gist restore error: {e}")
+            return False
+    
+    @staticmethod
+    def backup_to_webhook():
+        """Secondary backup to external webhook"""
+        if not EXTERNAL_BACKUP_URL:
+            return False
+        
+        try:
+            with chatroom_lock, users_lock:
+                backup_data = {
+                    "timestamp": datetime.now().isoformat(),
+                    "users_count": len(users_db),
+                    "messages_count": len(chatroom_messages),
+                    "last_messages": [message.to_dict() for message in chatroom_messages[-10:]]
+                }
+            
+            response = webhook_http.post(
+                EXTERNAL_BACKUP_URL,
+                json=backup_data,
+                timeout=5
+            )
+            
+            if response.status_code == 200:
+                print(f"✅ Webhook backup successful")
+                return True
+            else:
+                print(f"⚠️ Webhook backup failed: {response.status_code}")
+                return False
+        
+        except Exception as e:
+            print(f"⚠️ Webhook backup error: {e}")
+            return False
+
+# Initialize storage systems
+image_store = create_image_store(IMAGE_STORE, delete_unreferenced=IMAGE_DELETE_UNREFERENCED)
+MAX_IMAGE_UPLOAD_SIZE = image_store.max_upload_size  # Same limit the chat page enforces
+data_persistence = DataPersistence()
+image_worker_pool = ImageWorkerPool(
+    max_workers=IMAGE_WORKERS,
+    max_pending=IMAGE_MAX_PENDING_JOBS,
+    timeout=IMAGE_JOB_TIMEOUT,
+    max_pixels=IMAGE_MAX_PIXELS,
+    memory_limit_mb=IMAGE_WORKER_MEMORY_MB
+)
+webp_transcoder = WebpTranscoder(image_worker_pool, quality=IMAGE_WEBP_QUALITY)
+# Only remote stores are worth caching on local disk
+image_disk_cache = DiskImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024) if image_store.remote else None
+static_assets = StaticAssets()
+static_files = StaticFiles(hidden=image_store.private_paths())  # The store's catalog names uploaders and source hashes
+
+# Request metrics for /metrics; routes are named after handle_api's branches so label values stay bounded
+API_ROUTES = (
+    '/api/auth/register', '/api/auth/login', '/api/auth/logout', '/api/auth/check',
+    '/api/chat/send', '/api/chat/upload-image', '/api/chat/share-image', '/api/status'
+)
+http_requests_total = registry.counter('chat_http_requests_total', 'Requests served', ('route', 'method', 'status'))
+http_request_seconds = registry.histogram('chat_http_request_duration_seconds', 'Time from request line to response sent', ('route',))
+http_requests_in_flight = registry.gauge('chat_http_requests_in_flight', 'Requests being handled', ('route',))
+
+def route_label(path):
+    """The route a request path belongs to, as a metrics label"""
+    if path in ('/', '/chat', '/metrics') or path in API_ROUTES:
+        return path
+    if path.startswith('/api/chat/messages'):
+        return '/api/chat/messages'
+    if path.startswith('/api/images/'):
+        return '/api/images/{id}'
+    if path.startswith('/api/'):
+        return '/api/other'
+    if path.startswith(STATIC_URL_PREFIX):
+        return STATIC_URL_PREFIX + '{asset}'
+    return 'static_file'
+
+def cache_lookups():
+    """(cache, result) -> count for every cache that keeps hit counters"""
+    with chatroom_lock:
+        lookups = [(('poll_responses', 'hit'), poll_responses["hits"]), (('poll_responses', 'miss'), poll_responses["misses"])]
+    
+    static_stats = static_files.get_stats()
+    webp_stats = webp_transcoder.get_stats()
+    lookups += [
+        (('static_files', 'hit'), static_stats["hits"]), (('static_files', 'miss'), static_stats["misses"]),
+        (('webp', 'hit'), webp_stats["cache_hits"]), (('webp', 'miss'), webp_stats["cache_misses"])
+    ]
+    if image_disk_cache:
+        disk_stats = image_disk_cache.get_stats()
+        lookups += [(('image_disk', 'hit'), disk_stats["hits"]), (('image_disk', 'miss'), disk_stats["misses"])]
+    link_stats = image_store.get_stats().get("download_links")
+    if link_stats:
+        lookups += [(('download_links', 'hit'), link_stats["hits"]), (('download_links', 'miss'), link_stats["misses"])]
+    return lookups
+
+def active_session_count():
+    now = datetime.now()
+    with users_lock:
+        return len([s for s in user_sessions.values() if now < s['expires']])
+
+registry.callback('counter', 'chat_cache_lookups_total', 'Cache lookups by result', cache_lookups, ('cache', 'result'))
+registry.callback('gauge', 'chat_messages_buffered', 'Messages in the chat buffer', lambda: [((), len(chatroom_messages))])
+registry.callback('gauge', 'chat_sessions_active', 'Unexpired login sessions', lambda: [((), active_session_count())])
+registry.callback('gauge', 'chat_users_registered', 'Registered users', lambda: [((), len(users_db))])
+registry.callback(
+    'counter', 'chat_image_jobs_total', 'Image worker pool jobs by outcome',
+    lambda: [((key,), value) for key, value in image_worker_pool.get_stats().items()
+             if key in ('submitted', 'completed', 'failed', 'rejected_busy', 'timeouts')], ('outcome',)
+)
+
+def trim_chat_messages():
+    """Drop messages beyond the 100-message buffer.
+    
+    Ids are left alone, so they keep increasing and clients can poll for
+    what came after the last id they saw. Caller holds chatroom_lock.
+    Returns the dropped messages so image references can be released
+    once the lock is gone.
+    """
+    removed = []
+    if len(chatroom_messages) > 100:
+        removed.append(chatroom_messages.pop(0))
+    message_fragments.discard(removed)
+    return removed
+
+def mark_chatroom_changed():
+    """Bump the message buffer version so cached polls revalidate (caller holds chatroom_lock)"""
+    global chatroom_version
+    chatroom_version += 1
+
+def release_image_references(messages):
+    """Release the stored images referenced by messages that left the buffer.
+    
+    Runs in the background: a release can delete from a remote store, and
+    chat sends must not wait on storage.
+    """
+    image_ids = [message.image_id for message in messages if message.type is MessageType.IMAGE and message.image_id]
+    if not image_ids:
+        return
+    
+    def release():
+        for image_id in image_ids:
+            image_store.release_reference(image_id)
+    
+    threading.Thread(target=release, daemon=True).start()
+
+def receive_upload_to_tempfile(rfile, content_length):
+    """Stream a request body into a temp file, hashing it on the way in.
+    
+    Returns (temp_file, sha256_hexdigest). The file is named, so an image
+    worker can open it by path; it is deleted when closed, and the caller
+    owns it and must close it. Raises IOError if the client sends fewer
+    bytes than promised.
+    """
+    temp_file = tempfile.NamedTemporaryFile(prefix='chat-upload-')
+    digest = hashlib.sha256()
+    remaining = content_length
+    try:
+        while remaining > 0:
+            chunk = rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"Upload ended early ({content_length - remaining} of {content_length} bytes)")
+            digest.update(chunk)
+            temp_file.write(chunk)
+            remaining -= len(chunk)
+        temp_file.flush()
+        return temp_file, digest.hexdigest()
+    except Exception:
+        temp_file.close()
+        raise
+
+class RequestBodyReader:
+    """The request body as a file-like object that stops at Content-Length.
+    
+    Handlers may return without reading the body (failed auth, size
+    limits); the rest is drained afterwards, or the connection closed, so
+    leftover body bytes are never parsed as the next request.
+    """
+    
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+    
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if size == 0:
+            return b''
+        data = self.rfile.read(size)
+        self.remaining -= len(data)
+        return data
+    
+    def drain(self, limit):
+        """Discard the unread rest of the body; False if it is over the limit or the client stopped sending"""
+        if self.remaining > limit:
+            return False
+        while self.remaining > 0:
+            if not self.read(UPLOAD_CHUNK_SIZE):
+                return False
+        return True
+
+def backup_data_periodically():
+    """Background thread to backup data periodically"""
+    while True:
+        time.sleep(BACKUP_INTERVAL)
+        print(f"🔄 Starting periodic backup…")
+        
+        # Try GitHub Gist first (for chat data only)
+        if data_persistence.backup_to_github_gist():
+            print("✅ Primary backup (GitHub Gist) successful")
+        else:
+            print("⚠️ Primary backup failed, trying webhook...")
+            data_persistence.backup_to_webhook()
+
+class ChatroomHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes; don't hold the body back for an ACK
+    requests_handled = 0  # On this connection
+    request_body = None  # RequestBodyReader for the request in progress
+    route = None  # Metrics label of the request in progress
+    
+    def __init__(self, *args, **kwargs):
+        mimetypes.add_type('application/javascript', '.js')
+        mimetypes.add_type('text/css', '.css')
+        mimetypes.add_type('application/json', '.json')
+        super().__init__(*args, **kwargs)
+    
+    def handle_one_request(self):
+        """Serve one request on a kept-alive connection, with an idle timeout and a cap on requests"""
+        self.connection.settimeout(KEEPALIVE_IDLE_TIMEOUT)
+        try:
+            super().handle_one_request()
+        finally:
+            self.finish_request_body()
+            self.record_request_metrics()
+        
+        self.requests_handled += 1
+        if self.requests_handled >= KEEPALIVE_MAX_REQUESTS:
+            self.close_connection = True
+    
+    def parse_request(self):
+        """Switch to the in-request timeout and bound the body reads to Content-Length"""
+        self.connection.settimeout(REQUEST_IO_TIMEOUT)
+        if not super().parse_request():
+            return False
+        
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error(411, "Chunked request bodies are not supported")
+            return False
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.send_error(400, "Bad Content-Length")
+            return False
+        
+        self.request_body = RequestBodyReader(self.rfile, max(content_length, 0))
+        self.rfile = self.request_body
+        
+        self.route = route_label(urllib.parse.urlparse(self.path).path)
+        self.response_status = None
+        self.request_started = time.perf_counter()
+        http_requests_in_flight.inc(self.route)
+        return True
+    
+    def send_response(self, code, message=None):
+        self.response_status = code  # For the request metrics
+        super().send_response(code, message)
+    
+    def record_request_metrics(self):
+        """Count the finished request under its route, status and latency"""
+        route, self.route = self.route, None
+        if route is None:
+            return
+        http_requests_in_flight.dec(route)
+        http_request_seconds.observe(time.perf_counter() - self.request_started, route)
+        method = self.command if self.command in ('GET', 'POST', 'OPTIONS', 'HEAD') else 'other'
+        http_requests_total.inc(route, method, str(self.response_status or 0))
+    
+    def finish_request_body(self):
+        """Put the raw stream back and skip whatever of the body the handler left unread"""
+        body, self.request_body = self.request_body, None
+        if body is None:
+            return
+        self.rfile = body.rfile
+        if not self.close_connection and not body.drain(BODY_DRAIN_LIMIT):
+            self.close_connection = True
+    
+    def end_headers(self):
+        """Say up front whether the connection stays open after this response"""
+        body = self.request_body
+        if not self.close_connection:
+            if self.requests_handled + 1 >= KEEPALIVE_MAX_REQUESTS or (body and body.remaining > BODY_DRAIN_LIMIT):
+                self.send_header("Connection", "close")
+            else:
+                self.send_header("Keep-Alive", f"timeout={KEEPALIVE_IDLE_TIMEOUT}, max={KEEPALIVE_MAX_REQUESTS - self.requests_handled - 1}")
+        super().end_headers()
+    
+    def do_GET(self):
+        parsed_path = urllib.parse.urlparse(self.path)
+        path = parsed_path.path
+        
+        if path == '/':
+            self.serve_login_page()
+            return
+        elif path == '/chat':
+            self.serve_chatroom()
+            return
+        elif path.startswith('/api/'):
+            self.handle_api(path)
+            return
+        elif path.startswith(STATIC_URL_PREFIX) and static_assets.get(path):
+            self.serve_asset(static_assets.get(path))
+            return
+        elif path == '/metrics':
+            self.send_body(registry.render(), "text/plain; version=0.0.4; charset=utf-8", headers=[("Cache-Control", "no-store")])
+            return
+        
+        if self.serve_static_file(path):
+            return
+        
+        self.send_error(404, "File not found")
+    
+    def serve_login_page(self):
+        """Serve the login/register page"""
+        self.send_page(LOGIN_PAGE, f'"login-{LOGIN_PAGE.version}"', "no-cache")
+    
+    @staticmethod
+    def render_login_page():
+        """Build the login/register page (once, at startup)"""
+        return """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>🎤💬📸 Chatroom Login</title>
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            padding: 20px;
+        }
+        
+        .login-container {
+            background: rgba(255, 255, 255, 0.95);
+            backdrop-filter: blur(10px);
+            border-radius: 20px;
+            padding: 40px;
+            box-shadow: 0 20px 40px rgba(0,0,0,0.1);
+            width: 100%;
+            max-width: 400px;
+            text-align: center;
+        }
+        
+        .logo {
+            font-size: 3em;
+            margin-bottom: 10px;
+        }
+        
+        h1 {
+            color: #333;
+            margin-bottom: 30px;
+            font-size: 1.8em;
+        }
+        
+        .form-tabs {
+            display: flex;
+            margin-bottom: 30px;
+            background: #f0f0f0;
+            border-radius: 10px;
+            padding: 5px;
+        }
+        
+        .tab-btn {
+            flex: 1;
+            background: none;
+            border: none;
+            padding: 12px;
+            border-radius: 8px;
+            cursor: pointer;
+            font-weight: bold;
+            color: #666;
+            transition: all 0.3s ease;
+        }
+        
+        .tab-btn.active {
+            background: #667eea;
+            color: white;
+            transform: scale(1.02);
+        }
+        
+        .form-container {
+            display: none;
+            animation: fadeIn 0.3s ease-in;
+        }
+        
+        .form-container.active {
+            display: block;
+        }
+        
+        @keyframes fadeIn {
+            from { opacity: 0; transform: translateY(10px); }
+            to { opacity: 1; transform: translateY(0); }
+        }
+        
+        .form-group {
+            margin-bottom: 20px;
+            text-align: left;
+        }
+        
+        label {
+            display: block;
+            margin-bottom: 5px;
+            font-weight: bold;
+            color: #333;
+        }
+        
+        input[type="text"], input[type="password"] {
+            width: 100%;
+            padding: 12px 15px;
+            border: 2px solid #ddd;
+            border-radius: 10px;
+            font-size: 16px;
+            transition: border-color 0.3s ease;
+        }
+        
+        input[type="text"]:focus, input[type="password"]:focus {
+            outline: none;
+            border-color: #667eea;
+        }
+        
+        .password-match {
+            font-size: 12px;
+            margin-top: 5px;
+            color: #666;
+        }
+        
+        .password-match.valid {
+            color: #4CAF50;
+        }
+        
+        .password-match.invalid {
+            color: #f44336;
+        }
+        
+        .submit-btn {
+            width: 100%;
+            background: #667eea;
+            color: white;
+            border: none;
+            padding: 15px;
+            border-radius: 10px;
+            font-size: 16px;
+            font-weight: bold;
+            cursor: pointer;
+            transition: all 0.3s ease;
+            margin-top: 10px;
+        }
+        
+        .submit-btn:hover {
+            background: #5a6fd8;
+            transform: translateY(-2px);
+            box-shadow: 0 5px 15px rgba(102, 126, 234, 0.3);
+        }
+        
+        .submit-btn:disabled {
+            background: #ccc;
+            cursor: not-allowed;
+            transform: none;
+            box-shadow: none;
+        }
+        
+        .error-message {
+            background: #ffebee;
+            border: 1px solid #ffcdd2;
+            color: #c62828;
+            padding: 10px;
+            border-radius: 8px;
+            margin-bottom: 20px;
+            display: none;
+        }
+        
+        .success-message {
+            background: #e8f5e8;
+            border: 1px solid #c8e6c9;
+            color: #2e7d32;
+            padding: 10px;
+            border-radius: 8px;
+            margin-bottom: 20px;
+            display: none;
+        }
+        
+        .server-info {
+            margin-top: 30px;
+            padding: 15px;
+            background: rgba(0,0,0,0.05);
+            border-radius: 10px;
+            font-size: 14px;
+            color: #666;
+        }
+        
+        .server-info h3 {
+            color: #333;
+            margin-bottom: 10px;
+        }
+        
+        .storage-badge {
+            background: linear-gradient(45deg, #4285f4, #34a853);
+            color: white;
+            padding: 5px 10px;
+            border-radius: 15px;
+            font-size: 12px;
+            font-weight: bold;
+            margin-top: 10px;
+            display: inline-block;
+        }
+        
+        @media (max-width: 500px) {
+            .login-container {
+                padding: 30px 20px;
+                margin: 10px;
+            }
+        }
+    </style>
+</head>
+<body>
+    <div class="login-container">
+        <div class="logo">🎤💬📸</div>
+        <h1>Chatroom + Voice + Images</h1>
+        <div class="storage-badge">☁️ Images stored in IMAGE_STORE_LABEL</div>
+        
+        <div class="error-message" id="errorMessage"></div>
+        <div class="success-message" id="successMessage"></div>
+        
+        <div class="form-tabs">
+            <button class="tab-btn active" onclick="switchForm('login')">Login</button>
+            <button class="tab-btn" onclick="switchForm('register')">Register</button>
+        </div>
+        
+        <!-- Login Form -->
+        <div id="loginForm" class="form-container active">
+            <form onsubmit="handleLogin(event)">
+                <div class="form-group">
+                    <label for="loginUsername">Username</label>
+                    <input type="text" id="loginUsername" required maxlength="20" 
+                           placeholder="Enter your username">
+                </div>
+                
+                <div class="form-group">
+                    <label for="loginPassword">Password</label>
+                    <input type="password" id="loginPassword" required 
+                           placeholder="Enter your password">
+                </div>
+                
+                <button type="submit" class="submit-btn">
+                    🚀 Login & Enter Chatroom
+                </button>
+            </form>
+        </div>
+        
+        <!-- Register Form -->
+        <div id="registerForm" class="form-container">
+            <form onsubmit="handleRegister(event)">
+                <div class="form-group">
+                    <label for="regUsername">Username</label>
+                    <input type="text" id="regUsername" required maxlength="20" 
+                           placeholder="Choose a username" onkeyup="checkUsername()">
+                    <div class="password-match" id="usernameCheck"></div>
+                </div>
+                
+                <div class="form-group">
+                    <label for="regPassword">Password</label>
+                    <input type="password" id="regPassword" required minlength="4"
+                           placeholder="Choose a password" onkeyup="checkPasswords()">
+                </div>
+                
+                <div class="form-group">
+                    <label for="regPasswordConfirm">Confirm Password</label>
+                    <input type="password" id="regPasswordConfirm" required 
+                           placeholder="Confirm your password" onkeyup="checkPasswords()">
+                    <div class="password-match" id="passwordMatch"></div>
+                </div>
+                
+                <button type="submit" class="submit-btn" id="registerBtn" disabled>
+                    ✨ Create Account & Join
+                </button>
+            </form>
+        </div>
+        
+        <div class="server-info">
+            <h3>🔐 Secure & Feature-Rich</h3>
+            <p>• Images stored securely in IMAGE_STORE_LABEL</p>
+            <p>• Send images and voice messages</p>
+            <p>• Voice + text chat with friends</p>
+            <p>• Mobile-friendly interface</p>
+            <p>• High-quality image storage</p>
+        </div>
+    </div>
+    
+    <script>
+        function switchForm(formType) {
+            document.querySelectorAll('.tab-btn').forEach(btn => btn.classList.remove('active'));
+            event.target.classList.add('active');
+            
+            document.querySelectorAll('.form-container').forEach(form => form.classList.remove('active'));
+            document.getElementById(formType + 'Form').classList.add('active');
+            
+            hideMessages();
+        }
+        
+        function showError(message) {
+            const errorDiv = document.getElementById('errorMessage');
+            errorDiv.textContent = message;
+            errorDiv.style.display = 'block';
+            
+            const successDiv = document.getElementById('successMessage');
+            successDiv.style.display = 'none';
+        }
+        
+        function showSuccess(message) {
+            const successDiv = document.getElementById('successMessage');
+            successDiv.textContent = message;
+            successDiv.style.display = 'block';
+            
+            const errorDiv = document.getElementById('errorMessage');
+            errorDiv.style.display = 'none';
+        }
+        
+        function hideMessages() {
+            document.getElementById('errorMessage').style.display = 'none';
+            document.getElementById('successMessage').style.display = 'none';
+        }
+        
+        function checkUsername() {
+            const username = document.getElementById('regUsername').value;
+            const checkDiv = document.getElementById('usernameCheck');
+            
+            if (username.length < 3) {
+                checkDiv.textContent = 'Username must be at least 3 characters';
+                checkDiv.className = 'password-match invalid';
+            } else if (!/^[a-zA-Z0-9_]+$/.test(username)) {
+                checkDiv.textContent = 'Only letters, numbers, and underscores allowed';
+                checkDiv.className = 'password-match invalid';
+            } else {
+                checkDiv.textContent = 'Username looks good! ✓';
+                checkDiv.className = 'password-match valid';
+            }
+            
+            checkRegisterButton();
+        }
+        
+        function checkPasswords() {
+            const password = document.getElementById('regPassword').value;
+            const confirmPassword = document.getElementById('regPasswordConfirm').value;
+            const matchDiv = document.getElementById('passwordMatch');
+            
+            if (password.length < 4) {
+                matchDiv.textContent = 'Password must be at least 4 characters';
+                matchDiv.className = 'password-match invalid';
+            } else if (confirmPassword && password !== confirmPassword) {
+                matchDiv.textContent = 'Passwords do not match';
+                matchDiv.className = 'password-match invalid';
+            } else if (confirmPassword && password === confirmPassword) {
+                matchDiv.textContent = 'Passwords match! ✓';
+                matchDiv.className = 'password-match valid';
+            } else {
+                matchDiv.textContent = '';
+                matchDiv.className = 'password-match';
+            }
+            
+            checkRegisterButton();
+        }
+        
+        function checkRegisterButton() {
+            const username = document.getElementById('regUsername').value;
+            const password = document.getElementById('regPassword').value;
+            const confirmPassword = document.getElementById('regPasswordConfirm').value;
+            const registerBtn = document.getElementById('registerBtn');
+            
+            const isValid = username.length >= 3 && 
+                           /^[a-zA-Z0-9_]+$/.test(username) &&
+                           password.length >= 4 && 
+                           password === confirmPassword;
+            
+            registerBtn.disabled = !isValid;
+        }
+        
+        async function handleLogin(event) {
+            event.preventDefault();
+            hideMessages();
+            
+            const username = document.getElementById('loginUsername').value.trim();
+            const password = document.getElementById('loginPassword').value;
+            
+            if (!username || !password) {
+                showError('Please fill in all fields');
+                return;
+            }
+            
+            try {
+                const response = await fetch('/api/auth/login', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ username, password })
+                });
+                
+                const data = await response.json();
+                
+                if (data.success) {
+                    document.cookie = `session_id=${data.session_id}; path=/; max-age=345600`;
+                    showSuccess('Login successful! Redirecting to chatroom...');
+                    setTimeout(() => {
+                        window.location.href = '/chat';
+                    }, 1000);
+                } else {
+                    showError(data.error || 'Login failed');
+                }
+            } catch (error) {
+                showError('Network error. Please try again.');
+                console.error('Login error:', error);
+            }
+        }
+        
+        async function handleRegister(event) {
+            event.preventDefault();
+            hideMessages();
+            
+            const username = document.getElementById('regUsername').value.trim();
+            const password = document.getElementById('regPassword').value;
+            const confirmPassword = document.getElementById('regPasswordConfirm').value;
+            
+            if (!username || !password || !confirmPassword) {
+                showError('Please fill in all fields');
+                return;
+            }
+            
+            if (password !== confirmPassword) {
+                showError('Passwords do not match');
+                return;
+            }
+            
+            if (password.length < 4) {
+                showError('Password must be at least 4 characters');
+                return;
+            }
+            
+            try {
+                const response = await fetch('/api/auth/register', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ username, password })
+                });
+                
+                const data = await response.json();
+                
+                if (data.success) {
+                    showSuccess('Account created successfully! You can now login.');
+                    setTimeout(() => {
+                        switchForm('login');
+                        document.getElementById('loginUsername').value = username;
+                        document.getElementById('regUsername').value = '';
+                        document.getElementById('regPassword').value = '';
+                        document.getElementById('regPasswordConfirm').value = '';
+                    }, 1500);
+                } else {
+                    showError(data.error || 'Registration failed');
+                }
+            } catch (error) {
+                showError('Network error. Please try again.');
+                console.error('Register error:', error);
+            }
+        }
+        
+        // Check if already logged in
+        document.addEventListener('DOMContentLoaded', async function() {
+            try {
+                const response = await fetch('/api/auth/check');
+                const data = await response.json();
+                
+                if (data.authenticated) {
+                    showSuccess(`Welcome back, ${data.username}! Redirecting...`);
+                    setTimeout(() => {
+                        window.location.href = '/chat';
+                    }, 1000);
+                }
+            } catch (error) {
+                console.log('Not logged in or session expired');
+            }
+        });
+    </script>
+</body>
+</html>
+        """.replace('IMAGE_STORE_LABEL', escape_html(image_store.label))  # Plain string, so the one dynamic bit is swapped in
+    
+    def serve_chatroom(self):
+        """Serve the chatroom - but check authentication first"""
+        # Check if user is authenticated
+        session_id = self.get_session_from_cookies()
+        if not session_id or not self.is_valid_session(session_id):
+            # Redirect to login
+            self.send_response(302)
+            self.send_header("Location", "/")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        
+        # Get username from session
+        username = user_sessions.get(session_id, {}).get('username', 'Anonymous')
+        
+        # The page only varies by username, which is spliced into the prebuilt bytes
+        etag = f'"chat-{CHATROOM_PAGE.version}-{hashlib.sha256(username.encode()).hexdigest()[:12]}"'
+        self.send_page(CHATROOM_PAGE, etag, "private, no-cache", vary="Cookie",
+                       username_html=escape_html(username), username_js=escape_js_string(username))
+    
+    @staticmethod
+    def render_chatroom_page():
+        """Build the public chatroom interface with voice room and image support (once, at startup)"""
+        username_html = slot_marker('username_html')
+        username_js = slot_marker('username_js')
+        return f"""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Chatroom + Voice + Images 🎤💬📸</title>
+    <script src="https://cdn.socket.io/4.7.2/socket.io.min.js"></script>
+    <link rel="stylesheet" href="{static_assets.url('chat.css')}">
+</head>
+<body>
+    <div class="header">
+        <div class="user-info">
+            <div class="username-display">👤 {username_html}</div>
+            <button class="logout-btn" onclick="logout()">🚪 Logout</button>
+        </div>
+        <h1>🎤💬📸 Chatroom + Voice + Images</h1>
+        <div class="storage-badge">☁️ Images stored in {image_store.label}</div>
+        <div class="tabs">
+            <button class="tab-btn active" onclick="switchTab('chat')">💬 Text Chat</button>
+            <button class="tab-btn" onclick="switchTab('voice')">🎤 Voice Room</button>
+        </div>
+        <div class="online-count" id="onlineCount">🟢 Loading...</div>
+    </div>
+    
+    <div class="main-container">
+        <!-- Text Chat Tab -->
+        <div id="chatTab" class="tab-content active">
+            <div class="drag-overlay" id="dragOverlay">
+                📸 Drop your image here to share!
+            </div>
+            
+            <div class="messages-container" id="messagesContainer">
+                <div class="no-messages">Welcome to the chatroom! Send a message or share an image to get started 🚀<br><small style="color: #4285f4;">Images are stored securely in {image_store.label} ☁️</small></div>
+            </div>
+            
+            <div class="upload-progress" id="uploadProgress">
+                <div>📤 Uploading image...</div>
+                <div class="progress-bar">
+                    <div class="progress-fill" id="progressFill"></div>
+                </div>
+            </div>
+            
+            <div class="input-container">
+                <div class="input-wrapper">
+                    <textarea id="messageInput" placeholder="Type your message..." rows="1" maxlength="500"></textarea>
+                </div>
+                <div class="input-controls">
+                    <button class="emoji-btn" onclick="addEmoji('😊')">😊</button>
+                    <button class="emoji-btn" onclick="addEmoji('👍')">👍</button>
+                    <button class="emoji-btn" onclick="addEmoji('❤️')">❤️</button>
+                    <button class="file-btn" onclick="document.getElementById('imageInput').click()" title="Share an image">📸</button>
+                    <input type="file" id="imageInput" class="file-input" accept="image/*" onchange="handleImageSelect(event)">
+                    <button id="sendButton" onclick="sendMessage()">Send 📤</button>
+                </div>
+            </div>
+        </div>
+        
+        <!-- Voice Room Tab -->
+        <div id="voiceTab" class="tab-content">
+            <div class="voice-container">
+                <div class="connection-status" id="connectionStatus">
+                    🔌 Connecting to voice server...
+                </div>
+                
+                <div class="voice-status" id="voiceStatus">
+                    🎤 Click "Join Voice Room" to start talking with others!
+                </div>
+                
+                <div class="voice-controls">
+                    <button class="voice-btn" id="joinVoiceBtn" onclick="joinVoiceRoom()">
+                        🎤 Join Voice Room
+                    </button>
+                    <button class="voice-btn disabled" id="talkBtn" onmousedown="startTalking()" onmouseup="stopTalking()" ontouchstart="startTalking()" ontouchend="stopTalking()">
+                        🗣️ Hold to Talk
+                    </button>
+                    <button class="voice-btn" id="muteBtn" onclick="toggleMute()" style="background: #ff9800; display: none;">
+                        🔊 Mute
+                    </button>
+                    <button class="voice-btn" id="leaveVoiceBtn" onclick="leaveVoiceRoom()" style="background: #f44336; display: none;">
+                        📞 Leave Voice
+                    </button>
+                </div>
+                
+                <div class="voice-participants">
+                    <h3>👥 Voice Participants (<span id="participantCount">0</span>)</h3>
+                    <div class="participant-list" id="participantList">
+                        <div class="participant">
+                            <span>💤</span>
+                            <span>No one in voice yet</span>
+                        </div>
+                    </div>
+                </div>
+            </div>
+        </div>
+    </div>
+    
+    <!-- Image Modal -->
+    <div class="image-modal" id="imageModal" onclick="closeImageModal()">
+        <span class="modal-close" onclick="closeImageModal()">&times;</span>
+        <img class="modal-image" id="modalImage" onclick="event.stopPropagation()">
+    </div>
+    
+    <script>
+        let currentUser = {username_js};
+        const IMAGE_STORE_LABEL = {escape_js_string(image_store.label)};
+        const MAX_IMAGE_UPLOAD_SIZE = {MAX_IMAGE_UPLOAD_SIZE};
+    </script>
+    <script src="{static_assets.url('chat.js')}"></script>
+</body>
+</html>
+        """
+    
+    def serve_asset(self, asset):
+        """Serve a fingerprinted CSS/JS asset; its URL changes with its content, so it is cached for good"""
+        variants = asset["variants"]
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding')) if variants.compressible else None
+        etag = encoded_etag(asset["etag"], encoding)
+        matched_etag = self.request_is_fresh(etag, *etag_variants(asset["etag"]))
+        if matched_etag:
+            self.send_not_modified(matched_etag, ASSET_CACHE_CONTROL, vary="Accept-Encoding")
+            return
+        
+        self.send_body(variants.get(encoding), asset["content_type"], encoding, [
+            ("Cache-Control", ASSET_CACHE_CONTROL),
+            ("ETag", etag),
+            ("Vary", "Accept-Encoding")
+        ])
+    
+    def send_page(self, template, etag, cache_control, vary=None, **values):
+        """Send a prebuilt page, compressed when the client accepts it, answering revalidations with 304"""
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'), template.encodings)
+        vary = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+        
+        matched_etag = self.request_is_fresh(encoded_etag(etag, encoding), *etag_variants(etag), last_modified=TEMPLATE_LOADED_AT)
+        if matched_etag:
+            self.send_not_modified(matched_etag, cache_control, vary=vary)
+            return
+        
+        self.send_body(template.render(encoding, **values), "text/html; charset=utf-8", encoding, [
+            ("Cache-Control", cache_control),
+            ("ETag", encoded_etag(etag, encoding)),
+            ("Last-Modified", self.date_time_string(TEMPLATE_LOADED_AT)),
+            ("Vary", vary)
+        ])
+    
+    def send_body(self, body, content_type, encoding=None, headers=()):
+        """Send a 200 with a complete body, already compressed with `encoding` if one is given"""
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def get_session_from_cookies(self):
+        """Extract session ID from cookies"""
+        cookie_header = self.headers.get('Cookie', '')
+        for part in cookie_header.split(';'):
+            part = part.strip()
+            if part.startswith('session_id='):
+                return part.split('=', 1)[1]
+        return None
+    
+    def is_valid_session(self, session_id):
+        """Check if session is valid and not expired"""
+        with users_lock:
+            session = user_sessions.get(session_id)
+            if not session:
+                return False
+            
+            if datetime.now() > session['expires']:
+                # Session expired, remove it
+                del user_sessions[session_id]
+                return False
+            
+            return True
+    
+    def get_username_from_session(self, session_id):
+        """Get username from valid session"""
+        with users_lock:
+            session = user_sessions.get(session_id)
+            return session['username'] if session else None
+    
+    def handle_api(self, path):
+        """Handle API endpoints"""
+        if path == '/api/auth/register':
+            self.handle_register()
+        elif path == '/api/auth/login':
+            self.handle_login()
+        elif path == '/api/auth/logout':
+            self.handle_logout()
+        elif path == '/api/auth/check':
+            self.handle_auth_check()
+        elif path == '/api/chat/send':
+            self.handle_chat_send()
+        elif path == '/api/chat/upload-image':
+            self.handle_image_upload()
+        elif path == '/api/chat/share-image':
+            self.handle_image_share()
+        elif path.startswith('/api/chat/messages'):
+            self.handle_chat_messages(path)
+        elif path.startswith('/api/images/'):
+            self.handle_image_serve(path)
+        elif path == '/api/status':
+            self.handle_status()
+        else:
+            self.send_error(404, "API endpoint not found")
+    
+    def handle_register(self):
+        """Handle user registration"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            post_data = self.rfile.read(content_length)
+            data = json.loads(post_data.decode('utf-8'))
+            
+            username = data.get('username', '').strip()
+            password = data.get('password', '')
+            
+            # Validation
+            if not username or not password:
+                self.send_json_response({"success": False, "error": "Username and password are required"})
+                return
+            
+            if len(username) < 3 or len(username) > 20:
+                self.send_json_response({"success": False, "error": "Username must be 3-20 characters"})
+                return
+            
+            if not username.replace('_', '').isalnum():
+                self.send_json_response({"success": False, "error": "Username can only contain letters, numbers, and underscores"})
+                return
+            
+            if len(password) < 4:
+                self.send_json_response({"success": False, "error": "Password must be at least 4 characters"})
+                return
+            
+            with users_lock:
+                # Check if username already exists
+                if username.lower() in [u.lower() for u in users_db.keys()]:
+                    self.send_json_response({"success": False, "error": "Username already taken"})
+                    return
+                
+                # Create new user
+                users_db[username] = {
+                    "password_hash": data_persistence.hash_password(password),
+                    "created": datetime.now(),
+                    "last_seen": datetime.now()
+                }
+            
+            # Trigger backup after registration
+            threading.Thread(target=data_persistence.backup_to_github_gist, daemon=True).start()
+            
+            self.send_json_response({"success": True, "message": "Account created successfully"})
+        
+        except json.JSONDecodeError:
+            self.send_json_response({"success": False, "error": "Invalid JSON"})
+        except Exception as e:
+            self.send_json_response({"success": False, "error": f"Registration failed: {str(e)}"})
+    
+    def handle_login(self):
+        """Handle user login"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            post_data = self.rfile.read(content_length)
+            data = json.loads(post_data.decode('utf-8'))
+            
+            username = data.get('username', '').strip()
+            password = data.get('password', '')
+            
+            if not username or not password:
+                self.send_json_response({"success": False, "error": "Username and password are required"})
+                return
+            
+            with users_lock:
+                # Check if user exists
+                user_data = users_db.get(username)
+                if not user_data:
+                    self.send_json_response({"success": False, "error": "Invalid username or password"})
+                    return
+                
+                # Verify password
+                password_hash = data_persistence.hash_password(password)
+                if password_hash != user_data["password_hash"]:
+                    self.send_json_response({"success": False, "error": "Invalid username or password"})
+                    return
+                
+                # Update last seen
+                user_data["last_seen"] = datetime.now()
+                
+                # Create session
+                session_id = data_persistence.generate_session_id()
+                user_sessions[session_id] = {
+                    "username": username,
+                    "expires": datetime.now() + timedelta(hours=24)  # 24 hour session
+                }
+            
+            self.send_json_response({
+                "success": True, 
+                "message": "Login successful",
+                "session_id": session_id,
+                "username": username
+            })
+        
+        except json.JSONDecodeError:
+            self.send_json_response({"success": False, "error": "Invalid JSON"})
+        except Exception as e:
+            self.send_json_response({"success": False, "error": f"Login failed: {str(e)}"})
+    
+    def handle_logout(self):
+        """Handle user logout"""
+        session_id = self.get_session_from_cookies()
+        if session_id:
+            with users_lock:
+                user_sessions.pop(session_id, None)
+        
+        self.send_json_response({"success": True, "message": "Logged out successfully"})
+    
+    def handle_auth_check(self):
+        """Check if user is authenticated"""
+        session_id = self.get_session_from_cookies()
+        if session_id and self.is_valid_session(session_id):
+            username = self.get_username_from_session(session_id)
+            self.send_json_response({
+                "authenticated": True,
+                "username": username
+            })
+        else:
+            self.send_json_response({"authenticated": False})
+    
+    def handle_chat_send(self):
+        """Handle sending a new chat message (authenticated users only)"""
+        # Check authentication
+        session_id = self.get_session_from_cookies()
+        if not session_id or not self.is_valid_session(session_id):
+            self.send_json_response({"success": False, "error": "Not authenticated"})
+            return
+        
+        username = self.get_username_from_session(session_id)
+        if not username:
+            self.send_json_response({"success": False, "error": "Not authenticated"})
+            return
+        
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            post_data = self.rfile.read(content_length)
+            message_data = json.loads(post_data.decode('utf-8'))
+            
+            text = message_data.get('text', '')[:500]  # Limit message length
+            
+            if not text.strip():
+                self.send_json_response({"success": False, "error": "Empty message"})
+                return
+            
+            # Add message to global storage
+            with chatroom_lock:
+                new_id = max([msg.id for msg in chatroom_messages], default=0) + 1
+                
+                message = ChatMessage(new_id, username, text.strip(), ip=self.client_address[0])
+                chatroom_messages.append(message)
+                message_fragments.add(message)
+                mark_chatroom_changed()
+                
+                # Keep only last 100 messages
+                removed_messages = trim_chat_messages()
+            
+            release_image_references(removed_messages)
+            self.send_json_response({"success": True, "message": "Message sent", "messageId": new_id})
+        
+        except json.JSONDecodeError:
+            self.send_json_response({"success": False, "error": "Invalid JSON"})
+        except Exception as e:
+            self.send_json_response({"success": False, "error": str(e)})
+    
+    def handle_image_upload(self):
+        """Handle image upload to the image store"""
+        # Check authentication
+        session_id = self.get_session_from_cookies()
+        if not session_id or not self.is_valid_session(session_id):
+            self.send_json_response({"success": False, "error": "Not authenticated"})
+            return
+        
+        username = self.get_username_from_session(session_id)
+        if not username:
+            self.send_json_response({"success": False, "error": "Not authenticated"})
+            return
+        
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type == 'application/json':
+            self.handle_json_image_upload(username)
+        else:
+            self.handle_binary_image_upload(username, content_type)
+    
+    def handle_binary_image_upload(self, username, content_type):
+        """Handle a raw image body (Blob / application/octet-stream) streamed to a temp file"""
+        if content_type != 'application/octet-stream' and not content_type.startswith('image/'):
+            self.send_json_response({"success": False, "error": f"Unsupported upload type: {content_type or 'none'}"})
+            return
+        
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        filename = query_params.get('filename', ['image.jpg'])[0] or 'image.jpg'
+        caption = query_params.get('caption', [''])[0][:200]  # Limit caption length
+        
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = 0
+        
+        if content_length <= 0:
+            self.send_json_response({"success": False, "error": "No image data"})
+            return
+        
+        # Reject oversized uploads before reading a single byte of the body
+        if content_length > MAX_IMAGE_UPLOAD_SIZE:
+            self.send_json_response({"success": False, "error": f"Image too large (max {MAX_IMAGE_UPLOAD_SIZE // (1024 * 1024)}MB)"})
+            return
+        
+        try:
+            image_file, sha256 = receive_upload_to_tempfile(self.rfile, content_length)
+        except Exception as e:
+            self.send_json_response({"success": False, "error": f"Upload failed: {str(e)}"})
+            return
+        
+        with image_file:
+            print(f"📥 Received {content_length} byte upload from {username} (sha256 {sha256[:12]})")
+            self.store_uploaded_image(username, image_file.name, filename, caption, sha256)
+    
+    def handle_json_image_upload(self, username):
+        """Handle legacy base64-in-JSON image uploads"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            
+            # Base64 inflates the payload by 4/3, plus a little room for the JSON envelope
+            if content_length > MAX_IMAGE_UPLOAD_SIZE * 4 // 3 + 4096:
+                self.send_json_response({"success": False, "error": f"Image too large (max {MAX_IMAGE_UPLOAD_SIZE // (1024 * 1024)}MB)"})
+                return
+            
+            post_data = self.rfile.read(content_length)
+            data = json.loads(post_data.decode('utf-8'))
+            
+            image_data = data.get('image_data', '')
+            filename = data.get('filename', 'image.jpg')
+            caption = data.get('caption', '')[:200]  # Limit caption length
+            
+            if not image_data:
+                self.send_json_response({"success": False, "error": "No image data"})
+                return
+            
+            image_bytes = base64.b64decode(image_data)
+            self.store_uploaded_image(username, image_bytes, filename, caption, hashlib.sha256(image_bytes).hexdigest())
+        
+        except json.JSONDecodeError:
+            self.send_json_response({"success": False, "error": "Invalid JSON"})
+        except Exception as e:
+            self.send_json_response({"success": False, "error": f"Upload failed: {str(e)}"})
+    
+    def store_uploaded_image(self, username, image_source, filename, caption, source_hash):
+        """Store a received image (once per distinct content) and post it to the chat.
+        
+        `image_source` is the path of the spooled upload, which the image
+        worker reads itself, or the bytes of an upload already in memory.
+        """
+        try:
+            # Bytes we've seen before resolve straight to the stored image - no processing, no upload.
+            # The reference fails if that image was just deleted as unreferenced; then it is stored again.
+            image_id = image_store.find_by_source_hash(source_hash)
+            referenced = bool(image_id) and image_store.add_reference(image_id, source_hash, uploaded_by=username)
+            
+            if not referenced:
+                # Validate, orient, strip metadata and build variants in the image worker pool
+                try:
+                    processed = image_worker_pool.run(prepare_upload, image_source, IMAGE_MAX_PIXELS)
+                except (ImagePoolBusy, ImageValidationError, TimeoutError) as e:
+                    self.send_json_response({"success": False, "error": str(e)})
+                    return
+                
+                # Images are content-addressed by the hash of their normalized bytes
+                image_id = hashlib.sha256(processed['data']).hexdigest()
+                
+                if not image_store.put(image_id, processed['data'], processed['content_type'], processed['variants'],
+                                       filename=filename, username=username, source_hash=source_hash):
+                    self.send_json_response({"success": False, "error": f"Failed to store image in {image_store.label}"})
+                    return
+                if not image_store.add_reference(image_id, source_hash, uploaded_by=username):
+                    self.send_json_response({"success": False, "error": "Image was removed while storing, please try again"})
+                    return
+            else:
+                print(f"♻️ Reusing stored image {image_id[:12]} for {filename}")
+            
+            self.post_image_message(username, image_id, filename, caption)
+            self.send_json_response({"success": True, "message": f"Image stored in {image_store.label} successfully", "imageId": image_id})
+        
+        except Exception as e:
+            self.send_json_response({"success": False, "error": f"Upload failed: {str(e)}"})
+    
+    def handle_image_share(self):
+        """Post an image the user has uploaded before, identified by the sha256 of its bytes"""
+        # Check authentication
+        session_id = self.get_session_from_cookies()
+        if not session_id or not self.is_valid_session(session_id):
+            self.send_json_response({"success": False, "error": "Not authenticated"})
+            return
+        
+        username = self.get_username_from_session(session_id)
+        if not username:
+            self.send_json_response({"success": False, "error": "Not authenticated"})
+            return
+        
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            post_data = self.rfile.read(content_length)
+            data = json.loads(post_data.decode('utf-8'))
+            
+            source_hash = str(data.get('sha256', '')).lower()
+            filename = data.get('filename', 'image.jpg')
+            caption = data.get('caption', '')[:200]  # Limit caption length
+            
+            # Other users' images need an upload first, so a leaked hash can't be turned into the image
+            image_id = image_store.find_shareable(source_hash, username) if source_hash else None
+            # An image deleted as unreferenced since the lookup can't be referenced, so the bytes are needed again
+            if not image_id or not image_store.add_reference(image_id, source_hash):
+                self.send_json_response({"success": False, "error": "Image not stored yet", "uploadRequired": True})
+                return
+            
+            self.post_image_message(username, image_id, filename, caption)
+            self.send_json_response({"success": True, "message": "Image shared", "imageId": image_id, "deduplicated": True})
+        
+        except json.JSONDecodeError:
+            self.send_json_response({"success": False, "error": "Invalid JSON"})
+        except Exception as e:
+            self.send_json_response({"success": False, "error": f"Share failed: {str(e)}"})
+    
+    def post_image_message(self, username, image_id, filename, caption):
+        """Add an image message pointing at a stored image to the chat"""
+        image_info = image_store.info(image_id) or {}
+        
+        with chatroom_lock:
+            new_id = max([msg.id for msg in chatroom_messages], default=0) + 1
+            
+            message = ChatMessage(
+                new_id, username, f"📸 Shared an image: {filename}", ip=self.client_address[0], type=MessageType.IMAGE,
+                image_id=image_id, filename=filename, caption=caption,
+                # Only advertise the variants that actually made it into the store
+                variant_widths=sorted(int(w) for w in image_info.get('variants', {}))
+            )
+            chatroom_messages.append(message)
+            message_fragments.add(message)
+            mark_chatroom_changed()
+            
+            # Keep only last 100 messages
+            removed_messages = trim_chat_messages()
+        
+        release_image_references(removed_messages)
+        return new_id
+    
+    def handle_image_serve(self, path):
+        """Serve images from the image store, optionally as a smaller width variant (?w=...)"""
+        try:
+            image_id = path.split('/')[-1]
+            
+            query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            requested_width = query_params.get('w', [''])[0]
+            requested_width = int(requested_width) if requested_width.isdigit() else None
+            
+            # Get image info for content type and available variants
+            image_info = image_store.info(image_id)
+            if not image_info:
+                self.send_error(404, "Image not found")
+                return
+            
+            variants = image_info.get('variants', {})
+            width = pick_variant_width(requested_width, [int(w) for w in variants])
+            cache_key = f"{image_id}_w{width}" if width else image_id
+            etag = f'"{cache_key}"'
+            
+            filename = image_info.get('filename', 'image.jpg')
+            
+            # Determine content type
+            if width:
+                content_type = variants[str(width)]['content_type']
+            elif image_info.get('content_type'):
+                content_type = image_info['content_type']
+            elif filename.lower().endswith('.png'):
+                content_type = 'image/png'
+            elif filename.lower().endswith('.gif'):
+                content_type = 'image/gif'
+            else:
+                content_type = 'image/jpeg'
+            
+            # Image ids are content hashes, so any copy the client still holds is current
+            webp_allowed = IMAGE_WEBP_ENABLED and content_type != 'image/gif' and accepts_webp(self.headers.get('Accept', ''))
+            webp_etag = f'"{cache_key}-webp"'
+            matched_etag = self.request_is_fresh(etag, webp_etag)
+            if matched_etag:
+                self.send_not_modified(matched_etag, IMAGE_CACHE_CONTROL, vary="Accept")
+                return
+            
+            # Let the store deliver the bytes unless the response has to be transformed here
+            if IMAGE_SERVE_MODE == 'redirect' and not webp_allowed:
+                link = image_store.link(image_id, width)
+                if link:
+                    self.send_image_redirect(*link)
+                    return
+            
+            # Negotiate WebP (GIFs are left alone so animations survive)
+            if webp_allowed:
+                source = self.get_image_source(image_id, width, cache_key)
+                if not source:
+                    self.send_error(404, "Image not found")
+                    return
+                
+                webp_bytes = webp_transcoder.get((image_id, width), *source)
+                if webp_bytes:
+                    self.send_image_bytes(webp_bytes, 'image/webp', webp_etag)
+                    return
+            
+            # Files on this host go out with sendfile: the local store's own copy, or the disk cache's
+            image_path = image_store.local_path(image_id, width) or (image_disk_cache.get(cache_key) if image_disk_cache else None)
+            if image_path and self.send_image_file(image_path, content_type, etag):
+                return
+            
+            if not self.stream_image(image_id, width, cache_key, content_type, etag):
+                self.send_error(404, "Image not found")
+        
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"⚠️ Client disconnected while receiving image {path}")
+        except Exception as e:
+            print(f"Error serving image from {image_store.label}: {e}")
+            self.send_error(500, "Error serving image")
+    
+    def send_image_redirect(self, download_url, expires_at):
+        """Redirect to a store download link, cacheable for as long as the link stays valid"""
+        max_age = max(0, int(expires_at - time.time()) - IMAGE_LINK_REFRESH_MARGIN)
+        self.send_response(302)
+        self.send_header("Location", download_url)
+        self.send_header("Content-Length", "0")
+        self.send_header("Cache-Control", f"private, max-age={max_age}")
+        self.send_header("Vary", "Accept")
+        self.end_headers()
+    
+    def send_image_headers(self, status, content_type, content_length, etag, content_range=None):
+        """Send the headers shared by full and partial image responses"""
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        if content_length is not None:
+            self.send_header("Content-Length", str(content_length))
+        else:
+            self.send_header("Connection", "close")  # Upstream sent no length, so the body ends when the connection does
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", IMAGE_CACHE_CONTROL)
+        self.send_header("Vary", "Accept")
+        self.end_headers()
+    
+    def select_byte_range(self, size, etag):
+        """Resolve Range/If-Range against a body size: (start, end), None for the whole body, or 'unsatisfiable'"""
+        if_range = self.headers.get('If-Range')
+        if if_range and if_range != etag:
+            return None  # The client's partial copy is of a different representation
+        return parse_byte_range(self.headers.get('Range'), size)
+    
+    def send_range_not_satisfiable(self, size):
+        """Reject a Range that starts past the end of the body"""
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def send_image_bytes(self, image_bytes, content_type, etag):
+        """Send an in-memory image body, honouring Range"""
+        size = len(image_bytes)
+        byte_range = self.select_byte_range(size, etag)
+        if byte_range == 'unsatisfiable':
+            self.send_range_not_satisfiable(size)
+        elif byte_range:
+            start, end = byte_range
+            self.send_image_headers(206, content_type, end - start + 1, etag, f"bytes {start}-{end}/{size}")
+            self.wfile.write(image_bytes[start:end + 1])
+        else:
+            self.send_image_headers(200, content_type, size, etag)
+            self.wfile.write(image_bytes)
+    
+    def send_image_file(self, image_path, content_type, etag):
+        """Send an image file (local store or disk cache) with sendfile, honouring Range.
+        
+        Returns False if the file was removed before it could be opened.
+        """
+        try:
+            image_file = open(image_path, 'rb')
+        except FileNotFoundError:
+            return False
+        
+        with image_file:
+            size = os.fstat(image_file.fileno()).st_size
+            byte_range = self.select_byte_range(size, etag)
+            if byte_range == 'unsatisfiable':
+                self.send_range_not_satisfiable(size)
+                return True
+            
+            if byte_range:
+                start, end = byte_range
+                self.send_image_headers(206, content_type, end - start + 1, etag, f"bytes {start}-{end}/{size}")
+            else:
+                start, end = 0, size - 1
+                self.send_image_headers(200, content_type, size, etag)
+            
+            if size:
+                self.connection.sendfile(image_file, start, end - start + 1)
+        return True
+    
+    def get_image_source(self, image_id, width, cache_key):
+        """(size, load_source) for the bytes of an image, going through the disk cache for remote stores"""
+        image_path = image_store.local_path(image_id, width)
+        if not image_path and image_disk_cache:
+            image_path = image_disk_cache.get(cache_key) or self.fill_image_cache(image_id, width, cache_key)
+            if not image_path:
+                return None
+        
+        if image_path:
+            try:
+                size = os.path.getsize(image_path)
+            except OSError:
+                return None
+            
+            def load_source():
+                with open(image_path, 'rb') as f:
+                    return f.read()
+            
+            return size, load_source
+        
+        blob = image_store.blob_info(image_id, width)
+        if not blob:
+            return None
+        return blob.get('size', 0), lambda: image_store.get(image_id, width)
+    
+    def stream_image(self, image_id, width, cache_key, content_type, etag):
+        """Relay an image from the store in chunks, keeping a copy in the disk cache on the way (remote stores).
+        
+        Range requests are passed to the store and relayed as-is without
+        caching. While one request downloads an image into the cache, other
+        requests for it wait for that copy instead of downloading it again.
+        """
+        range_header = self.headers.get('Range')
+        if self.headers.get('If-Range', etag) != etag:
+            range_header = None
+        
+        if not image_disk_cache or range_header:
+            return self.relay_image(image_id, width, cache_key, content_type, etag, range_header, cache=False)
+        
+        pending, first = image_disk_cache.start_fill(cache_key)
+        if not first:
+            image_path = self.wait_for_fill(pending)
+            if image_path and self.send_image_file(image_path, content_type, etag):
+                return True
+            return self.relay_image(image_id, width, cache_key, content_type, etag, None, cache=False)
+        
+        try:
+            return self.relay_image(image_id, width, cache_key, content_type, etag, None, cache=True)
+        finally:
+            image_disk_cache.finish_fill(cache_key)
+    
+    def wait_for_fill(self, pending):
+        """The path another request's download of the same image was cached at, or None if it failed or is too slow"""
+        try:
+            return pending.result(timeout=IMAGE_FILL_WAIT)
+        except FuturesTimeoutError:
+            return None
+    
+    def relay_image(self, image_id, width, cache_key, content_type, etag, range_header, cache):
+        """Relay an image from the store, writing a copy into the disk cache when `cache` is set"""
+        response = image_store.stream(image_id, width, range_header)
+        if response is None:
+            return False
+        
+        with response:
+            if response.status == 416:
+                self.send_response(416)
+                self.send_header("Content-Range", response.content_range or 'bytes */*')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+            
+            content_length = response.content_length
+            if response.status == 206 or not cache:
+                self.send_image_headers(response.status, content_type, content_length, etag, response.content_range)
+                for chunk in response.iter_content(IMAGE_STREAM_CHUNK_SIZE):
+                    self.wfile.write(chunk)
+                return True
+            
+            self.send_image_headers(200, content_type, content_length, etag)
+            cache_file = image_disk_cache.open_writer(cache_key)
+            received = 0
+            try:
+                for chunk in response.iter_content(IMAGE_STREAM_CHUNK_SIZE):
+                    cache_file.write(chunk)
+                    self.wfile.write(chunk)
+                    received += len(chunk)
+            except Exception:
+                image_disk_cache.abort(cache_file)
+                raise
+            
+            if content_length and received != int(content_length):
+                print(f"⚠️ Truncated {image_store.label} download for {cache_key}: {received}/{content_length} bytes")
+                image_disk_cache.abort(cache_file)
+            else:
+                image_disk_cache.commit(cache_key, cache_file)
+        return True
+    
+    def fill_image_cache(self, image_id, width, cache_key):
+        """Download an image from the store into the disk cache without sending it; returns the cached path.
+        
+        Concurrent misses for the same image share one download.
+        """
+        pending, first = image_disk_cache.start_fill(cache_key)
+        if not first:
+            return self.wait_for_fill(pending)
+        
+        try:
+            return self.download_to_cache(image_id, width, cache_key)
+        finally:
+            image_disk_cache.finish_fill(cache_key)
+    
+    def download_to_cache(self, image_id, width, cache_key):
+        """Download an image from the store into the disk cache; returns the cached path or None"""
+        response = image_store.stream(image_id, width)
+        if response is None:
+            return None
+        
+        with response:
+            if response.status != 200:
+                return None
+            
+            cache_file = image_disk_cache.open_writer(cache_key)
+            try:
+                for chunk in response.iter_content(IMAGE_STREAM_CHUNK_SIZE):
+                    cache_file.write(chunk)
+            except Exception as e:
+                print(f"❌ Error downloading from {image_store.label}: {e}")
+                image_disk_cache.abort(cache_file)
+                return None
+            image_disk_cache.commit(cache_key, cache_file)
+        return image_disk_cache.path_for(cache_key)
+    
+    def handle_chat_messages(self, path):
+        """Handle retrieving chat messages (authenticated users only)"""
+        # Check authentication
+        session_id = self.get_session_from_cookies()
+        if not session_id or not self.is_valid_session(session_id):
+            self.send_json_response({"error": "Not authenticated"})
+            return
+        
+        # Parse query parameters (`path` has had its query stripped; it is still on self.path)
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        try:
+            since_id = int(query_params.get('since', [0])[0])
+        except ValueError:
+            since_id = 0
+        # JSON unless the client asks for a binary format (MessagePack/CBOR, when installed)
+        media_type = negotiate_wire_format(self.headers.get('Accept'))
+        
+        with chatroom_lock:
+            since_id = self.effective_since(since_id)
+            # Taken under the lock so the ETag always describes the data sent with it
+            etag = f'"messages-{BOOT_ID}-{chatroom_version}-{since_id}"'
+            if media_type:
+                etag = f'{etag[:-1]}-{media_type.rsplit("/", 1)[-1]}"'
+            matched_etag = self.request_is_fresh(*etag_variants(etag))
+            if matched_etag:
+                body = None
+            else:
+                body = self.get_poll_response(since_id, media_type)
+        
+        if body is None:
+            self.send_not_modified(matched_etag, "no-cache", vary="Accept, Accept-Encoding")
+            return
+        
+        self.send_json_body(body, etag=etag, content_type=media_type or "application/json", vary="Accept, Accept-Encoding")
+    
+    @staticmethod
+    def effective_since(since_id):
+        """The id a poll's `since` stands for (caller holds chatroom_lock).
+        
+        Anything older than the buffer gets the whole buffer. A since past
+        the newest message comes from a page that outlived a restart which
+        lost messages, so it gets the whole buffer too rather than nothing
+        until the ids catch up.
+        """
+        last_id = chatroom_messages[-1].id if chatroom_messages else 0
+        first_id = chatroom_messages[0].id if chatroom_messages else 0
+        if since_id < first_id or since_id > last_id:
+            return 0
+        return since_id
+    
+    def get_poll_response(self, since_id, media_type=None):
+        """The poll body for messages after `since_id` at the current buffer version, encoded once and shared.
+        
+        Caller holds chatroom_lock and has passed since_id through
+        effective_since. The body's compressed copies are made on first
+        use, outside the lock, by whichever poller asks first.
+        `media_type` picks a binary format instead of JSON.
+        """
+        if poll_responses["version"] != chatroom_version:
+            poll_responses["version"] = chatroom_version
+            poll_responses["bodies"] = {}
+        
+        last_id = chatroom_messages[-1].id if chatroom_messages else 0
+        key = (since_id, media_type)
+        body = poll_responses["bodies"].get(key)
+        if body:
+            poll_responses["hits"] += 1
+            return body
+        
+        poll_responses["misses"] += 1
+        new_messages = [msg for msg in chatroom_messages if msg.id > key[0]]
+        if media_type:
+            body = CompressedVariants(encode_messages(media_type, new_messages, last_id, len(chatroom_messages)), media_type, 'dynamic')
+            poll_responses["bodies"][key] = body
+            return body
+        
+        # Same shape as {"messages": [...], "lastId": ..., "messageCount": ...}, from pre-encoded messages
+        body = CompressedVariants(b''.join([
+            b'{"messages":', message_fragments.encode_list(new_messages),
+            b',"lastId":', str(last_id).encode(),
+            b',"messageCount":', str(len(chatroom_messages)).encode(), b'}'
+        ]), "application/json", 'dynamic')
+        poll_responses["bodies"][key] = body
+        return body
+    
+    def handle_status(self):
+        """Handle server status"""
+        with chatroom_lock, users_lock:
+            message_count = len(chatroom_messages)
+            poll_hits, poll_misses = poll_responses["hits"], poll_responses["misses"]
+            user_count = len(users_db)
+            active_sessions = len([s for s in user_sessions.values() if datetime.now() < s['expires']])
+        
+        data = {
+            "status": "online",
+            "server": f"Enhanced Chatroom + Voice + Images Server ({image_store.label} Edition)",
+            "version": f"9.0-{image_store.name}",
+            "timestamp": time.time(),
+            "total_messages": message_count,
+            "total_users": user_count,
+            "active_sessions": active_sessions,
+            "signaling_server": "https://repo1-ejq1.onrender.com",
+            "features": [
+                "user_authentication", 
+                "persistent_storage", 
+                "github_gist_backup",
+                "text_chat", 
+                f"{image_store.name}_image_storage",
+                "voice_room", 
+                "webrtc_voice", 
+                "push_to_talk", 
+                "render_signaling",
+                "drag_drop_upload",
+                "image_compression",
+                "high_quality_images",
+                "webp_images",
+                "image_range_requests"
+            ],
+            "storage_status": {
+                "chat_backup": "github_gist",
+                "image_storage": image_store.name,
+                "github_gist_configured": bool(GITHUB_GIST_TOKEN and GITHUB_GIST_ID),
+                "webhook_configured": bool(EXTERNAL_BACKUP_URL)
+            },
+            "image_store_info": dict(
+                image_store.get_stats(),
+                max_file_size=f"{MAX_IMAGE_UPLOAD_SIZE // (1024 * 1024)}MB",
+                supported_formats=["JPEG", "PNG", "GIF"]
+            ),
+            "image_metrics": {
+                "worker_pool": image_worker_pool.get_stats(),
+                "webp_enabled": IMAGE_WEBP_ENABLED,
+                "webp": webp_transcoder.get_stats(),
+                "disk_cache": image_disk_cache.get_stats() if image_disk_cache else None,
+                "serve_mode": IMAGE_SERVE_MODE
+            },
+            "upstreams": get_upstream_stats(),
+            "json_encoder": JSON_ENCODER,
+            "wire_formats": ["application/json"] + sorted(WIRE_FORMATS),
+            "poll_cache": {"hits": poll_hits, "misses": poll_misses},
+            "static_files": static_files.get_stats(),
+            "uptime": f"Running with authentication, voice, and {image_store.label} image storage! 🔐💬🎤☁️"
+        }
+        
+        self.send_json_response(data)
+    
+    def send_json_response(self, data, etag=None):
+        """Helper method to send JSON responses, compressed when large enough and the client accepts it"""
+        self.send_json_body(CompressedVariants(dumps(data), "application/json", 'dynamic'), etag)
+    
+    def send_json_body(self, body, etag=None, content_type="application/json", vary="Accept-Encoding"):
+        """Send an encoded API body (CompressedVariants) in the best encoding the client accepts"""
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding')) if body.compressible else None
+        response = body.get(encoding)
+        
+        headers = [("Vary", vary)]
+        if etag:
+            headers.append(("ETag", encoded_etag(etag, encoding)))
+            headers.append(("Cache-Control", "no-cache"))  # Store, but revalidate every time
+        headers.append(("Access-Control-Allow-Origin", "*"))
+        headers.append(("Access-Control-Allow-Headers", "Content-Type"))
+        headers.append(("Access-Control-Allow-Methods", "GET, POST, OPTIONS"))
+        self.send_body(response, content_type, encoding, headers)
+    
+    def request_is_fresh(self, *etags, last_modified=None):
+        """Check the request's validators, returning the ETag of the client's still-valid copy or None.
+        
+        If-None-Match takes precedence; If-Modified-Since is only used without it.
+        """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            client_tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            if '*' in client_tags:
+                return etags[0]
+            return next((etag for etag in etags if etag in client_tags), None)
+        
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and last_modified is not None:
+            try:
+                if int(last_modified) <= email.utils.parsedate_to_datetime(if_modified_since).timestamp():
+                    return etags[0]
+            except (TypeError, ValueError):
+                pass
+        return None
+    
+    def send_not_modified(self, etag, cache_control, vary=None):
+        """Send a bodyless 304 with the headers a cache needs to refresh its stored copy"""
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        if vary:
+            self.send_header("Vary", vary)
+        self.end_headers()
+    
+    def serve_static_file(self, path):
+        """Serve a file from the static files directory, or return False if there is none.
+        
+        Validators come from the cached entry, so a revalidation costs one
+        stat. Small files are sent from memory (compressed when worthwhile),
+        .gz/.br siblings are sent as the encoded representation, and large
+        files go out with sendfile. Range requests get the plain file.
+        """
+        entry = static_files.lookup(path)
+        if not entry:
+            return False
+        
+        etags = [entry["etag"]] + [encoded_etag(entry["etag"], encoding) for encoding in entry["encodings"]]
+        fresh_etag = self.request_is_fresh(*etags, last_modified=entry["last_modified"])
+        if fresh_etag:
+            self.send_not_modified(fresh_etag, STATIC_FILE_CACHE_CONTROL, vary="Accept-Encoding")
+            return True
+        
+        encoding = None
+        if not self.headers.get('Range'):
+            encoding = negotiate_encoding(self.headers.get('Accept-Encoding'), entry["encodings"])
+        
+        if encoding in entry["siblings"]:
+            return self.send_static_from_disk(entry, entry["siblings"][encoding]["path"], encoding)
+        if encoding:
+            body = entry["variants"].get(encoding)
+            self.send_static_headers(200, entry, len(body), encoding)
+            self.wfile.write(body)
+            return True
+        if not entry["variants"]:
+            return self.send_static_from_disk(entry, entry["path"])
+        
+        body = entry["variants"].data
+        byte_range = self.select_byte_range(len(body), entry["etag"])
+        if byte_range == 'unsatisfiable':
+            self.send_range_not_satisfiable(len(body))
+        elif byte_range:
+            start, end = byte_range
+            self.send_static_headers(206, entry, end - start + 1, content_range=f"bytes {start}-{end}/{len(body)}")
+            self.wfile.write(body[start:end + 1])
+        else:
+            self.send_static_headers(200, entry, len(body))
+            self.wfile.write(body)
+        return True
+    
+    def send_static_from_disk(self, entry, file_path, encoding=None):
+        """Send a static file (or its pre-compressed sibling) with sendfile, honouring Range for the plain file"""
+        try:
+            static_file = open(file_path, 'rb')
+        except OSError:
+            static_files.forget(entry["path"])
+            return False
+        
+        with static_file:
+            size = os.fstat(static_file.fileno()).st_size
+            byte_range = None if encoding else self.select_byte_range(size, entry["etag"])
+            if byte_range == 'unsatisfiable':
+                self.send_range_not_satisfiable(size)
+                return True
+            
+            if byte_range:
+                start, end = byte_range
+                self.send_static_headers(206, entry, end - start + 1, content_range=f"bytes {start}-{end}/{size}")
+            else:
+                start, end = 0, size - 1
+                self.send_static_headers(200, entry, size, encoding)
+            
+            if size:
+                self.connection.sendfile(static_file, start, end - start + 1)
+        return True
+    
+    def send_static_headers(self, status, entry, content_length, encoding=None, content_range=None):
+        """Send the headers for a static file response in one representation"""
+        self.send_response(status)
+        self.send_header("Content-type", entry["content_type"])
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(content_length))
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", encoded_etag(entry["etag"], encoding))
+        self.send_header("Last-Modified", email.utils.formatdate(entry["last_modified"], usegmt=True))
+        self.send_header("Cache-Control", STATIC_FILE_CACHE_CONTROL)
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+    
+    def do_POST(self):
+        """Handle POST requests"""
+        parsed_path = urllib.parse.urlparse(self.path)
+        path = parsed_path.path
+        
+        if path.startswith('/api/'):
+            self.handle_api(path)
+        else:
+            content_length = int(self.headers.get('Content-Length', 0))
+            post_data = self.rfile.read(content_length)
+            
+            response_data = {
+                "message": "POST request received",
+                "content_length": content_length,
+                "data_preview": post_data.decode('utf-8', errors='ignore')[:200]
+            }
+            
+            self.send_json_response(response_data)
+    
+    def do_OPTIONS(self):
+        """Handle OPTIONS requests for CORS"""
+        self.send_response(200)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+# Both pages are built once; requests only splice in the username
+LOGIN_PAGE = PageTemplate(ChatroomHandler.render_login_page())
+CHATROOM_PAGE = PageTemplate(ChatroomHandler.render_chatroom_page(), slots=('username_html', 'username_js'))
+
+class ChatroomServer(socketserver.ThreadingTCPServer):
+    """One thread per connection, so uploads and image fetches don't stall polling"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+def cleanup_expired_sessions():
+    """Background task to clean up expired sessions"""
+    while True:
+        time.sleep(3600)  # Run every hour
+        current_time = datetime.now()
+        with users_lock:
+            expired_sessions = [
+                session_id for session_id, session_data in user_sessions.items()
+                if current_time > session_data['expires']
+            ]
+            for session_id in expired_sessions:
+                del user_sessions[session_id]
+        
+        if expired_sessions:
+            print(f"🧹 Cleaned up {len(expired_sessions)} expired sessions")
+
+def main():
+    # Restore data from backup on startup
+    print("🔄 Restoring chat data from backups…")
+    if data_persistence.restore_from_github_gist():
+        print("✅ Chat data restored from GitHub Gist backup")
+    else:
+        print("⚠️ No chat backup found or failed to restore - starting fresh")
+    
+    # Connect the image store and count the references the restored messages hold
+    print(f"☁️ Loading {image_store.label} image catalog...")
+    if not image_store.start():
+        print(f"❌ {image_store.label} image store unavailable - image uploads will not work")
+    with chatroom_lock:
+        for message in chatroom_messages:
+            if message.type is MessageType.IMAGE and message.image_id:
+                image_store.add_reference(message.image_id)
+    
+    # Start the image workers (and their fork server) before serving
+    image_worker_pool.start()
+    
+    # Start background tasks
+    backup_thread = threading.Thread(target=backup_data_periodically, daemon=True)
+    backup_thread.start()
+    
+    cleanup_thread = threading.Thread(target=cleanup_expired_sessions, daemon=True)
+    cleanup_thread.start()
+    
+    try:
+        with ChatroomServer(("0.0.0.0", PORT), ChatroomHandler) as httpd:
+            print("🚀" * 60)
+            print(f"☁️💬🎤📸 ENHANCED CHATROOM WITH {image_store.label.upper()} STORAGE!")
+            print("🚀" * 60)
+            print(f"🌐 Server URL: http://localhost:{PORT}")
+            print(f"📡 Voice Signaling: https://repo1-ejq1.onrender.com")
+            print(f"☁️ Image Storage: {image_store.label} (IMAGE_STORE={image_store.name})")
+            print(f"📂 Directory: {os.getcwd()}")
+            print(f"🗄️ Loaded Users: {len(users_db)}")
+            print(f"💬 Loaded Messages: {len(chatroom_messages)}")
+            
+            print("\n🔐 AUTHENTICATION FEATURES:")
+            print("   👤 User registration with username + password")
+            print("   🔑 Secure login system with sessions")
+            print("   🕒 24-hour session expiration")
+            print("   🚪 Logout functionality")
+            print("   ⚡ Session validation on all requests")
+            
+            print("\n💾 PERSISTENCE FEATURES:")
+            print("   📦 GitHub Gist backup (chat data only)")
+            print(f"   ☁️ {image_store.label} storage (images only)")
+            print("   🔄 Auto-backup every 5 minutes")
+            print("   📤 Webhook backup (secondary)")
+            print("   🔧 Data restoration on server restart")
+            print("   🧹 Automatic session cleanup")
+            
+            print(f"\n☁️ {image_store.label.upper()} IMAGE FEATURES:")
+            print("   🖼️ High-quality image storage")
+            print("   📱 Drag & drop + file picker upload")
+            print("   🗜️ Optimized compression (90% quality)")
+            print(f"   💾 Persistent {image_store.label} storage")
+            print("   🔍 Full-size image preview")
+            print(f"   📏 {MAX_IMAGE_UPLOAD_SIZE // (1024 * 1024)}MB file size limit")
+            print("   🎨 JPEG/PNG/GIF support")
+            print("   🔐 Secure file access")
+            print("   📡 Streamed delivery with Range support + disk cache")
+            
+            print("\n⚙️ RENDER.COM SETUP INSTRUCTIONS:")
+            print("   1. Set environment variables in Render dashboard:")
+            print("      IMAGE_STORE=pcloud, gist, local or memory")
+            for line in IMAGE_STORE_SETUP.get(image_store.name, []):
+                print(f"      {line}")
+            print("      GITHUB_GIST_TOKEN=your_github_token_here")
+            print("      GITHUB_GIST_ID=your_gist_id_here")
+            print("      BACKUP_WEBHOOK_URL=optional_webhook_url")
+            print("   2. Create a GitHub Personal Access Token with 'gist' scope")
+            print("   3. Create a private gist on GitHub for chat backup")
+            print(f"   4. Your images will be stored in {image_store.label}! ☁️")
+            
+            print("\n✨ FEATURES:")
+            print("   🔐 Secure user authentication")
+            print("   💬 Real-time text chatroom")
+            print(f"   ☁️ {image_store.label} image storage")
+            print("   📸 High-quality image sharing")
+            print("   🎤 Voice room with WebRTC")
+            print("   📱 Mobile-friendly interface")
+            print("   😊 Emoji support")
+            print("   🔄 Auto-refresh every 2 seconds")
+            print("   💾 Persistent data storage")
+            print("   🔇 Mute/unmute functionality")
+            print("   📊 Voice activity indicators")
+            print("   👥 User session management")
+            print("   🖼️ Image modal preview")
+            print("   🗜️ Smart image optimization")
+            
+            print("\n🌐 API ENDPOINTS:")
+            print("   🏠 GET / (Login/Register page)")
+            print("   💬 GET /chat (Chatroom - requires auth)")
+            print("   📝 POST /api/auth/register (Create account)")
+            print("   🔑 POST /api/auth/login (Login)")
+            print("   🚪 POST /api/auth/logout (Logout)")
+            print("   ✅ GET /api/auth/check (Check auth)")
+            print("   📤 POST /api/chat/send (Send message)")
+            print(f"   ☁️ POST /api/chat/upload-image (Upload to {image_store.label})")
+            print("   ♻️ POST /api/chat/share-image (Re-share a stored image by hash)")
+            print("   📥 GET /api/chat/messages (Get messages)")
+            print(f"   🖼️ GET /api/images/{{id}} (Serve from {image_store.label})")
+            print("   📊 GET /api/status (Server status)")
+            
+            image_store_status = "✅ Connected" if image_store.started else "❌ Not connected"
+            chat_backup_status = "✅ Configured" if GITHUB_GIST_TOKEN and GITHUB_GIST_ID else "❌ Not configured"
+            webhook_status = "✅ Configured" if EXTERNAL_BACKUP_URL else "⚠️ Optional"
+            
+            print(f"\n💾 STORAGE STATUS:")
+            print(f"   {image_store.label} Images: {image_store_status}")
+            print(f"   Chat Backup: {chat_backup_status}")
+            print(f"   Webhook URL: {webhook_status}")
+            
+            if not image_store.started:
+                print(f"\n⚠️  WARNING: {image_store.label} not configured!")
+                print("   Image uploads will fail.")
+                print("   Please set the environment variables listed above for IMAGE_STORE.")
+            
+            if not GITHUB_GIST_TOKEN or not GITHUB_GIST_ID:
+                print("\n⚠️  WARNING: No chat backup configured!")
+                print("   Your chat data will be lost when Render restarts the service.")
+                print("   Please set GITHUB_GIST_TOKEN and GITHUB_GIST_ID environment variables.")
+            
+            print("\n🛑 Press Ctrl+C to stop the server")
+            print("=" * 60)
+            
+            httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Server stopped by user")
+        print("💾 Performing final backup...")
+        data_persistence.backup_to_github_gist()
+        print(f"👋 Thanks for using the enhanced chatroom with {image_store.label}!")
+    except Exception as e:
+        print(f"❌ Server error: {e}")
+
+if __name__ == "__main__":
+    main()
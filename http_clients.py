@@ -0,0 +1,269 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import registry
+
+# Outbound HTTP: one pooled keep-alive session per upstream service
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))  # Connections kept open per upstream host
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2))  # Extra attempts for idempotent calls
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.25))  # Base delay in seconds, doubled per attempt
+
+# Fail fast while an upstream is down, and cap how many threads can be stuck waiting on one
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))  # Consecutive failures that open the circuit
+BREAKER_RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))  # Seconds open before a trial call is let through
+BULKHEAD_WAIT = float(os.environ.get('BULKHEAD_WAIT', 0.5))  # Seconds to wait for a free slot before giving up
+
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+upstream_request_seconds = registry.histogram(
+    'chat_upstream_request_duration_seconds', 'Outbound call latency, including retries', ('upstream',)
+)
+upstream_requests_total = registry.counter(
+    'chat_upstream_requests_total', 'Outbound calls by outcome (ok, error, rejected)', ('upstream', 'outcome')
+)
+
+class UpstreamUnavailable(requests.RequestException):
+    """Raised without calling out when an upstream's circuit is open or its bulkhead is full"""
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial after a cool-down -> closed again"""
+    
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0
+        self.trial_running = False
+        self.rejected = 0
+        self.times_opened = 0
+    
+    def allow(self):
+        """Whether a call may go out now (in half-open, only one trial at a time)"""
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            
+            if self.state == 'closed' or (self.state == 'half_open' and not self.trial_running):
+                self.trial_running = self.state == 'half_open'
+                return True
+            
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_running = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+    
+    def release_trial(self):
+        """Give back a half-open trial slot that never made a call"""
+        with self.lock:
+            self.trial_running = False
+    
+    def get_stats(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected
+            }
+
+class UpstreamClient:
+    """A persistent requests.Session for one upstream service.
+    
+    Connections are pooled and kept alive between calls. Idempotent calls
+    are retried on connection errors and 429/5xx-gateway responses with
+    jittered exponential backoff, as long as the upstream's time budget
+    allows another attempt. A circuit breaker fails calls fast while the
+    upstream keeps failing, and a bulkhead caps the calls in flight so a
+    slow upstream can only tie up that many request threads. Latency and
+    error counters are kept for /api/status.
+    """
+    
+    def __init__(self, name, budget, pool_size=HTTP_POOL_SIZE, max_retries=HTTP_MAX_RETRIES, backoff=HTTP_RETRY_BACKOFF,
+                 max_concurrent=None):
+        self.name = name
+        self.budget = budget  # Seconds one logical call may take across all its attempts
+        self.max_retries = max_retries
+        self.backoff = backoff
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        self.breaker = CircuitBreaker()
+        self.max_concurrent = max_concurrent or pool_size
+        self.bulkhead = threading.BoundedSemaphore(self.max_concurrent)
+        self.in_flight = 0
+        
+        self.stats_lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.bulkhead_rejected = 0
+        self.latencies = deque(maxlen=500)  # Recent call latencies in seconds
+    
+    def request(self, method, url, idempotent=None, **kwargs):
+        """Send a request through the breaker and bulkhead; raises UpstreamUnavailable if either refuses it"""
+        if not self.breaker.allow():
+            upstream_requests_total.inc(self.name, 'rejected')
+            raise UpstreamUnavailable(f"{self.name} circuit is open")
+        
+        if not self.bulkhead.acquire(timeout=BULKHEAD_WAIT):
+            with self.stats_lock:
+                self.bulkhead_rejected += 1
+            self.breaker.release_trial()
+            upstream_requests_total.inc(self.name, 'rejected')
+            raise UpstreamUnavailable(f"{self.name} has {self.max_concurrent} calls in flight")
+        
+        with self.stats_lock:
+            self.in_flight += 1
+        try:
+            response = self.send_with_retries(method, url, idempotent, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            with self.stats_lock:
+                self.in_flight -= 1
+            self.bulkhead.release()
+        
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+    
+    def send_with_retries(self, method, url, idempotent=None, **kwargs):
+        """Send a request, retrying idempotent ones; raises like requests does once attempts run out"""
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        timeout = kwargs.pop('timeout', None)
+        started = time.monotonic()
+        deadline = started + max(self.budget, timeout or 0)  # A single slow call the caller asked for still fits
+        
+        for attempt in range(attempts):
+            # Each attempt gets what is left of the budget, capped by the caller's own timeout
+            remaining = max(deadline - time.monotonic(), 0.1)
+            kwargs['timeout'] = min(timeout or remaining, remaining)
+            last_attempt = attempt == attempts - 1
+            
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt or not self.wait_before_retry(attempt, deadline):
+                    self.record(started, error=True)
+                    raise
+                continue
+            
+            if response.status_code in RETRY_STATUSES and not last_attempt and self.wait_before_retry(attempt, deadline, response):
+                response.close()
+                continue
+            
+            self.record(started, error=response.status_code >= 500)
+            return response
+    
+    def wait_before_retry(self, attempt, deadline, response=None):
+        """Sleep a jittered backoff before the next attempt; False if the budget can't fit another one"""
+        delay = random.uniform(0, self.backoff * (2 ** attempt))  # Full jitter
+        retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        
+        if time.monotonic() + delay >= deadline:
+            return False
+        
+        with self.stats_lock:
+            self.retries += 1
+        time.sleep(delay)
+        return True
+    
+    def record(self, started, error):
+        elapsed = time.monotonic() - started
+        with self.stats_lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.latencies.append(elapsed)
+        upstream_request_seconds.observe(elapsed, self.name)
+        upstream_requests_total.inc(self.name, 'error' if error else 'ok')
+    
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+    
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+    
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+    
+    def get_stats(self):
+        """Snapshot of call counts and recent latency percentiles"""
+        with self.stats_lock:
+            latencies = sorted(self.latencies)
+            calls, errors, retries = self.calls, self.errors, self.retries
+            in_flight, bulkhead_rejected = self.in_flight, self.bulkhead_rejected
+        
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 1)
+        
+        return {
+            "calls": calls,
+            "errors": errors,
+            "retries": retries,
+            "budget_s": self.budget,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+            "circuit": self.breaker.get_stats(),
+            "bulkhead": {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": in_flight,
+                "rejected": bulkhead_rejected
+            }
+        }
+
+# Shared clients, one per upstream (sessions are safe to share between request threads)
+pcloud_http = UpstreamClient('pcloud', budget=float(os.environ.get('PCLOUD_HTTP_BUDGET', 30)),
+                            max_concurrent=int(os.environ.get('PCLOUD_MAX_CONCURRENT', 8)))
+github_http = UpstreamClient('github', budget=float(os.environ.get('GITHUB_HTTP_BUDGET', 30)),
+                            max_concurrent=int(os.environ.get('GITHUB_MAX_CONCURRENT', 4)))
+webhook_http = UpstreamClient('webhook', budget=float(os.environ.get('WEBHOOK_HTTP_BUDGET', 10)), pool_size=2)
+
+UPSTREAM_CLIENTS = (pcloud_http, github_http, webhook_http)
+
+def get_upstream_stats():
+    """Per-upstream latency and error metrics"""
+    return {client.name: client.get_stats() for client in UPSTREAM_CLIENTS}
+
+registry.callback(
+    'gauge', 'chat_upstream_in_flight', 'Outbound calls in progress',
+    lambda: [((client.name,), client.in_flight) for client in UPSTREAM_CLIENTS], ('upstream',)
+)
+registry.callback(
+    'gauge', 'chat_upstream_circuit_open', '1 while the circuit breaker is open or half-open',
+    lambda: [((client.name,), int(client.breaker.state != 'closed')) for client in UPSTREAM_CLIENTS], ('upstream',)
+)
@@ -0,0 +1,178 @@
+import os
+import re
+import threading
+import tempfile
+from concurrent.futures import Future
+
+class DiskImageCache:
+    """On-disk cache of image bytes with a least-recently-used size budget.
+    
+    Image ids are content hashes, so cached files never go stale and only
+    need evicting for space. Hits are plain files, which lets the server
+    hand them to socket.sendfile instead of reading them into memory.
+    """
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.filling = {}  # key -> Future for a download in progress, resolving to the cached path (or None)
+        
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp'):
+                os.unlink(entry.path)  # Left over from an interrupted write
+            elif entry.is_file():
+                self.total_bytes += entry.stat().st_size
+    
+    def path_for(self, key):
+        """Map a cache key to a file path (keys are ids plus a variant suffix)"""
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_.-]', '_', key))
+    
+    def get(self, key):
+        """Return the cached file path for a key, or None on a miss"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)  # Bump the mtime so eviction sees it as recently used
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        
+        with self.lock:
+            self.hits += 1
+        return path
+    
+    def open_writer(self, key):
+        """Open a temp file in the cache directory for a new entry"""
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix='.', suffix='.tmp', delete=False)
+    
+    def commit(self, key, temp_file):
+        """Atomically move a fully written temp file into place"""
+        temp_file.close()
+        size = os.path.getsize(temp_file.name)
+        path = self.path_for(key)
+        with self.lock:
+            # A replaced entry's bytes are no longer on disk
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(temp_file.name, path)
+            self.total_bytes += size - replaced
+            over_budget = self.total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+    
+    def start_fill(self, key):
+        """Claim the download of a missing entry, so concurrent misses for it download it once.
+        
+        Returns (future, True) when the caller should download the entry
+        and then call finish_fill, or (future, False) when it is already
+        cached or another request is downloading it. The future resolves
+        to the cached path, or None if that download failed.
+        """
+        with self.lock:
+            pending = self.filling.get(key)
+            if pending:
+                return pending, False
+            
+            pending = Future()
+            path = self.path_for(key)
+            if os.path.exists(path):  # Cached since the caller's miss
+                pending.set_result(path)
+                return pending, False
+            
+            self.filling[key] = pending
+            return pending, True
+    
+    def finish_fill(self, key):
+        """Release a claimed download, handing its result to the requests waiting for it"""
+        with self.lock:
+            pending = self.filling.pop(key, None)
+        if pending:
+            path = self.path_for(key)
+            pending.set_result(path if os.path.exists(path) else None)
+    
+    def abort(self, temp_file):
+        """Throw away a partially written entry"""
+        temp_file.close()
+        try:
+            os.unlink(temp_file.name)
+        except OSError:
+            pass
+    
+    def put(self, key, data):
+        """Cache a complete bytes object"""
+        temp_file = self.open_writer(key)
+        try:
+            temp_file.write(data)
+        except Exception:
+            self.abort(temp_file)
+            raise
+        self.commit(key, temp_file)
+    
+    def evict(self):
+        """Delete least recently used entries until the cache is back under 90% of its budget"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+        
+        with self.lock:
+            self.total_bytes = total
+    
+    def get_stats(self):
+        """Snapshot of cache size and hit counters"""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+def parse_byte_range(range_header, size):
+    """Parse a single-range 'bytes=' header against a resource size.
+    
+    Returns (start, end) inclusive, None when the header should be ignored
+    (absent, malformed or multi-range), or 'unsatisfiable'.
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    
+    start_text, _, end_text = range_header[len('bytes='):].strip().partition('-')
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return 'unsatisfiable'
+            return max(0, size - length), size - 1
+        
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    
+    if start >= size:
+        return 'unsatisfiable'
+    if start > end:
+        return None
+    return start, min(end, size - 1)
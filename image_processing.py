@@ -0,0 +1,476 @@
+import io
+import os
+import threading
+import warnings
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeoutError, wait as wait_for_futures
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps
+
+try:
+    import resource
+except ImportError:  # Not available on Windows - workers just run without a memory cap
+    resource = None
+
+# Width buckets for responsive variants. The chat list shows images at most
+# 300px wide, so 640 covers 2x displays and 160 doubles as the thumbnail.
+IMAGE_VARIANT_WIDTHS = (160, 320, 640)
+VARIANT_JPEG_QUALITY = 82
+
+# WebP quality presets for served images
+WEBP_QUALITY_PRESETS = {'low': 60, 'medium': 75, 'high': 85}
+
+# Formats accepted from uploads, with the content type they are served as
+UPLOAD_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+EXIF_ORIENTATION_TAG = 0x0112
+
+class ImageValidationError(ValueError):
+    """Raised when an upload is not an image we are willing to process"""
+
+class ImagePoolBusy(Exception):
+    """Raised when the image worker queue is full"""
+
+def has_alpha(image):
+    """Check whether an image carries transparency that JPEG would lose"""
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+def encode_variant(image, keep_alpha):
+    """Encode a resized variant, returning (bytes, content_type)"""
+    output = io.BytesIO()
+    if keep_alpha:
+        image.save(output, format='PNG', optimize=True)
+        return output.getvalue(), 'image/png'
+    
+    image.save(output, format='JPEG', quality=VARIANT_JPEG_QUALITY, optimize=True, progressive=True)
+    return output.getvalue(), 'image/jpeg'
+
+def generate_image_variants(image, widths=IMAGE_VARIANT_WIDTHS):
+    """Build a downscaled copy of an opened image for every width bucket
+    narrower than the original.
+    
+    Returns {width: (bytes, content_type)}. Animated images get no variants,
+    since resizing would drop the animation.
+    """
+    if getattr(image, 'is_animated', False):
+        return {}
+    
+    wanted = sorted((w for w in widths if w < image.width), reverse=True)
+    if not wanted:
+        return {}
+    
+    # Let the JPEG decoder skip detail we are about to throw away (no-op once loaded)
+    largest = wanted[0]
+    image.draft('RGB', (largest, max(1, image.height * largest // image.width)))
+    
+    keep_alpha = has_alpha(image)
+    source = image.convert('RGBA' if keep_alpha else 'RGB')
+    
+    variants = {}
+    # Downscale progressively so each step starts from the next-largest variant
+    for width in wanted:
+        height = max(1, round(source.height * width / source.width))
+        source = source.resize((width, height), Image.LANCZOS)
+        variants[width] = encode_variant(source, keep_alpha)
+    
+    return variants
+
+def strip_metadata(image, image_format):
+    """Re-encode an image upright and without EXIF (GPS, camera serials, ...)"""
+    upright = ImageOps.exif_transpose(image)
+    save_args = {'format': image_format}
+    if image.info.get('icc_profile'):
+        save_args['icc_profile'] = image.info['icc_profile']  # Keep colours right
+    if image_format == 'JPEG':
+        if upright.mode not in ('RGB', 'L', 'CMYK'):
+            upright = upright.convert('RGB')
+        save_args.update(quality=90, optimize=True)
+    elif image_format == 'WEBP':
+        save_args.update(quality=90)
+    elif image_format == 'PNG':
+        save_args.update(optimize=True)
+    
+    output = io.BytesIO()
+    upright.save(output, **save_args)
+    return output.getvalue(), upright
+
+def prepare_upload(image_source, max_pixels):
+    """Validate and normalize an uploaded image, then build its width variants.
+    
+    Runs inside an image worker process. `image_source` is the path of the
+    spooled upload (read here, so the bytes never pass through the request
+    thread) or the upload's bytes. Returns a dict with the normalized bytes,
+    content type, dimensions and variants. The original bytes are kept
+    untouched unless EXIF orientation or metadata has to be removed.
+    """
+    if isinstance(image_source, str):
+        with open(image_source, 'rb') as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = image_source
+    
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image_format = image.format
+            if image_format not in UPLOAD_FORMATS:
+                raise ImageValidationError(f"Unsupported image format: {image_format or 'unknown'}")
+            # Checked against the header, before any pixel data is decoded
+            if image.width * image.height > max_pixels:
+                raise ImageValidationError(f"Image is too large ({image.width}x{image.height} pixels)")
+            image.verify()
+        
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            exif = image.getexif()
+            if not getattr(image, 'is_animated', False) and (exif or 'exif' in image.info):
+                image_bytes, image = strip_metadata(image, image_format)
+            
+            return {
+                'data': image_bytes,
+                'content_type': UPLOAD_FORMATS[image_format],
+                'width': image.width,
+                'height': image.height,
+                'variants': generate_image_variants(image)
+            }
+    except ImageValidationError:
+        raise
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ImageValidationError("Image is too large to process")
+    except MemoryError:
+        raise ImageValidationError("Image needs too much memory to process")
+    except Image.UnidentifiedImageError:
+        raise ImageValidationError("Not a recognised image file")
+    except Exception as e:
+        raise ImageValidationError(f"Not a valid image: {e}")
+
+def pick_variant_width(requested_width, available_widths):
+    """Pick the smallest stored width that still covers the requested width.
+    
+    Returns None when the original should be served instead.
+    """
+    if not requested_width:
+        return None
+    
+    candidates = [w for w in available_widths if w >= requested_width]
+    return min(candidates) if candidates else None
+
+def accepts_webp(accept_header):
+    """Check whether an Accept header allows image/webp (q=0 counts as a refusal)"""
+    for part in accept_header.split(','):
+        media_type, *params = part.strip().split(';')
+        if media_type.strip().lower() != 'image/webp':
+            continue
+        
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+def transcode_to_webp(image_bytes, quality):
+    """Re-encode an image as WebP. Returns None for animated images."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        if getattr(image, 'is_animated', False):
+            return None
+        image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+    
+    output = io.BytesIO()
+    image.save(output, format='WEBP', quality=quality, method=4)
+    return output.getvalue()
+
+def current_address_space():
+    """Virtual memory size of this process in bytes (Linux only, else None)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def init_image_worker(max_pixels, memory_limit_bytes):
+    """Per-process setup for image workers: decompression-bomb guard and memory cap"""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    warnings.simplefilter('error', Image.DecompressionBombWarning)
+    
+    if not memory_limit_bytes or resource is None:
+        return
+    
+    # A forked worker inherits the server's address space, so cap the headroom on top of it
+    baseline = current_address_space()
+    if baseline is None:
+        return
+    try:
+        limit = baseline + memory_limit_bytes
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Could not cap image worker memory: {e}")
+
+def noop():
+    """Trivial job used to start the worker processes"""
+    return None
+
+class ImageWorkerPool:
+    """Process pool for CPU-heavy Pillow work, so decoding and encoding never
+    holds the GIL in request threads.
+    
+    The queue is bounded (submit raises ImagePoolBusy when full) and every
+    job has a timeout. A single stuck process cannot be cancelled, so a pool
+    whose job timed out is retired: new jobs go to a fresh pool while the
+    old one finishes the other jobs it already had, then its workers are
+    stopped. Only the job that timed out fails.
+    """
+    
+    def __init__(self, max_workers=2, max_pending=8, timeout=20, max_pixels=40_000_000, memory_limit_mb=512):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pixels = max_pixels
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.executor = None
+        self.lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected_busy": 0,
+            "timeouts": 0,
+            "restarts": 0
+        }
+    
+    def create_executor(self):
+        """Create the underlying process pool"""
+        # Workers come from a fork server (spawned where there is none), never forked from this
+        # process: pools are rebuilt from request threads, and a fork taken while another thread
+        # holds a lock can deadlock the child. The fork server imports the server module once and
+        # every worker, including those of rebuilt pools, is forked from it.
+        try:
+            context = multiprocessing.get_context('forkserver')
+        except ValueError:
+            context = multiprocessing.get_context('spawn')
+        
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=init_image_worker,
+            initargs=(self.max_pixels, self.memory_limit_bytes)
+        )
+        executor.active = set()  # Futures submitted to this pool and not done yet (guarded by self.lock)
+        executor.retiring = False
+        return executor
+    
+    def get_executor(self):
+        """Return the live process pool, creating it on first use (lock held)"""
+        if self.executor is None:
+            self.executor = self.create_executor()
+        return self.executor
+    
+    def start(self):
+        """Start the workers up front (call before the server spawns threads)"""
+        with self.lock:
+            executor = self.get_executor()
+            for _ in range(self.max_workers):
+                executor.submit(noop)
+    
+    def submit(self, fn, *args):
+        """Queue a job, raising ImagePoolBusy instead of waiting when the queue is full"""
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.stats["rejected_busy"] += 1
+            raise ImagePoolBusy("Image processing queue is full, please try again")
+        
+        try:
+            with self.lock:
+                executor = self.get_executor()
+                future = executor.submit(fn, *args)
+                executor.active.add(future)
+                self.stats["submitted"] += 1
+        except Exception:
+            self.slots.release()
+            raise
+        
+        future.executor = executor
+        future.add_done_callback(lambda done: self.job_done(executor, done))
+        return future
+    
+    def job_done(self, executor, future):
+        self.slots.release()
+        with self.lock:
+            executor.active.discard(future)
+    
+    def result(self, future):
+        """Wait for a job, enforcing the per-job timeout"""
+        try:
+            value = future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            with self.lock:
+                self.stats["timeouts"] += 1
+            self.retire(future.executor, stuck=future)
+            raise TimeoutError(f"Image processing took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            # A worker died, which breaks its whole pool (or a retired pool was stopped before this job ran)
+            with self.lock:
+                self.stats["failed"] += 1
+            self.retire(future.executor)
+            raise RuntimeError("Image processing was interrupted, please try again")
+        except Exception:
+            with self.lock:
+                self.stats["failed"] += 1
+            raise
+        
+        with self.lock:
+            self.stats["completed"] += 1
+        return value
+    
+    def run(self, fn, *args):
+        """Submit a job and wait for its result"""
+        return self.result(self.submit(fn, *args))
+    
+    def retire(self, executor, stuck=None):
+        """Send new jobs to a fresh pool and stop this one's workers once its other jobs are done.
+        
+        `stuck` is the job that timed out; it isn't waited for. The other
+        jobs get up to one job timeout before the workers are stopped.
+        """
+        with self.lock:
+            if executor.retiring:
+                return  # Another thread already retired it
+            executor.retiring = True
+            if self.executor is executor:
+                self.executor = None
+            self.stats["restarts"] += 1
+            others = [future for future in executor.active if future is not stuck]
+        
+        def stop_workers():
+            wait_for_futures(others, timeout=self.timeout)
+            # ProcessPoolExecutor has no way to cancel a running job, so stop its workers directly
+            processes = getattr(executor, '_processes', None) or {}
+            for process in list(processes.values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+            print("♻️ Image worker pool restarted")
+        
+        threading.Thread(target=stop_workers, daemon=True).start()
+    
+    def get_stats(self):
+        """Snapshot of queue and job counters"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["workers"] = self.max_workers
+            stats["timeout_seconds"] = self.timeout
+            stats["max_pixels"] = self.max_pixels
+        return stats
+
+class WebpTranscoder:
+    """Transcodes served images to WebP on the image worker pool and caches the results.
+    
+    Cache entries are keyed per stored variant. An empty entry records that
+    WebP was not smaller than the source, so the original is served instead.
+    """
+    
+    def __init__(self, worker_pool, quality='medium', cache_max_bytes=32 * 1024 * 1024):
+        self.quality = WEBP_QUALITY_PRESETS.get(quality, WEBP_QUALITY_PRESETS['medium'])
+        self.worker_pool = worker_pool
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.cache_max_bytes = cache_max_bytes
+        self.pending = {}  # cache key -> Future for the transcode in progress, shared by every request for it
+        self.lock = threading.Lock()
+        self.stats = {
+            "transcoded": 0,
+            "failed": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "served_webp": 0,
+            "bytes_original": 0,
+            "bytes_sent": 0
+        }
+    
+    def get(self, cache_key, source_size, load_source):
+        """Return WebP bytes for an image, or None when the original should be served.
+        
+        load_source() returns the original bytes and is only called on a cache miss.
+        """
+        with self.lock:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache.move_to_end(cache_key)
+                self.stats["cache_hits"] += 1
+                return self.record_served(source_size, cached)
+            
+            self.stats["cache_misses"] += 1
+            # Share one transcode between concurrent requests for the same variant; only the
+            # first request loads and submits it, and it does so outside the lock
+            pending = self.pending.get(cache_key)
+            first = pending is None
+            if first:
+                pending = self.pending[cache_key] = Future()
+        
+        if first:
+            self.transcode(cache_key, source_size, load_source, pending)
+        
+        try:
+            webp_bytes = pending.result()
+        except Exception:
+            return None
+        
+        with self.lock:
+            return self.record_served(source_size, webp_bytes)
+    
+    def transcode(self, cache_key, source_size, load_source, pending):
+        """Load the source and transcode it on the worker pool, resolving `pending` for every waiting request"""
+        try:
+            future = self.worker_pool.submit(transcode_to_webp, load_source(), self.quality)
+            webp_bytes = self.worker_pool.result(future)
+        except ImagePoolBusy:
+            # Serve the original rather than queue behind uploads (and try again next time)
+            with self.lock:
+                self.pending.pop(cache_key, None)
+            pending.set_result(b'')
+            return
+        except Exception as e:
+            print(f"⚠️ WebP transcode failed for {cache_key}: {e}")
+            with self.lock:
+                self.pending.pop(cache_key, None)
+                self.stats["failed"] += 1
+            pending.set_exception(e)
+            return
+        
+        if not webp_bytes or len(webp_bytes) >= source_size:
+            webp_bytes = b''
+        
+        with self.lock:
+            self.pending.pop(cache_key, None)
+            self.stats["transcoded"] += 1
+            self.store(cache_key, webp_bytes)
+        pending.set_result(webp_bytes)
+    
+    def store(self, cache_key, webp_bytes):
+        """Add an entry to the LRU cache, evicting old entries over the byte budget (lock held)"""
+        self.cache[cache_key] = webp_bytes
+        self.cache_bytes += len(webp_bytes)
+        while self.cache_bytes > self.cache_max_bytes and self.cache:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= len(evicted)
+    
+    def record_served(self, source_size, webp_bytes):
+        """Count the bytes a WebP-capable response saved (lock held)"""
+        self.stats["bytes_original"] += source_size
+        if not webp_bytes:
+            self.stats["bytes_sent"] += source_size
+            return None
+        
+        self.stats["served_webp"] += 1
+        self.stats["bytes_sent"] += len(webp_bytes)
+        return webp_bytes
+    
+    def get_stats(self):
+        """Snapshot of transcoding and byte-savings counters"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["bytes_saved"] = stats["bytes_original"] - stats["bytes_sent"]
+            stats["cache_entries"] = len(self.cache)
+            stats["cache_bytes"] = self.cache_bytes
+            stats["quality"] = self.quality
+        return stats
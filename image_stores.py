@@ -0,0 +1,961 @@
+import os
+import json
+import time
+import base64
+import threading
+import email.utils
+import urllib.parse
+from concurrent.futures import Future
+from datetime import datetime
+from image_cache import parse_byte_range
+from http_clients import pcloud_http, github_http
+
+# Pcloud backend
+PCLOUD_USERNAME = os.environ.get('PCLOUD_USERNAME', '')  # Your pCloud email
+PCLOUD_PASSWORD = os.environ.get('PCLOUD_PASSWORD', '')  # Your pCloud password
+PCLOUD_AUTH_TOKEN = os.environ.get('PCLOUD_AUTH_TOKEN', '')  # Optional: pre-generated token
+PCLOUD_FOLDER_PATH = os.environ.get('PCLOUD_FOLDER_PATH', '/ChatroomImages')  # Folder for images
+PCLOUD_API_URL = os.environ.get('PCLOUD_API_URL', 'https://api.pcloud.com')  # https://eapi.pcloud.com for EU accounts
+PCLOUD_MAPPINGS_FILE = 'pcloud_image_mappings.json'  # Local catalog of what lives in the Pcloud folder
+IMAGE_LINK_TTL = int(os.environ.get('IMAGE_LINK_TTL', 3600))  # Link lifetime assumed when Pcloud sends no expiry
+IMAGE_LINK_REFRESH_MARGIN = 300  # Fetch a new link this many seconds before the cached one expires
+
+# GitHub Gist backend
+GITHUB_GIST_TOKEN = os.environ.get('GITHUB_GIST_TOKEN', '')
+GITHUB_IMAGES_GIST_ID = os.environ.get('GITHUB_IMAGES_GIST_ID', '')
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GITHUB_RAW_URL = os.environ.get('GITHUB_RAW_URL', 'https://gist.githubusercontent.com').rstrip('/')  # Where gist file contents are read from
+IMAGES_MANIFEST_FILE = 'images_manifest.json'  # Metadata for every image; the data lives in one gist file per image
+LEGACY_IMAGES_FILE = 'images.json'  # Old layout with every image inline, migrated on startup
+IMAGE_MIGRATION_BATCH = 20  # Images per PATCH when migrating the legacy layout
+
+# Local filesystem backend
+IMAGE_STORE_DIR = os.environ.get('IMAGE_STORE_DIR', 'image_store')
+IMAGE_STORE_FSYNC = os.environ.get('IMAGE_STORE_FSYNC', 'file')  # none, file (fsync before rename) or full (also the directory)
+IMAGE_STORE_SHARD_DEPTH = 2  # image_store/ab/cd/abcd... - two hex levels keep every directory small
+
+class ImageStream:
+    """An image body ready to relay: status (200, 206 or 416), length and range headers, and chunks"""
+    
+    def __init__(self, status=200, content_length=None, content_range=None):
+        self.status = status
+        self.content_length = content_length
+        self.content_range = content_range
+    
+    def iter_content(self, chunk_size):
+        return iter(())
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BytesImageStream(ImageStream):
+    """Stream over bytes already in memory, applying a Range header locally"""
+    
+    def __init__(self, data, range_header=None):
+        size = len(data)
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range == 'unsatisfiable':
+            super().__init__(416, 0, f"bytes */{size}")
+            data = b''
+        elif byte_range:
+            start, end = byte_range
+            super().__init__(206, end - start + 1, f"bytes {start}-{end}/{size}")
+            data = data[start:end + 1]
+        else:
+            super().__init__(200, size)
+        self.data = data
+    
+    def iter_content(self, chunk_size):
+        view = memoryview(self.data)
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+
+class ResponseImageStream(ImageStream):
+    """Stream relaying a requests response opened with stream=True"""
+    
+    def __init__(self, response):
+        super().__init__(response.status_code, response.headers.get('Content-Length'), response.headers.get('Content-Range'))
+        self.response = response
+    
+    def iter_content(self, chunk_size):
+        return self.response.iter_content(chunk_size)
+    
+    def close(self):
+        self.response.close()
+
+class ImageStore:
+    """Base class for image storage backends.
+    
+    Images are content-addressed (the id is the sha256 of the stored bytes)
+    and may carry width variants. Backends move the bytes and persist the
+    catalog of image metadata; this class keeps that catalog in memory along
+    with the dedupe index and reference counts, which are rebuilt from the
+    chat history on startup rather than persisted.
+    """
+    
+    name = None
+    label = None  # Shown in the chat UI
+    max_upload_size = 10 * 1024 * 1024
+    remote = False  # Bytes live on another host, so serving them through a local disk cache pays off
+    saves_catalog_with_image = False  # write_image persists the catalog in the same call, so it runs under write_lock
+    
+    def __init__(self, delete_unreferenced=False):
+        self.delete_unreferenced = delete_unreferenced
+        self.catalog = {}  # image_id -> metadata entry (never image data)
+        self.source_index = {}  # sha256 of uploaded bytes -> content-addressed image_id
+        self.uploaders = {}  # sha256 of uploaded bytes -> usernames that have sent those bytes
+        self.ref_counts = {}  # image_id -> chat messages pointing at it
+        self.catalog_lock = threading.Lock()  # Guards catalog, source_index, uploaders and ref_counts
+        self.write_lock = threading.Lock()  # Serializes catalog saves (and deletes) so they can't drop each other
+        self.pending_writes = {}  # image_id -> Future of the put already writing it (guarded by write_lock)
+        self.started = False
+    
+    def start(self):
+        """Connect to the backend and load its catalog (once, at startup)"""
+        catalog = self.load_catalog()
+        if catalog is None:
+            return False
+        
+        with self.catalog_lock:
+            for image_id, entry in catalog.items():
+                self.index_entry(image_id, entry)
+            self.started = True
+        print(f"✅ {self.label} image catalog loaded: {len(catalog)} images")
+        return True
+    
+    def index_entry(self, image_id, entry):
+        """Add a catalog entry and its source hashes to the in-memory indexes (caller holds catalog_lock)"""
+        entry.setdefault('filename', entry.get('original_filename', 'image.jpg'))  # Older Pcloud mappings
+        entry.pop('ref_count', None)  # Counts are rebuilt from the chat history instead
+        entry.setdefault('variants', {})
+        self.catalog[image_id] = entry
+        uploader = entry.get('uploaded_by')
+        for source_hash in entry.get('source_hashes', []) + [entry.get('source_sha256')]:
+            if source_hash:
+                self.source_index[source_hash] = image_id
+                if uploader:
+                    self.uploaders.setdefault(source_hash, set()).add(uploader)
+        if uploader:
+            self.uploaders.setdefault(image_id, set()).add(uploader)  # Uploaded bytes that were already normalized
+    
+    def catalog_snapshot(self, **changes):
+        """Copy of the catalog with some entries replaced (None removes one), for backends to persist"""
+        with self.catalog_lock:
+            catalog = dict(self.catalog)
+        for image_id, entry in changes.items():
+            if entry is None:
+                catalog.pop(image_id, None)
+            else:
+                catalog[image_id] = entry
+        return catalog
+    
+    def info(self, image_id):
+        """Metadata for a stored image, or None"""
+        with self.catalog_lock:
+            return self.catalog.get(image_id)
+    
+    def exists(self, image_id):
+        """Whether an image is stored"""
+        with self.catalog_lock:
+            return image_id in self.catalog
+    
+    def find_by_source_hash(self, source_hash):
+        """Find a stored image by the sha256 of the bytes it was uploaded as"""
+        with self.catalog_lock:
+            if source_hash in self.catalog:
+                return source_hash  # Already a content hash
+            return self.source_index.get(source_hash)
+    
+    def find_shareable(self, source_hash, username):
+        """Find a stored image by source hash, but only for a user who has uploaded those bytes.
+        
+        Knowing a hash is no proof of holding the image, so anyone else has
+        to upload the bytes (which still deduplicates) before sharing by hash.
+        """
+        with self.catalog_lock:
+            if username not in self.uploaders.get(source_hash, ()):
+                return None
+            if source_hash in self.catalog:
+                return source_hash
+            return self.source_index.get(source_hash)
+    
+    def put(self, image_id, data, content_type, variants=None, filename='image.jpg', username=None, source_hash=None):
+        """Store an image and its width variants ({width: (bytes, content_type)}) once per id"""
+        entry = {
+            'filename': filename,
+            'uploaded_by': username,
+            'timestamp': datetime.now().isoformat(),
+            'size': len(data),
+            'content_type': content_type,
+            'source_hashes': [source_hash] if source_hash and source_hash != image_id else [],
+            'variants': {}
+        }
+        
+        with self.write_lock:
+            if self.exists(image_id):
+                return True
+            # A concurrent upload of the same content is already writing it
+            pending = self.pending_writes.get(image_id)
+            first = pending is None
+            if first:
+                pending = self.pending_writes[image_id] = Future()
+        if not first:
+            return pending.result()
+        
+        stored = False
+        try:
+            stored = self.write_entry(image_id, data, content_type, variants or {}, entry)
+        finally:
+            with self.write_lock:
+                del self.pending_writes[image_id]
+            pending.set_result(stored)
+        return stored
+    
+    def write_entry(self, image_id, data, content_type, variants, entry):
+        """Write the bytes, then save and index the entry; only the catalog save holds write_lock.
+        
+        Uploading outside the lock keeps a slow backend from queueing every
+        other upload in the process behind it.
+        """
+        try:
+            if self.saves_catalog_with_image:
+                with self.write_lock:
+                    entry = self.write_image(image_id, data, content_type, variants, entry)
+                    if entry:
+                        with self.catalog_lock:
+                            self.index_entry(image_id, entry)
+                return bool(entry)
+            
+            entry = self.write_image(image_id, data, content_type, variants, entry)
+            if not entry:
+                return False
+            with self.write_lock:
+                self.save_catalog(self.catalog_snapshot(**{image_id: entry}))
+                with self.catalog_lock:
+                    self.index_entry(image_id, entry)
+            return True
+        except Exception as e:
+            print(f"❌ {self.label} image write error: {e}")
+            return False
+    
+    def delete(self, image_id):
+        """Remove an image and its variants"""
+        with self.write_lock:
+            entry = self.info(image_id)
+            if not entry:
+                return False
+            
+            try:
+                if not self.remove_image(image_id, entry):
+                    return False
+            except Exception as e:
+                print(f"❌ {self.label} image delete error: {e}")
+                return False
+            
+            with self.catalog_lock:
+                self.catalog.pop(image_id, None)
+                self.ref_counts.pop(image_id, None)
+                for source_hash in [h for h, i in self.source_index.items() if i == image_id]:
+                    del self.source_index[source_hash]
+                    self.uploaders.pop(source_hash, None)
+                self.uploaders.pop(image_id, None)
+        print(f"🗑️ Deleted unreferenced image from {self.label}: {image_id}")
+        return True
+    
+    def add_reference(self, image_id, source_hash=None, uploaded_by=None):
+        """Count one more chat message pointing at an image, noting who sent its bytes if it was an upload"""
+        with self.catalog_lock:
+            if image_id not in self.catalog:
+                return False
+            self.ref_counts[image_id] = self.ref_counts.get(image_id, 0) + 1
+            if source_hash:
+                self.source_index.setdefault(source_hash, image_id)
+                if uploaded_by:
+                    self.uploaders.setdefault(source_hash, set()).add(uploaded_by)
+            return True
+    
+    def release_reference(self, image_id):
+        """Drop one reference to an image, deleting it once nothing points at it (if enabled)"""
+        with self.catalog_lock:
+            if image_id not in self.catalog:
+                return
+            self.ref_counts[image_id] = max(0, self.ref_counts.get(image_id, 0) - 1)
+            unreferenced = self.delete_unreferenced and self.ref_counts[image_id] == 0
+        
+        if unreferenced:
+            self.delete(image_id)
+    
+    def blob_info(self, image_id, width=None):
+        """Catalog entry for the stored file behind an image or one of its variants"""
+        entry = self.info(image_id)
+        if entry and width:
+            return entry['variants'].get(str(width))
+        return entry
+    
+    def get_stats(self):
+        """Snapshot of what the store holds"""
+        with self.catalog_lock:
+            return {
+                "backend": self.name,
+                "started": self.started,
+                "images": len(self.catalog),
+                "referenced_images": sum(1 for count in self.ref_counts.values() if count)
+            }
+    
+    # Backend interface
+    
+    def load_catalog(self):
+        """Read the persisted catalog, or return None if the backend is unreachable"""
+        return {}
+    
+    def write_image(self, image_id, data, content_type, variants, entry):
+        """Write an image and its variants; return the stored entry or None"""
+        raise NotImplementedError
+    
+    def save_catalog(self, catalog):
+        """Persist the whole catalog (called with write_lock held)"""
+        pass
+    
+    def remove_image(self, image_id, entry):
+        """Delete an image's files and its catalog entry from the backend"""
+        raise NotImplementedError
+    
+    def get(self, image_id, width=None):
+        """Read a whole image (or variant) into memory"""
+        raise NotImplementedError
+    
+    def stream(self, image_id, width=None, range_header=None):
+        """Open an image (or variant) for relaying in chunks, honouring a Range header"""
+        data = self.get(image_id, width)
+        return BytesImageStream(data, range_header) if data is not None else None
+    
+    def link(self, image_id, width=None):
+        """A (url, expires_at) clients can fetch the bytes from directly, if the backend has one"""
+        return None
+    
+    def local_path(self, image_id, width=None):
+        """Path of a file holding the image (or variant) on this host, for zero-copy serving"""
+        return None
+    
+    def private_paths(self):
+        """Files and directories on this host holding the store's data, which must never be served as static files"""
+        return ()
+
+class MemoryImageStore(ImageStore):
+    """Keeps images in process memory - for tests and benchmarks, nothing survives a restart"""
+    
+    name = 'memory'
+    label = 'Memory'
+    
+    def __init__(self, delete_unreferenced=False):
+        super().__init__(delete_unreferenced)
+        self.blobs = {}  # (image_id, width) -> bytes
+    
+    def write_image(self, image_id, data, content_type, variants, entry):
+        self.blobs[(image_id, None)] = bytes(data)
+        for width, (variant_bytes, variant_type) in variants.items():
+            self.blobs[(image_id, width)] = variant_bytes
+            entry['variants'][str(width)] = {'content_type': variant_type, 'size': len(variant_bytes)}
+        return entry
+    
+    def remove_image(self, image_id, entry):
+        for key in [key for key in self.blobs if key[0] == image_id]:
+            del self.blobs[key]
+        return True
+    
+    def get(self, image_id, width=None):
+        return self.blobs.get((image_id, width))
+
+class LocalImageStore(ImageStore):
+    """Stores images as files under a local directory, sharded by the leading hex digits of the id.
+    
+    Files are written under a temp name and renamed into place, with an
+    fsync policy trading durability for upload latency. The catalog is a
+    JSON file at the top of the directory.
+    """
+    
+    name = 'local'
+    label = 'Local Disk'
+    
+    def __init__(self, delete_unreferenced=False, directory=IMAGE_STORE_DIR, fsync=IMAGE_STORE_FSYNC):
+        super().__init__(delete_unreferenced)
+        if fsync not in ('none', 'file', 'full'):
+            raise ValueError(f"Unknown IMAGE_STORE_FSYNC '{fsync}', expected none, file or full")
+        self.directory = directory
+        self.fsync = fsync
+        self.catalog_file = os.path.join(directory, 'catalog.json')
+    
+    def path_for(self, image_id, width=None):
+        shards = [image_id[i * 2:i * 2 + 2] for i in range(IMAGE_STORE_SHARD_DEPTH)]
+        return os.path.join(self.directory, *shards, f"{image_id}_w{width}" if width else image_id)
+    
+    def fsync_directory(self, directory):
+        """Persist a directory entry (the rename itself) - POSIX only"""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def write_file(self, path, data):
+        """Write a file under a temp name and rename it into place, so readers never see half of it"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+                if self.fsync != 'none':
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        
+        if self.fsync == 'full':
+            self.fsync_directory(directory)
+    
+    def save_catalog(self, catalog):
+        self.write_file(self.catalog_file, json.dumps(catalog, indent=2).encode('utf-8'))
+    
+    def load_catalog(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self.catalog_file):
+            return {}
+        with open(self.catalog_file, 'r') as f:
+            catalog = json.load(f)
+        
+        # Files from the old flat layout move into their shard directories
+        for image_id, entry in catalog.items():
+            for width in [None] + [int(w) for w in entry.get('variants', {})]:
+                flat_path = os.path.join(self.directory, f"{image_id}_w{width}" if width else image_id)
+                if os.path.isfile(flat_path):
+                    os.makedirs(os.path.dirname(self.path_for(image_id, width)), exist_ok=True)
+                    os.replace(flat_path, self.path_for(image_id, width))
+        return catalog
+    
+    def write_image(self, image_id, data, content_type, variants, entry):
+        self.write_file(self.path_for(image_id), data)
+        for width, (variant_bytes, variant_type) in variants.items():
+            self.write_file(self.path_for(image_id, width), variant_bytes)
+            entry['variants'][str(width)] = {'content_type': variant_type, 'size': len(variant_bytes)}
+        return entry
+    
+    def remove_image(self, image_id, entry):
+        self.save_catalog(self.catalog_snapshot(**{image_id: None}))
+        for width in [None] + [int(w) for w in entry['variants']]:
+            try:
+                os.unlink(self.path_for(image_id, width))
+            except FileNotFoundError:
+                pass
+        return True
+    
+    def get(self, image_id, width=None):
+        try:
+            with open(self.path_for(image_id, width), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def local_path(self, image_id, width=None):
+        return self.path_for(image_id, width)
+    
+    def private_paths(self):
+        return (self.directory,)
+    
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["fsync"] = self.fsync
+        return stats
+
+class PcloudImageStore(ImageStore):
+    """Stores images in a Pcloud folder, with the catalog in a local mappings file"""
+    
+    name = 'pcloud'
+    label = 'Pcloud'
+    remote = True
+    
+    def __init__(self, delete_unreferenced=False):
+        super().__init__(delete_unreferenced)
+        self.auth_token = None
+        self.base_url = PCLOUD_API_URL.rstrip('/')
+        self.download_scheme = urllib.parse.urlparse(self.base_url).scheme or 'https'
+        self.mappings_file = PCLOUD_MAPPINGS_FILE
+        self.download_links = {}  # (image_id, width) -> (download_url, expires_at)
+        self.download_links_lock = threading.Lock()
+        self.link_stats = {"hits": 0, "misses": 0}
+        self.authenticate()
+    
+    def authenticate(self):
+        """Authenticate with Pcloud and get auth token"""
+        if PCLOUD_AUTH_TOKEN:
+            self.auth_token = PCLOUD_AUTH_TOKEN
+            print("✅ Using provided Pcloud auth token")
+            return True
+        
+        if not PCLOUD_USERNAME or not PCLOUD_PASSWORD:
+            print("❌ Pcloud credentials not configured")
+            return False
+        
+        try:
+            # Get auth token using username/password
+            auth_url = f"{self.base_url}/userinfo"
+            params = {
+                'username': PCLOUD_USERNAME,
+                'password': PCLOUD_PASSWORD,
+                'getauth': '1'
+            }
+            
+            response = pcloud_http.get(auth_url, params=params, timeout=10)
+            data = response.json()
+            
+            if data.get('result') == 0:  # Success
+                self.auth_token = data.get('auth')
+                print(f"✅ Pcloud authentication successful")
+                return True
+            else:
+                print(f"❌ Pcloud auth failed: {data.get('error', 'Unknown error')}")
+                return False
+        
+        except Exception as e:
+            print(f"❌ Pcloud auth error: {e}")
+            return False
+    
+    def create_folder_if_not_exists(self):
+        """Create the images folder if it doesn't exist"""
+        if not self.auth_token:
+            return False
+        
+        try:
+            # Check if folder exists
+            list_url = f"{self.base_url}/listfolder"
+            params = {
+                'auth': self.auth_token,
+                'path': PCLOUD_FOLDER_PATH
+            }
+            
+            response = pcloud_http.get(list_url, params=params, timeout=10)
+            data = response.json()
+            
+            if data.get('result') == 0:  # Folder exists
+                return True
+            
+            # Create folder
+            create_url = f"{self.base_url}/createfolder"
+            params = {
+                'auth': self.auth_token,
+                'path': PCLOUD_FOLDER_PATH
+            }
+            
+            response = pcloud_http.get(create_url, params=params, timeout=10, idempotent=False)
+            data = response.json()
+            
+            if data.get('result') == 0:
+                print(f"✅ Created Pcloud folder: {PCLOUD_FOLDER_PATH}")
+                return True
+            else:
+                print(f"❌ Failed to create Pcloud folder: {data.get('error')}")
+                return False
+        
+        except Exception as e:
+            print(f"❌ Pcloud folder creation error: {e}")
+            return False
+    
+    def load_catalog(self):
+        if self.auth_token and self.create_folder_if_not_exists():
+            print(f"✅ Pcloud folder ready: {PCLOUD_FOLDER_PATH}")
+        else:
+            print("⚠️ Pcloud not reachable - image uploads will not work")
+        
+        # The mappings file is local, so it loads even when Pcloud is down
+        if not os.path.exists(self.mappings_file):
+            return {}
+        with open(self.mappings_file, 'r') as f:
+            return json.load(f)
+    
+    def save_catalog(self, catalog):
+        """Write the mappings file atomically"""
+        temp_file = f"{self.mappings_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(catalog, f, indent=2)
+        os.replace(temp_file, self.mappings_file)
+    
+    def private_paths(self):
+        return (self.mappings_file, f"{self.mappings_file}.tmp")
+    
+    def upload_file(self, pcloud_filename, file_data, content_type):
+        """Upload a single file to the images folder and return its Pcloud file ID"""
+        upload_url = f"{self.base_url}/uploadfile"
+        
+        files = {
+            'file': (pcloud_filename, file_data, content_type)
+        }
+        
+        data = {
+            'auth': self.auth_token,
+            'path': PCLOUD_FOLDER_PATH,
+            'filename': pcloud_filename,
+            'renameifexists': '1'
+        }
+        
+        response = pcloud_http.post(upload_url, files=files, data=data, timeout=30)
+        result = response.json()
+        
+        if result.get('result') == 0:  # Success
+            file_info = result.get('metadata', [{}])[0]
+            return file_info.get('fileid')
+        
+        print(f"❌ Pcloud upload failed: {result.get('error')}")
+        return None
+    
+    def write_image(self, image_id, data, content_type, variants, entry):
+        if not self.auth_token:
+            print("❌ No Pcloud auth token available")
+            return None
+        
+        # Files are named after the image id (the detected format wins over the client's name)
+        file_extension = content_type.split('/')[-1].replace('jpeg', 'jpg')
+        pcloud_filename = f"{image_id}.{file_extension}"
+        
+        file_id = self.upload_file(pcloud_filename, data, content_type)
+        if not file_id:
+            return None
+        
+        print(f"✅ Image uploaded to Pcloud: {pcloud_filename} (ID: {file_id})")
+        entry['pcloud_filename'] = pcloud_filename
+        entry['file_id'] = file_id
+        
+        # Variants are best effort - the original is always there to fall back on
+        for width, (variant_bytes, variant_type) in variants.items():
+            variant_extension = 'png' if variant_type == 'image/png' else 'jpg'
+            variant_filename = f"{image_id}_w{width}.{variant_extension}"
+            try:
+                variant_file_id = self.upload_file(variant_filename, variant_bytes, variant_type)
+            except Exception as e:
+                print(f"⚠️ Pcloud variant upload error ({width}px): {e}")
+                continue
+            
+            if variant_file_id:
+                entry['variants'][str(width)] = {
+                    'file_id': variant_file_id,
+                    'content_type': variant_type,
+                    'size': len(variant_bytes)
+                }
+        return entry
+    
+    def delete_file(self, file_id):
+        """Delete a single file from Pcloud"""
+        params = {
+            'auth': self.auth_token,
+            'fileid': file_id
+        }
+        response = pcloud_http.get(f"{self.base_url}/deletefile", params=params, timeout=10)
+        return response.json().get('result') == 0
+    
+    def remove_image(self, image_id, entry):
+        self.save_catalog(self.catalog_snapshot(**{image_id: None}))
+        file_ids = [entry.get('file_id')] + [v.get('file_id') for v in entry['variants'].values()]
+        for file_id in file_ids:
+            if file_id:
+                self.delete_file(file_id)
+        self.forget_download_links(image_id)
+        return True
+    
+    def link(self, image_id, width=None):
+        """Return (download_url, expires_at), reusing a cached link until shortly before it expires"""
+        key = (image_id, width)
+        with self.download_links_lock:
+            link = self.download_links.get(key)
+            if link and link[1] - IMAGE_LINK_REFRESH_MARGIN > time.time():
+                self.link_stats["hits"] += 1
+                return link
+            self.link_stats["misses"] += 1
+        
+        link = self.fetch_download_link(image_id, width)
+        if link:
+            with self.download_links_lock:
+                if len(self.download_links) > 1000:
+                    now = time.time()
+                    self.download_links = {k: v for k, v in self.download_links.items() if v[1] > now}
+                self.download_links[key] = link
+        return link
+    
+    def forget_download_links(self, image_id):
+        """Drop cached links for an image (deleted, or Pcloud stopped honouring them)"""
+        with self.download_links_lock:
+            for key in [key for key in self.download_links if key[0] == image_id]:
+                del self.download_links[key]
+    
+    def fetch_download_link(self, image_id, width=None):
+        """Ask Pcloud for a fresh download link, returning (download_url, expires_at)"""
+        if not self.auth_token:
+            return None
+        
+        try:
+            blob = self.blob_info(image_id, width)
+            if not blob or not blob.get('file_id'):
+                return None
+            
+            # Get download link
+            link_url = f"{self.base_url}/getfilelink"
+            params = {
+                'auth': self.auth_token,
+                'fileid': blob['file_id']
+            }
+            
+            response = pcloud_http.get(link_url, params=params, timeout=10)
+            data = response.json()
+            
+            if data.get('result') == 0:
+                # Return the download URL
+                hosts = data.get('hosts', [])
+                path = data.get('path', '')
+                
+                if hosts and path:
+                    download_url = f"{self.download_scheme}://{hosts[0]}{path}"
+                    try:
+                        expires_at = email.utils.parsedate_to_datetime(data['expires']).timestamp()
+                    except (KeyError, TypeError, ValueError):
+                        expires_at = time.time() + IMAGE_LINK_TTL
+                    return download_url, expires_at
+            
+            return None
+        
+        except Exception as e:
+            print(f"❌ Error getting Pcloud download link: {e}")
+            return None
+    
+    def open_download(self, image_id, width=None, range_header=None):
+        """Start a streaming download; a Range header is forwarded so partial requests stay partial upstream"""
+        link = self.link(image_id, width)
+        if not link:
+            return None
+        
+        headers = {'Range': range_header} if range_header else {}
+        response = pcloud_http.get(link[0], headers=headers, stream=True, timeout=15)
+        if response.status_code in (403, 404, 410):
+            # The cached link was revoked early, retry once with a fresh one
+            response.close()
+            self.forget_download_links(image_id)
+            link = self.link(image_id, width)
+            if not link:
+                return None
+            response = pcloud_http.get(link[0], headers=headers, stream=True, timeout=15)
+        
+        if response.status_code in (200, 206, 416):
+            return response
+        
+        response.close()
+        return None
+    
+    def get(self, image_id, width=None):
+        try:
+            response = self.open_download(image_id, width)
+            if response is None:
+                return None
+            with response:
+                return response.content if response.status_code == 200 else None
+        except Exception as e:
+            print(f"❌ Error downloading from Pcloud: {e}")
+            return None
+    
+    def stream(self, image_id, width=None, range_header=None):
+        try:
+            response = self.open_download(image_id, width, range_header)
+            return ResponseImageStream(response) if response is not None else None
+        except Exception as e:
+            print(f"❌ Error streaming from Pcloud: {e}")
+            return None
+    
+    def get_stats(self):
+        stats = super().get_stats()
+        with self.download_links_lock:
+            stats["authenticated"] = bool(self.auth_token)
+            stats["folder_path"] = PCLOUD_FOLDER_PATH
+            stats["download_links"] = dict(self.link_stats, cached_links=len(self.download_links))
+        return stats
+
+class GistImageStore(ImageStore):
+    """Stores images in a GitHub Gist: one base64 file per image or variant plus a small manifest"""
+    
+    name = 'gist'
+    label = 'GitHub Gist'
+    max_upload_size = 5 * 1024 * 1024  # Gist files are text, so images grow by a third as base64
+    remote = True
+    saves_catalog_with_image = True  # The manifest goes out in the same PATCH as the image files
+    
+    def __init__(self, delete_unreferenced=False):
+        super().__init__(delete_unreferenced)
+        self.raw_url = None  # {GITHUB_RAW_URL}/<owner>/<gist id>/raw, resolved on first use
+    
+    def api_headers(self):
+        return {
+            'Authorization': f'token {GITHUB_GIST_TOKEN}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+    
+    def gist_filename(self, image_id, width=None):
+        """Name of the gist file holding one image or width variant (base64 text)"""
+        return f"{image_id}_w{width}.b64" if width else f"{image_id}.b64"
+    
+    def patch_files(self, files, timeout=30):
+        """Send one PATCH touching only the given gist files (None deletes a file)"""
+        response = github_http.patch(
+            f'{GITHUB_API_URL}/gists/{GITHUB_IMAGES_GIST_ID}',
+            headers=self.api_headers(),
+            json={"files": files},
+            timeout=timeout
+        )
+        return response.status_code == 200
+    
+    def get_gist_head(self):
+        """Find the images gist's owner and latest revision, returning (raw_url, version).
+        
+        Reading the manifest at a fixed revision sidesteps the CDN caching of
+        the 'latest' raw URL right after a write.
+        """
+        response = github_http.get(
+            f'{GITHUB_API_URL}/gists/{GITHUB_IMAGES_GIST_ID}/commits',
+            headers=self.api_headers(),
+            params={'per_page': 1},
+            timeout=10
+        )
+        
+        if response.status_code != 200 or not response.json():
+            return None, None
+        
+        latest = response.json()[0]
+        self.raw_url = f"{GITHUB_RAW_URL}/{latest['user']['login']}/{GITHUB_IMAGES_GIST_ID}/raw"
+        return self.raw_url, latest['version']
+    
+    def load_catalog(self):
+        """Load the manifest, migrating a legacy images.json if that is all there is"""
+        if not GITHUB_GIST_TOKEN or not GITHUB_IMAGES_GIST_ID:
+            print("❌ Images gist not configured")
+            return None
+        
+        try:
+            raw_url, version = self.get_gist_head()
+            if not raw_url:
+                return None
+            
+            response = github_http.get(f'{raw_url}/{version}/{IMAGES_MANIFEST_FILE}', timeout=15)
+            if response.status_code == 200:
+                return response.json()
+            
+            legacy_response = github_http.get(f'{raw_url}/{version}/{LEGACY_IMAGES_FILE}', timeout=120)
+            if legacy_response.status_code == 200:
+                return self.migrate_legacy_images(legacy_response.json().get("images", {}))
+            return {}
+        
+        except Exception as e:
+            print(f"❌ Image manifest load error: {e}")
+            return None
+    
+    def migrate_legacy_images(self, legacy_images):
+        """Split the old single-file images.json into per-image files plus a manifest.
+        
+        Image files go up in batches; the manifest is written and images.json
+        removed in one final PATCH, so an interrupted migration just reruns.
+        """
+        print(f"🔄 Migrating {len(legacy_images)} images to per-image gist files...")
+        manifest = {}
+        items = list(legacy_images.items())
+        for start in range(0, len(items), IMAGE_MIGRATION_BATCH):
+            files = {}
+            for image_id, legacy_entry in items[start:start + IMAGE_MIGRATION_BATCH]:
+                entry = {key: value for key, value in legacy_entry.items() if key not in ("data", "variants")}
+                entry["variants"] = {}
+                files[self.gist_filename(image_id)] = {"content": legacy_entry["data"]}
+                for width, variant in legacy_entry.get("variants", {}).items():
+                    files[self.gist_filename(image_id, width)] = {"content": variant["data"]}
+                    entry["variants"][width] = {"content_type": variant.get("content_type"), "size": len(variant["data"])}
+                manifest[image_id] = entry
+            
+            if not self.patch_files(files, timeout=60):
+                raise RuntimeError("Image migration PATCH failed")
+        
+        if not self.patch_files({
+            IMAGES_MANIFEST_FILE: {"content": json.dumps(manifest, indent=2)},
+            LEGACY_IMAGES_FILE: None
+        }):
+            raise RuntimeError("Image manifest write failed")
+        
+        print(f"✅ Migrated {len(manifest)} images to per-image gist files")
+        return manifest
+    
+    def write_image(self, image_id, data, content_type, variants, entry):
+        # The manifest is rewritten on upload, so never write one that was not loaded
+        if not self.started and not self.start():
+            print("❌ Image backup skipped: image manifest could not be loaded")
+            return None
+        
+        # Only the new image's files and the small manifest are sent - existing files are untouched
+        files = {self.gist_filename(image_id): {"content": base64.b64encode(data).decode('ascii')}}
+        for width, (variant_bytes, variant_type) in variants.items():
+            files[self.gist_filename(image_id, width)] = {"content": base64.b64encode(variant_bytes).decode('ascii')}
+            entry['variants'][str(width)] = {'content_type': variant_type, 'size': len(variant_bytes)}
+        
+        manifest = self.catalog_snapshot(**{image_id: entry})
+        files[IMAGES_MANIFEST_FILE] = {"content": json.dumps(manifest, indent=2)}
+        
+        if not self.patch_files(files):
+            print("❌ Image backup to GitHub Gist failed")
+            return None
+        
+        print(f"✅ Image backed up to GitHub Gist: {entry['filename']}")
+        return entry
+    
+    def remove_image(self, image_id, entry):
+        files = {self.gist_filename(image_id): None}
+        for width in entry['variants']:
+            files[self.gist_filename(image_id, width)] = None
+        files[IMAGES_MANIFEST_FILE] = {"content": json.dumps(self.catalog_snapshot(**{image_id: None}), indent=2)}
+        return self.patch_files(files)
+    
+    def get(self, image_id, width=None):
+        if not GITHUB_GIST_TOKEN or not GITHUB_IMAGES_GIST_ID:
+            return None
+        
+        try:
+            raw_url = self.raw_url or self.get_gist_head()[0]
+            if not raw_url:
+                return None
+            
+            response = github_http.get(f'{raw_url}/{self.gist_filename(image_id, width)}', timeout=15)
+            if response.status_code == 200:
+                return base64.b64decode(response.content)
+            return None
+        
+        except Exception as e:
+            print(f"❌ Image retrieval error: {e}")
+            return None
+    
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["gist_configured"] = bool(GITHUB_GIST_TOKEN and GITHUB_IMAGES_GIST_ID)
+        return stats
+
+IMAGE_STORES = {
+    store.name: store
+    for store in (PcloudImageStore, GistImageStore, LocalImageStore, MemoryImageStore)
+}
+
+def create_image_store(name, delete_unreferenced=False):
+    """Build the image store selected by name (pcloud, gist, local or memory)"""
+    if name not in IMAGE_STORES:
+        raise ValueError(f"Unknown image store '{name}', expected one of: {', '.join(IMAGE_STORES)}")
+    return IMAGE_STORES[name](delete_unreferenced=delete_unreferenced)
@@ -0,0 +1,57 @@
+import json
+from wire_formats import INTERNAL_MESSAGE_FIELDS
+
+try:
+    import orjson
+except ImportError:  # Optional - the stdlib encoder produces the same compact JSON, just slower
+    orjson = None
+
+JSON_ENCODER = 'orjson' if orjson else 'json'
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes, through orjson when it is installed"""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+class MessageFragments:
+    """Compact JSON for each chat message (ChatMessage), encoded once and spliced into every poll.
+    
+    Internal fields (the sender's ip) are left out. Message ids can be
+    renumbered when a backup is restored, so besides the finished
+    fragment each entry keeps the JSON of every field but the id; a
+    renumbered message only has its new id spliced in front of that.
+    Entries keep their message alive, so the id() they are keyed by can't
+    be reused while cached. Callers hold chatroom_lock.
+    """
+    
+    def __init__(self):
+        self.fragments = {}  # id(message) -> [message, encoded id, fragment, JSON of the fields after 'id']
+    
+    def add(self, message):
+        """Encode a message as it enters the buffer"""
+        fields = {key: value for key, value in message.to_dict().items() if key != 'id' and key not in INTERNAL_MESSAGE_FIELDS}
+        rest = dumps(fields)[1:]
+        entry = [message, None, None, b',' + rest if rest != b'}' else rest]
+        self.fragments[id(message)] = entry
+        return entry
+    
+    def get(self, message):
+        """The message's JSON (messages restored from a backup are encoded on first use)"""
+        entry = self.fragments.get(id(message)) or self.add(message)
+        if entry[1] != message.id:
+            entry[1] = message.id
+            entry[2] = b'{"id":' + str(message.id).encode() + entry[3]
+        return entry[2]
+    
+    def encode_list(self, messages):
+        """A JSON array of messages, from their cached fragments"""
+        return b'[' + b','.join([self.get(message) for message in messages]) + b']'
+    
+    def discard(self, messages):
+        """Forget the fragments of messages that left the buffer"""
+        for message in messages:
+            self.fragments.pop(id(message), None)
+    
+    def clear(self):
+        self.fragments.clear()
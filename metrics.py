@@ -0,0 +1,189 @@
+import time
+import bisect
+import threading
+
+# Latency buckets in seconds, from a cached poll to a slow upstream call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Lock waits and holds are mostly microseconds; the top buckets catch contention
+LOCK_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Counter:
+    """A monotonically increasing count per label set"""
+    
+    kind = 'counter'
+    
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> count
+        self.lock = threading.Lock()
+    
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+    
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [(self.name, format_labels(self.labels, values), value) for values, value in sorted(items)]
+
+class Gauge(Counter):
+    """A value per label set that goes up and down"""
+    
+    kind = 'gauge'
+    
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+    
+    def set(self, *label_values, value):
+        with self.lock:
+            self.values[label_values] = value
+
+class Histogram:
+    """Observations counted into cumulative buckets per label set, with their sum"""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self.lock = threading.Lock()
+    
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+    
+    def samples(self):
+        with self.lock:
+            items = [(values, list(counts), total) for values, (counts, total) in self.values.items()]
+        
+        samples = []
+        for values, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = format_labels(self.labels + ('le',), values + (format_value(float(bound)),))
+                samples.append((f'{self.name}_bucket', labels, cumulative))
+            labels = format_labels(self.labels, values)
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+class CallbackMetric:
+    """A gauge or counter read from existing state when scraped, so it costs nothing in between"""
+    
+    def __init__(self, kind, name, description, labels, read):
+        self.kind = kind
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.read = read  # () -> [(label values, value)]
+    
+    def samples(self):
+        try:
+            items = self.read()
+        except Exception as e:
+            print(f"⚠️ Metric {self.name} could not be read: {e}")
+            return []
+        return [(self.name, format_labels(self.labels, values), value) for values, value in items]
+
+class MetricsRegistry:
+    """The metrics exposed on /metrics, rendered in the Prometheus text format"""
+    
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+    
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+    
+    def gauge(self, name, description, labels=()):
+        return self.register(Gauge(name, description, labels))
+    
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+    
+    def callback(self, kind, name, description, read, labels=()):
+        return self.register(CallbackMetric(kind, name, description, labels, read))
+    
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+registry = MetricsRegistry()
+
+lock_wait_seconds = registry.histogram(
+    'chat_lock_wait_seconds', 'Time spent waiting to acquire a shared lock', ('lock',), LOCK_BUCKETS
+)
+lock_hold_seconds = registry.histogram(
+    'chat_lock_hold_seconds', 'Time a shared lock was held', ('lock',), LOCK_BUCKETS
+)
+
+class TimedLock:
+    """A threading.Lock that records how long callers wait for it and hold it"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.acquired_at = 0.0  # Only written by the holder
+    
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if acquired:
+            self.acquired_at = time.perf_counter()
+            lock_wait_seconds.observe(self.acquired_at - started, self.name)
+        return acquired
+    
+    def release(self):
+        held = time.perf_counter() - self.acquired_at
+        self.lock.release()
+        lock_hold_seconds.observe(held, self.name)
+    
+    def locked(self):
+        return self.lock.locked()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,93 @@
+import html
+import json
+import zlib
+import struct
+import hashlib
+from response_encoding import CompressedVariants, SUPPORTED_ENCODINGS
+
+PAGE_GZIP_LEVEL = 9  # Pages are compressed once at startup, so the slow setting costs nothing per request
+
+def slot_marker(name):
+    """Placeholder rendered into a template where a per-request value goes"""
+    return f"\x00slot:{name}\x00"
+
+def deflate_segment(data, level=PAGE_GZIP_LEVEL):
+    """Raw deflate blocks for one segment, ending on a full flush.
+    
+    A full flush byte-aligns the output and resets the compressor's
+    history, so segments compressed this way can be concatenated with
+    each other (and with per-request segments) into one valid stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff'  # No name or mtime, so output is reproducible
+DEFLATE_END = zlib.compressobj(9, zlib.DEFLATED, -15).flush()  # An empty final block
+
+class PageTemplate:
+    """A page rendered once at startup into UTF-8 byte segments around its slots.
+    
+    Serving a request only splices the escaped slot values between the
+    pre-encoded segments; the gzip body is spliced the same way from
+    segments deflated ahead of time. Pages without slots are plain static
+    bodies and also get a brotli copy when brotli is installed.
+    """
+    
+    def __init__(self, page, slots=()):
+        self.slots = []
+        self.segments = []
+        remaining = page
+        while True:
+            positions = [(remaining.find(slot_marker(name)), name) for name in slots]
+            positions = [(index, name) for index, name in positions if index >= 0]
+            if not positions:
+                break
+            index, name = min(positions)
+            self.segments.append(remaining[:index].encode('utf-8'))
+            self.slots.append(name)
+            remaining = remaining[index + len(slot_marker(name)):]
+        self.segments.append(remaining.encode('utf-8'))
+        
+        self.deflated_segments = [deflate_segment(segment) for segment in self.segments]
+        self.version = hashlib.sha256(b'\x00'.join(self.segments)).hexdigest()[:16]
+        self.static_variants = CompressedVariants(self.segments[0], 'text/html') if not self.slots else None
+        self.encodings = SUPPORTED_ENCODINGS if not self.slots else ('gzip',)
+        if self.static_variants:
+            for encoding in self.encodings:
+                self.static_variants.get(encoding)  # Compress now rather than on the first request
+    
+    def render(self, encoding=None, **values):
+        """The page as bytes in an encoding from self.encodings (None for identity), with escaped slot values spliced in"""
+        if self.static_variants:
+            return self.static_variants.get(encoding)
+        if encoding == 'gzip':
+            return self.render_gzip(**values)
+        
+        parts = [self.segments[0]]
+        for name, segment in zip(self.slots, self.segments[1:]):
+            parts.append(values[name].encode('utf-8'))
+            parts.append(segment)
+        return b''.join(parts)
+    
+    def render_gzip(self, **values):
+        """The page as a gzip body, without compressing the static segments again"""
+        parts = [GZIP_HEADER, self.deflated_segments[0]]
+        crc = zlib.crc32(self.segments[0])
+        size = len(self.segments[0])
+        for name, segment, deflated in zip(self.slots, self.segments[1:], self.deflated_segments[1:]):
+            value = values[name].encode('utf-8')
+            parts.append(deflate_segment(value))
+            parts.append(deflated)
+            crc = zlib.crc32(segment, zlib.crc32(value, crc))
+            size += len(value) + len(segment)
+        parts.append(DEFLATE_END)
+        parts.append(struct.pack('<II', crc, size & 0xffffffff))
+        return b''.join(parts)
+
+def escape_html(value):
+    """Escape text for an HTML element body or attribute"""
+    return html.escape(value, quote=True)
+
+def escape_js_string(value):
+    """Encode text as a JS string literal that is also safe inside a <script> block"""
+    return json.dumps(value).replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
@@ -0,0 +1,93 @@
+import os
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # Optional - without it responses are gzipped only
+    brotli = None
+
+# Bodies smaller than this go out as-is; compression would barely pay for its own framing
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+
+# Levels per kind of content: bodies compressed once can afford the slow settings,
+# bodies compressed on every response (JSON) get fast ones
+COMPRESSION_LEVELS = {
+    'static': {'br': 11, 'gzip': 9},
+    'dynamic': {'br': 4, 'gzip': 5}
+}
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+    'application/msgpack', 'application/x-msgpack', 'application/cbor'  # Chat polls still repeat names and words
+)
+
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+def is_compressible(content_type):
+    """Whether a content type is text-like enough to be worth compressing"""
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def negotiate_encoding(accept_encoding, available=SUPPORTED_ENCODINGS):
+    """Pick the best of the available encodings the client accepts, or None for identity.
+    
+    Encodings are weighed by their q-value; ties go to the order of
+    `available`, which lists the better-compressing encoding first.
+    """
+    weights = {}
+    for part in (accept_encoding or '').lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip()
+        if not coding:
+            continue
+        weight = 1.0
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+    
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def compress(data, encoding, kind='dynamic'):
+    """Compress a body with the level chosen for its kind ('static' or 'dynamic')"""
+    level = COMPRESSION_LEVELS[kind][encoding]
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, level, mtime=0)
+
+def encoded_etag(etag, encoding):
+    """A distinct strong ETag for each encoding of the same resource"""
+    if not etag or not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def etag_variants(etag):
+    """Every ETag a client may hold for a resource: identity first, then each encoding"""
+    return [etag] + [encoded_etag(etag, encoding) for encoding in SUPPORTED_ENCODINGS]
+
+class CompressedVariants:
+    """Compressed copies of one unchanging body, built on first request and kept"""
+    
+    def __init__(self, data, content_type, kind='static'):
+        self.data = data
+        self.kind = kind
+        self.compressible = is_compressible(content_type) and len(data) >= COMPRESSION_MIN_BYTES
+        self.variants = {}
+        self.lock = threading.Lock()
+    
+    def get(self, encoding):
+        """The body in an encoding (None for identity)"""
+        if not encoding or not self.compressible:
+            return self.data
+        with self.lock:
+            if encoding not in self.variants:
+                self.variants[encoding] = compress(self.data, encoding, self.kind)
+            return self.variants[encoding]
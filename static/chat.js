@@ -0,0 +1,737 @@
+let lastMessageId = 0;
+
+// Voice variables
+let socket = null;
+let localStream = null;
+let peerConnections = new Map();
+let isInVoiceRoom = false;
+let isMuted = false;
+let isTalking = false;
+let roomId = 'main-voice-room';
+
+// Connect to your Render signaling server
+const SIGNALING_SERVER = 'https://repo1-ejq1.onrender.com';
+
+// Image handling
+let isDragging = false;
+
+// Authentication function
+async function logout() {
+    try {
+        await fetch('/api/auth/logout', { method: 'POST' });
+        document.cookie = 'session_id=; path=/; expires=Thu, 01 Jan 1970 00:00:01 GMT;';
+        window.location.href = '/';
+    } catch (error) {
+        console.error('Logout error:', error);
+        window.location.href = '/';
+    }
+}
+
+// Tab switching
+function switchTab(tabName) {
+    document.querySelectorAll('.tab-btn').forEach(btn => btn.classList.remove('active'));
+    event.target.classList.add('active');
+    
+    document.querySelectorAll('.tab-content').forEach(content => content.classList.remove('active'));
+    document.getElementById(tabName + 'Tab').classList.add('active');
+}
+
+// Image handling functions
+function setupDragAndDrop() {
+    const chatContainer = document.getElementById('chatTab');
+    const dragOverlay = document.getElementById('dragOverlay');
+    
+    ['dragenter', 'dragover', 'dragleave', 'drop'].forEach(eventName => {
+        chatContainer.addEventListener(eventName, preventDefaults, false);
+        document.body.addEventListener(eventName, preventDefaults, false);
+    });
+    
+    ['dragenter', 'dragover'].forEach(eventName => {
+        chatContainer.addEventListener(eventName, highlight, false);
+    });
+    
+    ['dragleave', 'drop'].forEach(eventName => {
+        chatContainer.addEventListener(eventName, unhighlight, false);
+    });
+    
+    chatContainer.addEventListener('drop', handleDrop, false);
+}
+
+function preventDefaults(e) {
+    e.preventDefault();
+    e.stopPropagation();
+}
+
+function highlight(e) {
+    const dragOverlay = document.getElementById('dragOverlay');
+    dragOverlay.classList.add('active');
+}
+
+function unhighlight(e) {
+    const dragOverlay = document.getElementById('dragOverlay');
+    dragOverlay.classList.remove('active');
+}
+
+function handleDrop(e) {
+    const dt = e.dataTransfer;
+    const files = dt.files;
+    
+    handleFiles(files);
+}
+
+function handleImageSelect(event) {
+    const files = event.target.files;
+    handleFiles(files);
+}
+
+function handleFiles(files) {
+    if (files.length === 0) return;
+    
+    const file = files[0];
+    
+    // Validate file type
+    if (!file.type.startsWith('image/')) {
+        alert('Please select an image file.');
+        return;
+    }
+    
+    // Validate file size (the server enforces the same limit)
+    if (file.size > MAX_IMAGE_UPLOAD_SIZE) {
+        alert('Image too large. Please select an image smaller than ' + Math.floor(MAX_IMAGE_UPLOAD_SIZE / (1024 * 1024)) + 'MB.');
+        return;
+    }
+    
+    uploadImage(file);
+}
+
+async function uploadImage(file) {
+    const uploadProgress = document.getElementById('uploadProgress');
+    const progressFill = document.getElementById('progressFill');
+    const sendButton = document.getElementById('sendButton');
+    
+    uploadProgress.classList.add('show');
+    sendButton.disabled = true;
+    
+    try {
+        // Compress image if needed (but keep quality high)
+        const compressedFile = await compressImage(file);
+        
+        // Skip the upload entirely when the server already stores these exact bytes
+        const sha256 = await blobSha256(compressedFile);
+        if (sha256) {
+            const shareResponse = await fetch('/api/chat/share-image', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ sha256: sha256, filename: file.name, caption: '' })
+            });
+            const shareResult = await shareResponse.json();
+            if (shareResult.success) {
+                progressFill.style.width = '100%';
+                return;
+            }
+        }
+        
+        // Update progress
+        progressFill.style.width = '30%';
+        
+        // Send the compressed Blob as the raw request body (no base64/JSON wrapping)
+        const params = new URLSearchParams({ filename: file.name, caption: '' });
+        const response = await fetch(`/api/chat/upload-image?${params}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': compressedFile.type || 'application/octet-stream',
+            },
+            body: compressedFile
+        });
+        
+        progressFill.style.width = '80%';
+        
+        const result = await response.json();
+        
+        progressFill.style.width = '100%';
+        
+        if (result.success) {
+            console.log('Image uploaded successfully');
+            // The image message will appear through the normal message polling
+        } else {
+            alert('Failed to upload image: ' + (result.error || 'Unknown error'));
+        }
+    
+    } catch (error) {
+        console.error('Upload error:', error);
+        alert('Failed to upload image. Please try again.');
+    } finally {
+        uploadProgress.classList.remove('show');
+        sendButton.disabled = false;
+        progressFill.style.width = '0%';
+        
+        // Reset file input
+        document.getElementById('imageInput').value = '';
+    }
+}
+
+async function compressImage(file) {
+    return new Promise((resolve) => {
+        const canvas = document.createElement('canvas');
+        const ctx = canvas.getContext('2d');
+        const img = new Image();
+        
+        img.onload = function() {
+            // Calculate new dimensions (max 1200px - higher quality)
+            let { width, height } = img;
+            const maxSize = 1200;
+            
+            if (width > height) {
+                if (width > maxSize) {
+                    height *= maxSize / width;
+                    width = maxSize;
+                }
+            } else {
+                if (height > maxSize) {
+                    width *= maxSize / height;
+                    height = maxSize;
+                }
+            }
+            
+            canvas.width = width;
+            canvas.height = height;
+            
+            // Draw and compress (higher quality)
+            ctx.drawImage(img, 0, 0, width, height);
+            
+            canvas.toBlob((blob) => {
+                resolve(blob);
+            }, 'image/jpeg', 0.9);
+        };
+        
+        img.src = URL.createObjectURL(file);
+    });
+}
+
+async function blobSha256(blob) {
+    // crypto.subtle only exists on secure origins (https or localhost)
+    if (!window.crypto || !crypto.subtle) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+function openImageModal(src) {
+    const modal = document.getElementById('imageModal');
+    const modalImage = document.getElementById('modalImage');
+    
+    modalImage.src = src;
+    modal.classList.add('show');
+}
+
+function closeImageModal() {
+    const modal = document.getElementById('imageModal');
+    modal.classList.remove('show');
+}
+
+// Voice connection functions (same as before)
+function initializeVoiceConnection() {
+    socket = io(SIGNALING_SERVER);
+    
+    socket.on('connect', () => {
+        console.log('Connected to voice server!');
+        document.getElementById('connectionStatus').innerHTML = '🟢 Connected to voice server';
+        document.getElementById('connectionStatus').classList.add('connected');
+    });
+    
+    socket.on('disconnect', () => {
+        console.log('Disconnected from voice server');
+        document.getElementById('connectionStatus').innerHTML = '🔴 Disconnected from voice server';
+        document.getElementById('connectionStatus').classList.remove('connected');
+    });
+    
+    socket.on('user-joined', (data) => {
+        console.log('User joined:', data.username);
+        createPeerConnection(data.userId);
+        updateVoiceNotification(`🎤 ${data.username} joined voice room`);
+    });
+    
+    socket.on('user-left', (data) => {
+        console.log('User left:', data.username);
+        closePeerConnection(data.userId);
+        updateVoiceNotification(`📞 ${data.username} left voice room`);
+    });
+    
+    socket.on('offer', async (data) => {
+        console.log('Received offer from:', data.from);
+        await handleOffer(data.offer, data.from);
+    });
+    
+    socket.on('answer', async (data) => {
+        console.log('Received answer from:', data.from);
+        await handleAnswer(data.answer, data.from);
+    });
+    
+    socket.on('ice-candidate', async (data) => {
+        console.log('Received ICE candidate from:', data.from);
+        await handleIceCandidate(data.candidate, data.from);
+    });
+    
+    socket.on('room-stats', (data) => {
+        document.getElementById('participantCount').textContent = data.userCount;
+        updateParticipantsList();
+    });
+    
+    socket.on('user-voice-activity', (data) => {
+        updateUserVoiceActivity(data.userId, data.isActive);
+    });
+}
+
+// Chat functionality
+const messageInput = document.getElementById('messageInput');
+messageInput.addEventListener('input', function() {
+    this.style.height = 'auto';
+    this.style.height = Math.min(this.scrollHeight, 100) + 'px';
+});
+
+messageInput.addEventListener('keydown', function(e) {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+function addEmoji(emoji) {
+    const input = document.getElementById('messageInput');
+    input.value += emoji;
+    input.focus();
+}
+
+function sendMessage() {
+    const messageText = messageInput.value.trim();
+    if (!messageText) return;
+    
+    const message = {
+        text: messageText,
+        timestamp: new Date().toISOString()
+    };
+    
+    fetch('/api/chat/send', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(message)
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            messageInput.value = '';
+            messageInput.style.height = 'auto';
+        } else if (data.error === 'Not authenticated') {
+            alert('Session expired. Please login again.');
+            window.location.href = '/';
+        }
+    })
+    .catch(error => {
+        console.error('Error sending message:', error);
+    });
+}
+
+function loadMessages() {
+    fetch(`/api/chat/messages?since=${lastMessageId}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error === 'Not authenticated') {
+                window.location.href = '/';
+                return;
+            }
+            if (data.messages && data.messages.length > 0) {
+                displayMessages(data.messages);
+                lastMessageId = data.lastId;
+            }
+            updateOnlineCount(data.messageCount || 0);
+        })
+        .catch(error => {
+            console.error('Error loading messages:', error);
+        });
+}
+
+function displayMessages(messages) {
+    const container = document.getElementById('messagesContainer');
+    const noMessages = container.querySelector('.no-messages');
+    
+    if (noMessages && messages.length > 0) {
+        noMessages.remove();
+    }
+    
+    messages.forEach(message => {
+        const existingMessage = document.getElementById(`message-${message.id}`);
+        if (existingMessage) {
+            return;
+        }
+        
+        const messageDiv = document.createElement('div');
+        let messageClass = 'message';
+        if (message.username === currentUser) messageClass += ' own';
+        if (message.text.includes('🎤') || message.text.includes('🗣️') || message.text.includes('📞')) messageClass += ' voice';
+        if (message.type === 'image') messageClass += ' image';
+        
+        messageDiv.className = messageClass;
+        messageDiv.id = `message-${message.id}`;
+        
+        const timestamp = new Date(message.timestamp).toLocaleTimeString();
+        
+        let messageContent = '';
+        
+        if (message.type === 'image') {
+            messageContent = `
+                <div class="message-header">
+                    <span class="username">${escapeHtml(message.username)}</span>
+                    <span class="storage-indicator">☁️ ${IMAGE_STORE_LABEL}</span>
+                    <span class="timestamp">${timestamp}</span>
+                </div>
+                <img class="message-image" src="/api/images/${message.image_id}"
+                     srcset="${imageSrcset(message)}"
+                     sizes="(max-width: 600px) 250px, 300px"
+                     alt="${escapeHtml(message.filename || 'Image')}" 
+                     onclick="openImageModal('/api/images/${message.image_id}')"
+                     loading="lazy">
+                ${message.caption ? `<div class="image-caption">${escapeHtml(message.caption)}</div>` : ''}
+            `;
+        } else {
+            messageContent = `
+                <div class="message-header">
+                    <span class="username">${escapeHtml(message.username)}</span>
+                    <span class="timestamp">${timestamp}</span>
+                </div>
+                <div class="message-text">${escapeHtml(message.text)}</div>
+            `;
+        }
+        
+        messageDiv.innerHTML = messageContent;
+        container.appendChild(messageDiv);
+    });
+    
+    container.scrollTop = container.scrollHeight;
+}
+
+function imageSrcset(message) {
+    // Only list the width variants the server actually generated for this image
+    return (message.variant_widths || [])
+        .map(w => `/api/images/${message.image_id}?w=${w} ${w}w`)
+        .join(', ');
+}
+
+function updateOnlineCount(messageCount) {
+    const onlineCount = document.getElementById('onlineCount');
+    onlineCount.textContent = `💬 ${messageCount} messages`;
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function updateVoiceNotification(text) {
+    const message = {
+        text: text,
+        timestamp: new Date().toISOString()
+    };
+    
+    fetch('/api/chat/send', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(message)
+    });
+}
+
+// Voice Room functionality (keeping existing functions)
+async function joinVoiceRoom() {
+    try {
+        localStream = await navigator.mediaDevices.getUserMedia({
+            audio: {
+                echoCancellation: true,
+                noiseSuppression: true,
+                sampleRate: 44100
+            }
+        });
+        
+        localStream.getAudioTracks().forEach(track => {
+            track.enabled = false;
+        });
+        
+        isInVoiceRoom = true;
+        
+        socket.emit('join-room', {
+            roomId: roomId,
+            username: currentUser
+        });
+        
+        document.getElementById('joinVoiceBtn').style.display = 'none';
+        document.getElementById('talkBtn').classList.remove('disabled');
+        document.getElementById('muteBtn').style.display = 'inline-flex';
+        document.getElementById('leaveVoiceBtn').style.display = 'inline-flex';
+        document.getElementById('voiceStatus').innerHTML = '🎤 In voice room - Hold "Talk" to speak!';
+        
+        updateVoiceNotification(`🎤 ${currentUser} joined the voice room`);
+    
+    } catch (error) {
+        console.error('Error accessing microphone:', error);
+        document.getElementById('voiceStatus').innerHTML = '❌ Microphone access denied. Please allow microphone and try again.';
+    }
+}
+
+function leaveVoiceRoom() {
+    if (localStream) {
+        localStream.getTracks().forEach(track => track.stop());
+        localStream = null;
+    }
+    
+    peerConnections.forEach((pc, userId) => {
+        pc.close();
+    });
+    peerConnections.clear();
+    
+    isInVoiceRoom = false;
+    isTalking = false;
+    isMuted = false;
+    
+    document.getElementById('joinVoiceBtn').style.display = 'inline-flex';
+    document.getElementById('talkBtn').classList.add('disabled');
+    document.getElementById('muteBtn').style.display = 'none';
+    document.getElementById('leaveVoiceBtn').style.display = 'none';
+    document.getElementById('voiceStatus').innerHTML = '🎤 Click "Join Voice Room" to start talking with others!';
+    
+    updateVoiceNotification(`📞 ${currentUser} left the voice room`);
+    updateParticipantsList();
+}
+
+// WebRTC peer connection functions (keeping existing implementations)
+async function createPeerConnection(userId) {
+    const peerConnection = new RTCPeerConnection({
+        iceServers: [
+            { urls: 'stun:stun.l.google.com:19302' },
+            { urls: 'stun:global.stun.twilio.com:3478' }
+        ]
+    });
+    
+    if (localStream) {
+        localStream.getTracks().forEach(track => {
+            peerConnection.addTrack(track, localStream);
+        });
+    }
+    
+    peerConnection.ontrack = (event) => {
+        const remoteStream = event.streams[0];
+        playRemoteAudio(remoteStream, userId);
+    };
+    
+    peerConnection.onicecandidate = (event) => {
+        if (event.candidate) {
+            socket.emit('ice-candidate', {
+                target: userId,
+                candidate: event.candidate
+            });
+        }
+    };
+    
+    peerConnections.set(userId, peerConnection);
+    
+    const offer = await peerConnection.createOffer();
+    await peerConnection.setLocalDescription(offer);
+    
+    socket.emit('offer', {
+        target: userId,
+        offer: offer
+    });
+}
+
+async function handleOffer(offer, fromUserId) {
+    const peerConnection = new RTCPeerConnection({
+        iceServers: [
+            { urls: 'stun:stun.l.google.com:19302' },
+            { urls: 'stun:global.stun.twilio.com:3478' }
+        ]
+    });
+    
+    if (localStream) {
+        localStream.getTracks().forEach(track => {
+            peerConnection.addTrack(track, localStream);
+        });
+    }
+    
+    peerConnection.ontrack = (event) => {
+        const remoteStream = event.streams[0];
+        playRemoteAudio(remoteStream, fromUserId);
+    };
+    
+    peerConnection.onicecandidate = (event) => {
+        if (event.candidate) {
+            socket.emit('ice-candidate', {
+                target: fromUserId,
+                candidate: event.candidate
+            });
+        }
+    };
+    
+    peerConnections.set(fromUserId, peerConnection);
+    
+    await peerConnection.setRemoteDescription(offer);
+    const answer = await peerConnection.createAnswer();
+    await peerConnection.setLocalDescription(answer);
+    
+    socket.emit('answer', {
+        target: fromUserId,
+        answer: answer
+    });
+}
+
+async function handleAnswer(answer, fromUserId) {
+    const peerConnection = peerConnections.get(fromUserId);
+    if (peerConnection) {
+        await peerConnection.setRemoteDescription(answer);
+    }
+}
+
+async function handleIceCandidate(candidate, fromUserId) {
+    const peerConnection = peerConnections.get(fromUserId);
+    if (peerConnection) {
+        await peerConnection.addIceCandidate(candidate);
+    }
+}
+
+function closePeerConnection(userId) {
+    const peerConnection = peerConnections.get(userId);
+    if (peerConnection) {
+        peerConnection.close();
+        peerConnections.delete(userId);
+    }
+    
+    const audioElement = document.getElementById(`audio-${userId}`);
+    if (audioElement) {
+        audioElement.remove();
+    }
+}
+
+function playRemoteAudio(stream, userId) {
+    const audio = document.createElement('audio');
+    audio.srcObject = stream;
+    audio.autoplay = true;
+    audio.id = `audio-${userId}`;
+    audio.volume = 1.0;
+    
+    document.body.appendChild(audio);
+    console.log(`Playing audio from user: ${userId}`);
+}
+
+function startTalking() {
+    if (!isInVoiceRoom || isMuted || isTalking || !localStream) return;
+    
+    isTalking = true;
+    
+    localStream.getAudioTracks().forEach(track => {
+        track.enabled = true;
+    });
+    
+    document.getElementById('talkBtn').classList.add('recording');
+    document.getElementById('voiceStatus').innerHTML = '🔴 Talking... Release button to stop';
+    
+    socket.emit('voice-activity', { isActive: true });
+}
+
+function stopTalking() {
+    if (!isTalking || !localStream) return;
+    
+    isTalking = false;
+    
+    localStream.getAudioTracks().forEach(track => {
+        track.enabled = false;
+    });
+    
+    document.getElementById('talkBtn').classList.remove('recording');
+    document.getElementById('voiceStatus').innerHTML = '🎤 In voice room - Hold "Talk" to speak!';
+    
+    socket.emit('voice-activity', { isActive: false });
+}
+
+function toggleMute() {
+    isMuted = !isMuted;
+    const muteBtn = document.getElementById('muteBtn');
+    
+    if (isMuted) {
+        muteBtn.innerHTML = '🔇 Unmute';
+        muteBtn.style.background = '#f44336';
+        document.getElementById('voiceStatus').innerHTML = '🔇 Microphone muted';
+        
+        if (localStream) {
+            localStream.getAudioTracks().forEach(track => track.enabled = false);
+        }
+    } else {
+        muteBtn.innerHTML = '🔊 Mute';
+        muteBtn.style.background = '#ff9800';
+        document.getElementById('voiceStatus').innerHTML = '🎤 In voice room - Hold "Talk" to speak!';
+        
+        if (localStream && !isTalking) {
+            localStream.getAudioTracks().forEach(track => track.enabled = false);
+        }
+    }
+}
+
+function updateParticipantsList() {
+    const participantList = document.getElementById('participantList');
+    
+    if (!isInVoiceRoom) {
+        participantList.innerHTML = `
+            <div class="participant">
+                <span>💤</span>
+                <span>No one in voice yet</span>
+            </div>
+        `;
+        return;
+    }
+    
+    participantList.innerHTML = `
+        <div class="participant" id="myParticipant">
+            <span>🎤</span>
+            <span>You (${currentUser})</span>
+        </div>
+    `;
+    
+    peerConnections.forEach((pc, userId) => {
+        const participant = document.createElement('div');
+        participant.className = 'participant';
+        participant.id = `participant-${userId}`;
+        participant.innerHTML = `
+            <span>🔊</span>
+            <span>User ${userId.substring(0, 8)}...</span>
+        `;
+        participantList.appendChild(participant);
+    });
+}
+
+function updateUserVoiceActivity(userId, isActive) {
+    const participant = document.getElementById(`participant-${userId}`);
+    if (participant) {
+        if (isActive) {
+            participant.classList.add('speaking');
+        } else {
+            participant.classList.remove('speaking');
+        }
+    }
+}
+
+document.getElementById('talkBtn').addEventListener('contextmenu', e => e.preventDefault());
+
+// Initialize everything when page loads
+document.addEventListener('DOMContentLoaded', function() {
+    initializeVoiceConnection();
+    setupDragAndDrop();
+    setInterval(loadMessages, 2000);
+    loadMessages();
+    
+    console.log('🎉 Enhanced Chatroom with Images loaded!');
+    console.log('👤 Logged in as:', currentUser);
+    console.log('💬 Text chat ready');
+    console.log('🎤 Voice room connected');
+    console.log('☁️ ' + IMAGE_STORE_LABEL + ' image storage ready');
+});
@@ -0,0 +1,50 @@
+import os
+import hashlib
+import mimetypes
+from response_encoding import CompressedVariants, SUPPORTED_ENCODINGS
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_URL_PREFIX = '/static/'
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'  # The URL changes whenever the content does
+ASSET_EXTENSIONS = ('.css', '.js')
+
+class StaticAssets:
+    """The page CSS/JS, loaded once and served under content-hashed URLs.
+    
+    static/chat.js is served as /static/chat.<hash>.js, so browsers can
+    cache it forever and pick up a new URL on the next deploy. Bodies and
+    their compressed copies are kept in memory; the files are small.
+    """
+    
+    def __init__(self, directory=STATIC_DIR):
+        self.by_name = {}  # 'chat.js' -> asset entry
+        self.by_url = {}  # '/static/chat.<hash>.js' -> asset entry
+        
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.endswith(ASSET_EXTENSIONS):
+                continue
+            
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, extension = os.path.splitext(entry.name)
+            content_type = mimetypes.guess_type(entry.name)[0] or 'application/octet-stream'
+            
+            asset = {
+                "url": f"{STATIC_URL_PREFIX}{stem}.{digest}{extension}",
+                "content_type": f"{content_type}; charset=utf-8",
+                "etag": f'"{digest}"',
+                "variants": CompressedVariants(data, content_type)
+            }
+            for encoding in SUPPORTED_ENCODINGS:
+                asset["variants"].get(encoding)  # Compress at startup, not on the first request
+            self.by_name[entry.name] = asset
+            self.by_url[asset["url"]] = asset
+    
+    def url(self, name):
+        """Fingerprinted URL for a file in static/ (raises KeyError for unknown names)"""
+        return self.by_name[name]["url"]
+    
+    def get(self, path):
+        """The asset served at a fingerprinted URL path, or None"""
+        return self.by_url.get(path)
@@ -0,0 +1,151 @@
+import os
+import stat
+import posixpath
+import mimetypes
+import threading
+import urllib.parse
+from collections import OrderedDict
+from response_encoding import CompressedVariants, SUPPORTED_ENCODINGS
+
+# Plain files served from the working directory (anything that isn't a page, an asset or the API)
+STATIC_FILES_DIR = os.environ.get('STATIC_FILES_DIR', '.')
+STATIC_FILE_CACHE_MB = int(os.environ.get('STATIC_FILE_CACHE_MB', 16))  # Memory for hot file bodies and their compressed copies
+STATIC_FILE_MEMORY_MAX = int(os.environ.get('STATIC_FILE_MEMORY_MAX', 256 * 1024))  # Larger files are always sent from disk with sendfile
+STATIC_FILE_CACHE_ENTRIES = 1024  # Files whose metadata is remembered
+STATIC_FILE_CACHE_CONTROL = 'no-cache'  # Revalidate every time; the validators make that a cheap 304
+
+# Pre-compressed siblings served in place of the file when the client accepts them (style.css -> style.css.gz)
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+class StaticFiles:
+    """Regular files under a directory, with cached metadata and hot bodies kept in memory.
+    
+    Each request costs one stat; the cached entry is reused until the
+    file's inode, mtime or size changes. Small files are held in memory
+    with lazily compressed copies, large ones are left for sendfile, and
+    up-to-date .gz/.br siblings are served as the encoded representation.
+    """
+    
+    def __init__(self, root=STATIC_FILES_DIR, max_bytes=STATIC_FILE_CACHE_MB * 1024 * 1024,
+                 memory_max=STATIC_FILE_MEMORY_MAX, max_entries=STATIC_FILE_CACHE_ENTRIES, hidden=()):
+        self.root = os.path.realpath(root)
+        self.hidden = [os.path.realpath(path) for path in hidden]  # Never served, nor anything below them
+        self.max_bytes = max_bytes
+        self.memory_max = memory_max
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # real path -> entry, least recently used first
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def resolve(self, url_path):
+        """The real path of the file a URL path names, or None if it leads outside the root"""
+        path = urllib.parse.unquote(url_path)
+        if '\x00' in path or '\\' in path:
+            return None
+        path = posixpath.normpath('/' + path).lstrip('/')
+        if not path:
+            return None
+        
+        real_path = os.path.realpath(os.path.join(self.root, *path.split('/')))
+        if os.path.commonpath([self.root, real_path]) != self.root:
+            return None  # '..' or a symlink pointing out of the root
+        if any(os.path.commonpath([hidden, real_path]) == hidden for hidden in self.hidden):
+            return None  # Private data that happens to live under the root, like a local image store
+        return real_path
+    
+    def lookup(self, url_path):
+        """The entry for the file at a URL path, or None if there is no such regular file"""
+        real_path = self.resolve(url_path)
+        if not real_path:
+            return None
+        try:
+            file_stat = os.stat(real_path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+        
+        key = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+        with self.lock:
+            entry = self.entries.get(real_path)
+            if entry and entry["key"] == key:
+                self.entries.move_to_end(real_path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        
+        entry = self.load_entry(real_path, file_stat, key)
+        with self.lock:
+            old = self.entries.pop(real_path, None)
+            if old:
+                self.cached_bytes -= old["cost"]
+            self.entries[real_path] = entry
+            self.cached_bytes += entry["cost"]
+            while self.entries and (self.cached_bytes > self.max_bytes or len(self.entries) > self.max_entries):
+                _, evicted = self.entries.popitem(last=False)
+                self.cached_bytes -= evicted["cost"]
+        return entry
+    
+    def load_entry(self, real_path, file_stat, key):
+        """Build the cache entry for a file: validators, pre-compressed siblings and, if small, its body"""
+        content_type = mimetypes.guess_type(real_path)[0] or 'application/octet-stream'
+        
+        siblings = {}
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            try:
+                sibling_stat = os.stat(real_path + suffix)
+            except OSError:
+                continue
+            # A sibling older than the file was compressed from a previous version
+            if stat.S_ISREG(sibling_stat.st_mode) and sibling_stat.st_mtime_ns >= file_stat.st_mtime_ns:
+                siblings[encoding] = {"path": real_path + suffix, "size": sibling_stat.st_size}
+        
+        variants = None
+        if file_stat.st_size <= self.memory_max:
+            try:
+                with open(real_path, 'rb') as f:
+                    data = f.read()
+                    current = os.fstat(f.fileno())
+                # Only keep the body if it is the version that was stat'ed
+                if (current.st_ino, current.st_mtime_ns, current.st_size) == key:
+                    variants = CompressedVariants(data, content_type)
+            except OSError:
+                pass
+        
+        encodings = [encoding for encoding in SUPPORTED_ENCODINGS if encoding in siblings]
+        if variants and variants.compressible:
+            encodings += [encoding for encoding in SUPPORTED_ENCODINGS if encoding not in siblings]
+        encodings += [encoding for encoding in siblings if encoding not in encodings]  # .br files work without the brotli module
+        
+        return {
+            "path": real_path,
+            "key": key,
+            "size": file_stat.st_size,
+            "content_type": content_type,
+            "etag": f'"{file_stat.st_ino:x}-{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"',
+            "last_modified": int(file_stat.st_mtime),
+            "siblings": siblings,
+            "variants": variants,  # None when the body is left on disk
+            "encodings": tuple(encodings),
+            "cost": 2 * file_stat.st_size if variants else 0  # Room for the body plus its compressed copies
+        }
+    
+    def forget(self, real_path):
+        """Drop a cached entry whose file turned out to be gone"""
+        with self.lock:
+            entry = self.entries.pop(real_path, None)
+            if entry:
+                self.cached_bytes -= entry["cost"]
+    
+    def get_stats(self):
+        with self.lock:
+            return {
+                "root": self.root,
+                "entries": len(self.entries),
+                "cached_bytes": self.cached_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
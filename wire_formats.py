@@ -0,0 +1,77 @@
+try:
+    import msgpack
+except ImportError:  # Optional - without it clients can't ask for application/msgpack
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # Optional - without it clients can't ask for application/cbor
+    cbor2 = None
+
+# Message fields only the server needs; never sent to clients in any format
+INTERNAL_MESSAGE_FIELDS = ('ip',)
+
+# Short tags for message fields in the binary formats (timestamps also become epoch seconds)
+MESSAGE_FIELD_TAGS = {
+    'id': 'i',
+    'username': 'u',
+    'text': 't',
+    'timestamp': 's',
+    'type': 'k',
+    'image_id': 'm',
+    'filename': 'f',
+    'caption': 'c',
+    'variant_widths': 'w'
+}
+
+# Media type -> encoder, for the libraries that are installed
+WIRE_FORMATS = {}
+if msgpack:
+    WIRE_FORMATS['application/msgpack'] = lambda data: msgpack.packb(data, use_bin_type=True)
+    WIRE_FORMATS['application/x-msgpack'] = WIRE_FORMATS['application/msgpack']
+if cbor2:
+    WIRE_FORMATS['application/cbor'] = cbor2.dumps
+
+def negotiate_wire_format(accept):
+    """The binary media type the client prefers, or None to answer with JSON.
+    
+    A binary type wins only when the Accept header names it and ranks it
+    at least as high as JSON; wildcards (browsers' */*) keep JSON.
+    """
+    best, best_weight = None, 0.0
+    json_weight = 0.0
+    for part in (accept or '').lower().split(','):
+        media_type, _, params = part.strip().partition(';')
+        media_type = media_type.strip()
+        weight = 1.0
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        
+        if media_type == 'application/json':
+            json_weight = weight
+        elif media_type in WIRE_FORMATS and weight > best_weight:
+            best, best_weight = media_type, weight
+    return best if best and best_weight >= json_weight else None
+
+def compact_message(message):
+    """A ChatMessage with short field tags and its epoch timestamp, internal fields left out"""
+    compact = {}
+    for key, value in message.to_dict().items():
+        if key in INTERNAL_MESSAGE_FIELDS:
+            continue
+        if key == 'timestamp':
+            value = message.timestamp
+        compact[MESSAGE_FIELD_TAGS.get(key, key)] = value
+    return compact
+
+def encode_messages(media_type, messages, last_id, message_count):
+    """A poll response in a binary format: the same fields as the JSON one, messages compacted"""
+    return WIRE_FORMATS[media_type]({
+        "messages": [compact_message(message) for message in messages],
+        "lastId": last_id,
+        "messageCount": message_count
+    })